@@ -0,0 +1,91 @@
+import csv
+import sys
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+
+from SendEmail.models import NewsletterSubscriber
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV of newsletter subscribers into the database. "
+        "Rows are read lazily and written with chunked bulk_create, so "
+        "files with millions of rows never sit in memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to import, or '-' for stdin")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per INSERT statement (default: 5000)')
+        parser.add_argument('--reactivate', action='store_true',
+                            help='Re-activate existing subscribers instead of leaving them untouched')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        if options['path'] == '-':
+            self._import(sys.stdin, batch_size, options['reactivate'])
+        else:
+            try:
+                with open(options['path'], newline='', encoding='utf-8') as handle:
+                    self._import(handle, batch_size, options['reactivate'])
+            except OSError as e:
+                raise CommandError(f"Could not read {options['path']}: {e}")
+
+    def _import(self, handle, batch_size, reactivate):
+        reader = csv.reader(handle)
+        rows = self._emails(reader)
+        written = skipped = 0
+
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+
+            # Normalize and de-duplicate within the chunk - Postgres refuses to
+            # touch the same conflicting row twice in one ON CONFLICT statement
+            emails = {}
+            for email in chunk:
+                normalized = NewsletterSubscriber.normalize_email(email)
+                try:
+                    validate_email(normalized)
+                except ValidationError:
+                    skipped += 1
+                    continue
+                emails[normalized] = None
+
+            objs = [NewsletterSubscriber(email=email, is_active=True) for email in emails]
+            if reactivate:
+                NewsletterSubscriber.objects.bulk_create(
+                    objs, update_conflicts=True, unique_fields=['email'], update_fields=['is_active'],
+                )
+            else:
+                NewsletterSubscriber.objects.bulk_create(objs, ignore_conflicts=True)
+            written += len(objs)
+
+            if self.verbosity >= 2:
+                self.stdout.write(f"  {written} rows written...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {written} subscribers ({skipped} invalid rows skipped)"
+        ))
+
+    def _emails(self, reader):
+        """Yield the email column of each row, skipping an optional header"""
+        column = 0
+        for line_number, row in enumerate(reader):
+            if not row:
+                continue
+            if line_number == 0:
+                header = [cell.strip().lower() for cell in row]
+                if 'email' in header:
+                    column = header.index('email')
+                    continue
+            if column < len(row):
+                yield row[column]
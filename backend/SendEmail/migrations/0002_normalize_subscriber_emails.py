@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def normalize_emails(apps, schema_editor):
+    """
+    Lowercase stored emails so the unique index is effectively case-insensitive.
+    When two rows only differ by case, the oldest subscription is kept.
+    """
+    NewsletterSubscriber = apps.get_model('SendEmail', 'NewsletterSubscriber')
+    seen = set()
+    duplicates = []
+    renames = []
+    for subscriber in NewsletterSubscriber.objects.order_by('date_subscribed', 'id').iterator():
+        normalized = subscriber.email.strip().lower()
+        if normalized in seen:
+            duplicates.append(subscriber.id)
+            continue
+        seen.add(normalized)
+        if normalized != subscriber.email:
+            renames.append((subscriber.id, normalized))
+
+    # Drop the duplicates first so the renames can't collide with the unique index
+    NewsletterSubscriber.objects.filter(id__in=duplicates).delete()
+    for subscriber_id, normalized in renames:
+        NewsletterSubscriber.objects.filter(id=subscriber_id).update(email=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('SendEmail', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -6,4 +6,23 @@ class NewsletterSubscriber(models.Model):
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+    @staticmethod
+    def normalize_email(email):
+        """Lowercase and trim an address so lookups are case-insensitive"""
+        return (email or '').strip().lower()
+
+    @classmethod
+    def subscribe(cls, email):
+        """
+        Subscribe (or re-activate) an email in a single statement.
+        Runs INSERT ... ON CONFLICT (email) DO UPDATE SET is_active = true,
+        so repeated sign-ups never raise IntegrityError.
+        """
+        cls.objects.bulk_create(
+            [cls(email=cls.normalize_email(email), is_active=True)],
+            update_conflicts=True,
+            unique_fields=['email'],
+            update_fields=['is_active'],
+        )
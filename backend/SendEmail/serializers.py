@@ -2,6 +2,13 @@ from rest_framework import serializers
 from .models import NewsletterSubscriber
 
 class NewsletterSerializer(serializers.ModelSerializer):
+    # Declared explicitly so the model's unique validator doesn't run an extra
+    # SELECT - duplicates are resolved by the upsert in NewsletterSubscriber.subscribe
+    email = serializers.EmailField(max_length=254)
+
     class Meta:
         model = NewsletterSubscriber
-        fields = ['email']
\ No newline at end of file
+        fields = ['email']
+
+    def validate_email(self, value):
+        return NewsletterSubscriber.normalize_email(value)
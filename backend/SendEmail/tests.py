@@ -1,3 +1,68 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import NewsletterSubscriber
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, SECURE_SSL_REDIRECT=False)
+class NewsletterSubscribeTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_subscribe_endpoint_is_mounted(self):
+        self.assertEqual(reverse('newsletter_subscribe'), '/api/newsletter/subscribe')
+
+    def test_subscribe_normalizes_email(self):
+        response = self.client.post('/api/newsletter/subscribe', {'email': '  Reader@Example.COM '},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(NewsletterSubscriber.objects.values_list('email', flat=True)),
+                         ['reader@example.com'])
+
+    def test_resubscribe_is_an_upsert(self):
+        NewsletterSubscriber.objects.create(email='reader@example.com', is_active=False)
+        response = self.client.post('/api/newsletter/subscribe', {'email': 'READER@example.com'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        subscriber = NewsletterSubscriber.objects.get()
+        self.assertTrue(subscriber.is_active)
+
+    def test_invalid_email_is_rejected(self):
+        response = self.client.post('/api/newsletter/subscribe', {'email': 'not-an-email'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(NewsletterSubscriber.objects.exists())
+
+
+class SubscriberCsvCommandTests(TestCase):
+    def test_import_then_export_round_trip(self):
+        NewsletterSubscriber.objects.create(email='old@example.com', is_active=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'in.csv')
+            with open(source, 'w', newline='') as handle:
+                handle.write('email\nA@example.com\na@example.com\nbogus\nold@example.com\nb@example.com\n')
+
+            call_command('import_subscribers', source, batch_size=2, stdout=io.StringIO())
+            self.assertEqual(NewsletterSubscriber.objects.count(), 3)
+            # Existing rows are left alone unless --reactivate is passed
+            self.assertFalse(NewsletterSubscriber.objects.get(email='old@example.com').is_active)
+
+            call_command('import_subscribers', source, reactivate=True, stdout=io.StringIO())
+            self.assertTrue(NewsletterSubscriber.objects.get(email='old@example.com').is_active)
+
+            target = os.path.join(tmp, 'out.csv')
+            call_command('export_subscribers', output=target, chunk_size=1, stderr=io.StringIO())
+            with open(target) as handle:
+                lines = handle.read().splitlines()
+
+        self.assertEqual(lines[0], 'email,date_subscribed,is_active')
+        self.assertEqual(sorted(line.split(',')[0] for line in lines[1:]),
+                         ['a@example.com', 'b@example.com', 'old@example.com'])
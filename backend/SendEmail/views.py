@@ -1,24 +1,25 @@
-from django.db import IntegrityError
-from rest_framework.decorators import api_view, throttle_classes
+from rest_framework import status
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle
+from .models import NewsletterSubscriber
+from .serializers import NewsletterSerializer
 
 class NewsletterRateThrottle(AnonRateThrottle):
     rate = '3/hour'
 
 @api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
 @throttle_classes([NewsletterRateThrottle])
 def newsletter_subscribe(request):
     serializer = NewsletterSerializer(data=request.data)
     if serializer.is_valid():
-        try:
-            serializer.save()
-            return Response(
-                {"message": "Successfully subscribed to newsletter"}, 
-                status=status.HTTP_201_CREATED
-            )
-        except IntegrityError:
-            return Response(
-                {"error": "This email is already subscribed"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        # Single upsert - subscribing twice just re-activates the existing row
+        NewsletterSubscriber.subscribe(serializer.validated_data['email'])
+        return Response(
+            {"message": "Successfully subscribed to newsletter"}, 
+            status=status.HTTP_201_CREATED
+        )
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
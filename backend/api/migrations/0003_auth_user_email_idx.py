@@ -0,0 +1,20 @@
+# Generated by Django 4.2.17 on 2026-10-19 01:38
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_remembermetoken'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    # auth.User is not ours to add Meta.indexes to, but login by email and both
+    # password reset views look users up by email on every request
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email);',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_idx;',
+        ),
+    ]
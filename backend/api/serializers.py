@@ -15,6 +15,8 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             "password": {"write_only": True},
             "email": {"required": True}
+            # username needs no validate_username(): the model field's UniqueValidator
+            # already rejects taken names with the same message, in one query
         }
 
     def validate(self, data):
@@ -25,14 +27,6 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"confirm_password": "Passwords do not match"})
         return data
 
-    def validate_username(self, value):
-        """
-        Check if username already exists
-        """
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("A user with that username already exists.")
-        return value
-
     def validate_email(self, value):
         """
         Check if email already exists
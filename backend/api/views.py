@@ -1,4 +1,7 @@
+import logging
+
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.models import User
 from rest_framework import generics, serializers, status
 from rest_framework.decorators import api_view, permission_classes
@@ -6,12 +9,15 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from .serializers import UserSerializer, NoteSerializer
 from .models import Note
 from django.utils import timezone
 from datetime import timedelta
 from .models import Note, RememberMeToken  # Update this line to include RememberMeToken
 
+logger = logging.getLogger(__name__)
+
 # Authentication Classes
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """
@@ -75,12 +81,17 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
                     'error': 'This account is inactive.'
                 })
 
-            # 7. Set the username for the parent class's validation
-            # - This ensures compatibility with the parent JWT token serializer
-            attrs['username'] = user.username
-            
-            # 8. Call the parent class's validate method to complete the token generation
-            return super().validate(attrs)
+            # 7. Issue the token pair for the user we just authenticated
+            # - The parent's validate() would call authenticate() again, repeating
+            #   the user lookup and the (deliberately slow) password hash
+            self.user = user
+            refresh = self.get_token(user)
+            data = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+            # 8. Keep the parent's last_login bookkeeping
+            if jwt_settings.UPDATE_LAST_LOGIN:
+                update_last_login(None, user)
+            return data
 
         except Exception as e:
             # 9. Catch any unexpected errors and convert them to a validation error
@@ -93,7 +104,12 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 class CustomTokenObtainPairView(TokenObtainPairView):
     # Override the serializer to use our custom serializer that supports email/username login
     serializer_class = CustomTokenObtainPairSerializer
-    
+
+    def get_serializer(self, *args, **kwargs):
+        # Keep a handle on the serializer so post() can read the authenticated user
+        self._serializer = super().get_serializer(*args, **kwargs)
+        return self._serializer
+
     def post(self, request, *args, **kwargs):
         try:
             # 1. Call the parent class's post method to generate JWT tokens
@@ -104,18 +120,10 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             # 2. Check if token generation was successful
             # - 200 status code indicates successful authentication
             if response.status_code == 200:
-                # 3. Retrieve the login credential used for authentication
-                # - This could be either username or email
-                login = request.data.get('login')
-                
-                # 4. Find the user based on the login credential
-                # First, try to find by username
-                user = User.objects.filter(username=login).first()
-                
-                # If not found by username, try to find by email
-                if not user:
-                    user = User.objects.filter(email=login).first()
-                
+                # 3-4. Reuse the user the serializer just authenticated
+                # - Looking them up again by login would repeat the serializer's queries
+                user = self._serializer.user
+
                 # 5. If a user is found, check for "Remember Me" functionality
                 if user:
                     # Get the "remember me" flag from the request
@@ -199,7 +207,7 @@ class CreateUserView(generics.CreateAPIView):
             error_data = e.detail if hasattr(e, 'detail') else e.args[0]
 
             # 6.2 Log validation errors for server-side debugging
-            print("Validation Error:", error_data)
+            logger.info("User creation rejected: %s", error_data)
 
             # 6.3 Specific error handling based on error type
             # - Check if error_data is a dictionary (structured error)
@@ -244,7 +252,7 @@ class CreateUserView(generics.CreateAPIView):
             # - Provides a safety net for any unhandled exceptions
             
             # 7.1 Log the unexpected error for server-side investigation
-            print("Unexpected error during user creation:", str(e))
+            logger.exception("Unexpected error during user creation: %s", e)
             
             # 7.2 Return a generic server error response
             return Response(
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up; answers lifespan events with a worker warm-up
+from backend.warmup import LifespanMiddleware  # noqa: E402
+
+application = LifespanMiddleware(django_application)
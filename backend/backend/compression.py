@@ -0,0 +1,230 @@
+"""
+Negotiated response compression.
+
+CompressionMiddleware compresses responses with the best encoding the client
+accepts (Accept-Encoding, q-values honoured): Brotli when the ``brotli``
+package is installed, gzip otherwise. A response is compressed only if
+
+* its Content-Type is in COMPRESSION_CONTENT_TYPES,
+* it is at least COMPRESSION_MIN_SIZE bytes (streams always qualify),
+* it is not already encoded and allows transformation, and
+* its path is not in COMPRESSION_EXCLUDE_PATHS - responses carrying secrets
+  next to attacker-influenced input (login, token refresh) stay uncompressed
+  against BREACH; gzip output is randomly padded as Django's GZipMiddleware does.
+
+Streaming responses are compressed chunk by chunk and flushed after every
+chunk, so clients still receive data as it is produced. Responses with an
+ETag are treated as unchanging: their compressed bytes are kept in a small
+LRU cache and reused for every later request with the same path and ETag.
+
+Bytes in/out and compression time per view and encoding are recorded in
+backend.metrics; `manage.py compressionbench` measures the same offline.
+"""
+import secrets
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+from .instrumentation import _view_label
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+COMPRESSION_BYTES = metrics.counter(
+    'http_response_compression_bytes_total',
+    'Response bytes before (stage="in") and after (stage="out") compression, per view and encoding')
+COMPRESSION_DURATION = metrics.histogram(
+    'http_response_compression_seconds', 'CPU time spent compressing a response, per view and encoding',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+
+class GzipCompressor:
+    """
+    Incremental gzip: raw deflate between a hand-written header and trailer,
+    so the header can carry random padding (BREACH) as Django's does.
+    """
+
+    def __init__(self, level, max_random_bytes=0):
+        self._deflate = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._size = 0
+        header = bytearray(b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff')  # mtime 0, unknown OS
+        if max_random_bytes:
+            header[3] = 0x08  # FNAME: a random-length, zero-terminated "file name"
+            alphabet = 'abcdefghijklmnopqrstuvwxyz'
+            header += ''.join(secrets.choice(alphabet)
+                              for _ in range(1 + secrets.randbelow(max_random_bytes))).encode() + b'\x00'
+        self._header = bytes(header)
+
+    def compress(self, data, flush=False):
+        out = self._header + self._deflate.compress(data)
+        self._header = b''
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        if flush:
+            out += self._deflate.flush(zlib.Z_SYNC_FLUSH)
+        return out
+
+    def finish(self):
+        return (self._header + self._deflate.flush()
+                + struct.pack('<II', self._crc & 0xffffffff, self._size & 0xffffffff))
+
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self._brotli = brotli.Compressor(quality=quality)
+
+    def compress(self, data, flush=False):
+        out = self._brotli.process(data)
+        if flush:
+            out += self._brotli.flush()
+        return out
+
+    def finish(self):
+        return self._brotli.finish()
+
+
+def compressor(encoding):
+    """A fresh compressor for ``encoding`` ('br' or 'gzip') at the configured level"""
+    if encoding == 'br':
+        return BrotliCompressor(settings.COMPRESSION_BROTLI_QUALITY)
+    return GzipCompressor(settings.COMPRESSION_GZIP_LEVEL, settings.COMPRESSION_MAX_RANDOM_BYTES)
+
+
+def compress(data, encoding):
+    """Compress a whole body in one go"""
+    codec = compressor(encoding)
+    return codec.compress(data) + codec.finish()
+
+
+def available_encodings():
+    """Supported encodings, most preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding, available=None):
+    """
+    Pick an encoding from an Accept-Encoding header value: the highest q-value
+    wins, ties go to the server's preference order; None means identity.
+    """
+    available = available or available_encodings()
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.content_types = frozenset(settings.COMPRESSION_CONTENT_TYPES)
+        self.exclude_paths = tuple(settings.COMPRESSION_EXCLUDE_PATHS)
+        # (path, ETag, encoding) -> compressed body, least recently used first
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        content_type = response.get('Content-Type', '').partition(';')[0].strip().lower()
+        if (content_type not in self.content_types
+                or response.has_header('Content-Encoding')
+                or response.status_code in (204, 206, 304)
+                or 'no-transform' in response.get('Cache-Control', '')
+                or request.path.startswith(self.exclude_paths)):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        # From here the body depends on Accept-Encoding, whichever way we decide
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            self._compress_stream(response, encoding)
+        elif not self._compress_content(request, response, encoding):
+            return response
+
+        # Compressed bytes differ from the original: a strong ETag must become weak (RFC 9110 8.8.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress_content(self, request, response, encoding):
+        content = response.content
+        etag = response.get('ETag')
+        key = (request.path, etag, encoding)
+        compressed = None
+        if etag and response.status_code == 200:
+            with self._cache_lock:
+                compressed = self._cache.get(key)
+                if compressed is not None:
+                    self._cache.move_to_end(key)
+
+        if compressed is None:
+            start = time.perf_counter()
+            compressed = compress(content, encoding)
+            view = _view_label(request)
+            COMPRESSION_DURATION.observe(time.perf_counter() - start, view=view, encoding=encoding)
+            COMPRESSION_BYTES.inc(len(content), view=view, encoding=encoding, stage='in')
+            COMPRESSION_BYTES.inc(len(compressed), view=view, encoding=encoding, stage='out')
+            if len(compressed) >= len(content):
+                return False
+            if etag and response.status_code == 200 and settings.COMPRESSION_CACHE_SIZE:
+                with self._cache_lock:
+                    self._cache[key] = compressed
+                    while len(self._cache) > settings.COMPRESSION_CACHE_SIZE:
+                        self._cache.popitem(last=False)
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        return True
+
+    def _compress_stream(self, response, encoding):
+        codec = compressor(encoding)
+        original = response.streaming_content
+
+        if response.is_async:
+            async def stream():
+                async for chunk in original:
+                    if chunk:
+                        yield codec.compress(chunk, flush=True)
+                yield codec.finish()
+        else:
+            def stream():
+                for chunk in original:
+                    if chunk:
+                        yield codec.compress(chunk, flush=True)
+                yield codec.finish()
+
+        response.streaming_content = stream()
+        # The compressed length is only known once the stream ends
+        if response.has_header('Content-Length'):
+            del response.headers['Content-Length']
@@ -0,0 +1,261 @@
+"""
+Bounded database connection pool.
+
+Django keeps one connection per thread (CONN_MAX_AGE), so threaded or ASGI
+workers hold as many connections as they have threads, idle or not. The
+backends in backend.db.postgresql and backend.db.sqlite3 instead take a
+connection from a per-process ConnectionPool when Django connects and give
+it back when Django closes it - at the end of every request, since the pool
+runs with CONN_MAX_AGE = 0.
+
+The pool is configured with a POOL entry in the DATABASES settings:
+
+    'POOL': {'MIN_SIZE': 2, 'MAX_SIZE': 10, 'TIMEOUT': 5, 'MAX_IDLE': 300, 'HEALTH_CHECKS': True}
+
+At most MAX_SIZE connections are open; a checkout beyond that waits up to
+TIMEOUT seconds for one to be returned and then fails with OperationalError.
+Idle connections beyond MIN_SIZE are closed after MAX_IDLE seconds. With
+HEALTH_CHECKS every checkout pings the connection first and replaces it if
+the database went away. Wait time, checkouts and connections in use are
+recorded in backend.metrics.
+"""
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+from .. import metrics
+
+POOL_WAIT = metrics.histogram(
+    'db_pool_wait_seconds', 'Time to check a connection out of the pool, per database alias',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+POOL_CHECKOUTS = metrics.counter(
+    'db_pool_checkouts_total',
+    'Pool checkouts per alias and result: idle (reused), new (opened), waited (pool was full), timeout')
+POOL_IN_USE = metrics.histogram(
+    'db_pool_connections_in_use', 'Connections in use right after each checkout, per alias',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+POOL_DISCARDED = metrics.counter(
+    'db_pool_discarded_total', 'Connections closed by the pool per alias and reason (unhealthy, broken, idle)')
+
+DEFAULTS = {'MIN_SIZE': 0, 'MAX_SIZE': 10, 'TIMEOUT': 30.0, 'MAX_IDLE': 300.0, 'HEALTH_CHECKS': True}
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def ping(connection):
+    """True if a DB-API connection still answers a trivial query"""
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+        # Outside autocommit the query opened a transaction (psycopg), which
+        # would stop Django from switching autocommit on when it takes over
+        if not getattr(connection, 'autocommit', True):
+            connection.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections made by ``connect()``"""
+
+    def __init__(self, connect, alias='default', min_size=0, max_size=10, timeout=30.0, max_idle=300.0,
+                 health_checks=True):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError('POOL needs 0 <= MIN_SIZE <= MAX_SIZE and MAX_SIZE >= 1')
+        self.connect = connect
+        self.alias = alias
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_checks = health_checks
+        # (connection, returned at); returned to the right, reused from the right
+        # so busy periods keep using the same few connections
+        self._idle = deque()
+        self._size = 0  # open connections, idle or in use
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+
+    def _after_fork(self):
+        # A forked child shares the parent's sockets; closing them would end the
+        # parent's sessions, so the child just forgets them
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._size = 0
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            self._after_fork()
+            while True:
+                if self._idle:
+                    connection, result = self._idle.pop()[0], 'idle'
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot now, connect outside the lock
+                    self._size += 1
+                    connection, result = None, 'new'
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    POOL_CHECKOUTS.inc(alias=self.alias, result='timeout')
+                    raise PoolTimeout(f'No connection to {self.alias!r} became free within {self.timeout}s '
+                                      f'(all {self.max_size} in use)')
+                waited = True
+                self._cond.wait(remaining)
+            in_use = self._size - len(self._idle)
+
+        if connection is not None and self.health_checks and not ping(connection):
+            POOL_DISCARDED.inc(alias=self.alias, reason='unhealthy')
+            _close_quietly(connection)
+            connection = None  # reopen in the same slot
+        if connection is None:
+            try:
+                connection = self.connect()
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        POOL_WAIT.observe(time.monotonic() - start, alias=self.alias)
+        POOL_CHECKOUTS.inc(alias=self.alias, result='waited' if waited else result)
+        POOL_IN_USE.observe(in_use, alias=self.alias)
+        return connection
+
+    def release(self, connection, discard=False):
+        """Return a connection; ``discard`` closes it instead (e.g. it failed to reset)"""
+        expired = []
+        with self._cond:
+            if self._pid != os.getpid():
+                return  # checked out before a fork: not this process's to pool or close
+            if discard:
+                self._size -= 1
+                expired.append(connection)
+                POOL_DISCARDED.inc(alias=self.alias, reason='broken')
+            else:
+                now = time.monotonic()
+                self._idle.append((connection, now))
+                while self._size > self.min_size and self._idle and now - self._idle[0][1] > self.max_idle:
+                    expired.append(self._idle.popleft()[0])
+                    self._size -= 1
+                    POOL_DISCARDED.inc(alias=self.alias, reason='idle')
+            self._cond.notify()
+        for stale in expired:
+            _close_quietly(stale)
+
+    def fill(self):
+        """Open connections until MIN_SIZE are open"""
+        while True:
+            with self._cond:
+                self._after_fork()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self.connect()
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((connection, time.monotonic()))
+                self._cond.notify()
+
+    def close(self):
+        """Close every idle connection; connections in use are closed when returned"""
+        with self._cond:
+            self._after_fork()
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self.min_size = 0
+        for connection in idle:
+            _close_quietly(connection)
+
+    def stats(self):
+        with self._cond:
+            return {'size': self._size, 'idle': len(self._idle), 'in_use': self._size - len(self._idle),
+                    'max_size': self.max_size}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(wrapper, connect):
+    """The process-wide pool of a DatabaseWrapper's database, created on first use"""
+    settings_dict = wrapper.settings_dict
+    key = (wrapper.alias, settings_dict['NAME'], settings_dict.get('HOST'), settings_dict.get('PORT'),
+           settings_dict.get('USER'))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+            pool = _pools[key] = ConnectionPool(
+                connect, alias=wrapper.alias, min_size=options['MIN_SIZE'], max_size=options['MAX_SIZE'],
+                timeout=options['TIMEOUT'], max_idle=options['MAX_IDLE'], health_checks=options['HEALTH_CHECKS'])
+        return pool
+
+
+def close_pools(alias=None):
+    """Close the idle connections of every pool (of ``alias``), e.g. before dropping a test database"""
+    with _pools_lock:
+        pools = [pool for (pool_alias, *_), pool in _pools.items() if alias is None or pool_alias == alias]
+    for pool in pools:
+        pool.close()
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Mixed into a backend's DatabaseWrapper: connecting checks a connection out
+    of the pool and closing checks it back in, rolled back and in the
+    configured autocommit mode, or closes it if that fails.
+    """
+
+    def get_new_connection(self, conn_params):
+        # Remembered so the connection goes back to the pool it came from, even
+        # if settings_dict changes meanwhile (as when tests switch databases)
+        self.pool = pool_for(self, functools.partial(super().get_new_connection, conn_params))
+        try:
+            self.pool.fill()
+            return self.pool.acquire()
+        except PoolTimeout as exc:
+            # Raised as the driver's error so Django turns it into django.db.OperationalError
+            raise self.Database.OperationalError(str(exc)) from exc
+
+    def connection_in_transaction(self, connection):
+        """Whether the raw connection has an open transaction; each backend knows how to ask"""
+        raise NotImplementedError
+
+    def _close(self):
+        if self.connection is None:
+            return
+        discard = False
+        try:
+            if self.connection_in_transaction(self.connection):
+                self.connection.rollback()
+            # Pooled connections are handed out in the configured autocommit mode
+            if self.autocommit != self.settings_dict['AUTOCOMMIT']:
+                self._set_autocommit(self.settings_dict['AUTOCOMMIT'])
+        except Exception:
+            discard = True
+        self.pool.release(self.connection, discard=discard)
@@ -0,0 +1,19 @@
+"""PostgreSQL backend drawing connections from a bounded pool (backend/db/pool.py)"""
+from django.db.backends.postgresql import base, creation
+
+from ..pool import PooledDatabaseWrapperMixin, close_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections to the test database would block DROP DATABASE
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def connection_in_transaction(self, connection):
+        # TRANSACTION_STATUS_IDLE in psycopg2, TransactionStatus.IDLE in psycopg 3
+        return connection.info.transaction_status != 0
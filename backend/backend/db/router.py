@@ -0,0 +1,205 @@
+"""
+Read replicas.
+
+With DATABASE_REPLICAS configured (DATABASE_REPLICA_URLS in settings),
+ReplicaRouter sends the reads of a request to a randomly chosen replica and
+every write to the primary (``default``). A request reads from the primary
+instead once it has written, inside a transaction on the primary, and for
+REPLICA_PIN_SECONDS after a request from the same client wrote - so users
+read their own writes although replication lags behind.
+
+ReplicaPinningMiddleware keeps track of that per request. It pins clients by
+their Authorization header - anonymous ones by their address, as forwarded by
+TRUSTED_PROXY_COUNT proxies - in the REPLICA_PIN_CACHE cache, so every worker
+sees the pin. Outside requests (management commands, shells) everything goes
+to the primary.
+
+Every REPLICA_LAG_CHECK_SECONDS each process asks the replicas how far they
+trail the primary. A replica more than REPLICA_MAX_LAG_SECONDS behind, or one
+that does not answer, takes no reads until it has caught up again. With no
+replica available reads go to the primary.
+"""
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+READS = metrics.counter(
+    'db_router_reads_total',
+    'Reads routed per database and reason: replica, written, pinned, transaction, unavailable')
+REPLICA_LAG = metrics.histogram(
+    'db_replica_lag_seconds', 'Replication lag measured per replica',
+    buckets=(0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+EJECTIONS = metrics.counter('db_replica_ejections_total', 'Replicas taken out of the read pool, per replica')
+
+# 0 while a standby has replayed everything it received, so an idle primary
+# does not look like lag; 0 on a server that is not a standby
+POSTGRESQL_LAG_SQL = '''
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+'''
+
+# The current request's routing state; None outside requests
+_request = contextvars.ContextVar('replica_routing', default=None)
+
+
+class RequestRouting:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replication_lag(alias):
+    """Seconds replica ``alias`` trails the primary; 0 for databases without streaming replication"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(POSTGRESQL_LAG_SQL)
+        return float(cursor.fetchone()[0] or 0)
+
+
+class ReplicaMonitor:
+    """The replicas fit to read from, rechecked every ``interval`` seconds by whichever thread asks first"""
+
+    def __init__(self, aliases, max_lag, interval):
+        self.aliases = list(aliases)
+        self.max_lag = max_lag
+        self.interval = interval
+        self.healthy = list(aliases)
+        self.checked_at = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        checked_at = self.checked_at
+        if (checked_at is None or time.monotonic() - checked_at >= self.interval) \
+                and self._lock.acquire(blocking=False):
+            # The others keep using the previous result meanwhile
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+        return self.healthy
+
+    def check(self):
+        healthy = []
+        for alias in self.aliases:
+            try:
+                lag = replication_lag(alias)
+            except Exception:
+                logger.warning("Replica %s did not report its lag", alias, exc_info=True)
+                lag = None
+            else:
+                REPLICA_LAG.observe(lag, database=alias)
+            if lag is not None and lag <= self.max_lag:
+                if alias not in self.healthy:
+                    logger.info("Replica %s back in the read pool (lag %.1fs)", alias, lag)
+                healthy.append(alias)
+            elif alias in self.healthy:
+                logger.warning("Replica %s taken out of the read pool (lag %s)", alias,
+                               'unknown' if lag is None else f'{lag:.1f}s')
+                EJECTIONS.inc(database=alias)
+        self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.monitor = ReplicaMonitor(settings.DATABASE_REPLICAS, settings.REPLICA_MAX_LAG_SECONDS,
+                                      settings.REPLICA_LAG_CHECK_SECONDS)
+        self.databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+
+    def db_for_read(self, model, **hints):
+        request = _request.get()
+        if request is None:
+            return DEFAULT_DB_ALIAS
+        if request.wrote or request.pinned:
+            reason = 'written' if request.wrote else 'pinned'
+        elif connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            reason = 'transaction'
+        else:
+            replicas = self.monitor.available()
+            if replicas:
+                alias = random.choice(replicas)
+                READS.inc(database=alias, reason='replica')
+                return alias
+            reason = 'unavailable'
+        READS.inc(database=DEFAULT_DB_ALIAS, reason=reason)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        request = _request.get()
+        if request is not None:
+            request.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's data: objects read from either relate freely
+        if obj1._state.db in self.databases and obj2._state.db in self.databases:
+            return True
+        return None
+
+
+def client_address(request):
+    """The client's address: from X-Forwarded-For as appended by the TRUSTED_PROXY_COUNT proxies in front"""
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    count = settings.TRUSTED_PROXY_COUNT
+    if count and len(forwarded) >= count and forwarded[-count]:
+        return forwarded[-count]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request):
+    """
+    Cache key pinning the client that sent ``request``: its credentials, or
+    for anonymous requests (registering, logging in) its address
+    """
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        return f"replica-pin:auth:{hashlib.sha256(authorization.encode()).hexdigest()}"
+    return f'replica-pin:addr:{client_address(request)}'
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cache = caches[settings.REPLICA_PIN_CACHE]
+        self.pin_seconds = settings.REPLICA_PIN_SECONDS
+
+    def __call__(self, request):
+        key = client_key(request)
+        try:
+            pinned = self.cache.get(key) is not None
+        except Exception:
+            # Without the cache we cannot tell whether the client just wrote: stay on the primary
+            logger.warning("Could not look up replica pins", exc_info=True)
+            pinned = True
+        routing = RequestRouting(pinned)
+        token = _request.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        if routing.wrote:
+            try:
+                self.cache.set(key, 1, timeout=self.pin_seconds)
+            except Exception:
+                logger.warning("Could not pin the client to the primary", exc_info=True)
+        return response
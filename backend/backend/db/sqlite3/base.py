@@ -0,0 +1,9 @@
+"""SQLite backend drawing connections from a bounded pool (backend/db/pool.py)"""
+from django.db.backends.sqlite3 import base
+
+from ..pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def connection_in_transaction(self, connection):
+        return connection.in_transaction
@@ -0,0 +1,100 @@
+"""
+Fast JSON for the REST API.
+
+FastJSONRenderer / FastJSONParser are drop-in replacements for DRF's
+JSONRenderer / JSONParser (see REST_FRAMEWORK in settings.py). They encode
+and decode with orjson when it is installed and JSON_BACKEND is 'orjson',
+and with the standard library - exactly as DRF does - otherwise.
+
+orjson encodes datetimes, UUIDs, dataclasses and dict/list/str subclasses
+(ReturnDict, ReturnList, ErrorDetail) in C. Decimals are the exception:
+serializers already turn DecimalFields such as Payment.amount into strings
+(COERCE_DECIMAL_TO_STRING), so only Decimals placed in a response by hand -
+along with lazy translations, querysets and the like - go through DRF's
+encoder as a fallback, and come out exactly as they would from DRF. (Raw
+datetimes keep their microseconds with orjson, where DRF's encoder cuts them
+to milliseconds; serializer fields are strings by then and unaffected.)
+"""
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders, json
+
+try:
+    import orjson
+except ImportError:  # optional: everything works on the standard library, only slower
+    orjson = None
+
+_fallback = encoders.JSONEncoder().default
+
+if orjson is not None:
+    # DRF writes UTC as "Z" too; non-string keys are turned into strings like json.dumps does
+    _OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def backend():
+    """Name of the JSON implementation in use: 'orjson' or 'json'"""
+    return 'orjson' if orjson is not None and settings.JSON_BACKEND == 'orjson' else 'json'
+
+
+def dumps(data, indent=None):
+    """Compact UTF-8 JSON bytes, with the same output rules as DRF's JSONRenderer defaults"""
+    if backend() == 'orjson':
+        try:
+            # orjson only knows one indent width
+            ret = orjson.dumps(data, default=_fallback,
+                               option=_OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the standard library handles
+            return _stdlib_dumps(data, indent)
+        # Keep the output a strict JavaScript subset, like DRF
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+    return _stdlib_dumps(data, indent)
+
+
+def _stdlib_dumps(data, indent=None):
+    ret = json.dumps(data, cls=encoders.JSONEncoder, indent=indent, ensure_ascii=False,
+                     separators=(', ', ': ') if indent else (',', ':'))
+    return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def loads(data):
+    """Parse JSON bytes; NaN and Infinity are rejected on both backends"""
+    if backend() == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Non-default UNICODE_JSON / COMPACT_JSON / STRICT_JSON settings keep DRF's own encoding
+        if self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return dumps(data, indent=self.get_indent(accepted_media_type, renderer_context or {}))
+
+
+class FastJSONParser(parsers.JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        # orjson reads UTF-8 only; other charsets (and non-strict parsing) go through DRF
+        if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8') or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse for plain Django views, encoded like the API's responses"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
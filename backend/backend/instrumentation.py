@@ -0,0 +1,194 @@
+"""
+Per-request performance instrumentation.
+
+RequestTimingMiddleware measures where a request spends its time - total,
+view, response rendering, DB (query count and time via connection execute
+wrappers), authentication and external calls such as Stripe and SMTP - and
+reports it three ways:
+
+* a ``Server-Timing`` header, only for trusted callers (see _is_trusted)
+* one structured log line per request on the ``backend.timing`` logger
+* per-view histograms in backend.metrics, served at /metrics
+
+Code outside the middleware adds to the current request's numbers with
+record() / timed(), e.g. record('stripe', 0.120).
+"""
+import hmac
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import metrics
+
+logger = logging.getLogger('backend.timing')
+
+_current = ContextVar('request_timings', default=None)
+
+REQUEST_DURATION = metrics.histogram(
+    'http_request_duration_seconds', 'Total time spent handling a request, per view')
+REQUEST_DB_DURATION = metrics.histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request, per view')
+REQUEST_DB_QUERIES = metrics.histogram(
+    'http_request_db_queries', 'Number of database queries per request, per view',
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100))
+REQUEST_EXTERNAL_DURATION = metrics.histogram(
+    'http_request_external_duration_seconds', 'Time spent calling external services per request')
+REQUESTS = metrics.counter('http_requests_total', 'Requests handled, per view and status code')
+
+
+class RequestTimings:
+    """Accumulates the timing breakdown of one request"""
+    __slots__ = ('start', 'view_start', 'view', 'render_start', 'render', 'queries', 'db', 'external')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view_start = None
+        self.view = 0.0
+        self.render_start = None
+        self.render = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.external = {}
+
+
+def record(name, seconds):
+    """Add ``seconds`` spent in ``name`` (e.g. 'stripe', 'smtp', 'auth') to the current request"""
+    timings = _current.get()
+    if timings is not None:
+        timings.external[name] = timings.external.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.queries += 1
+            timings.db += time.perf_counter() - start
+
+
+def _view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    # URL names keep label cardinality bounded; fall back to the route pattern
+    return match.view_name or match.route
+
+
+def _is_trusted(request):
+    """Server-Timing leaks internals, so only DEBUG, a shared token or staff users get it"""
+    if settings.DEBUG:
+        return True
+    token = settings.SERVER_TIMING_TOKEN
+    supplied = request.headers.get('X-Server-Timing-Token')
+    if token and supplied and hmac.compare_digest(token, supplied):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+def _server_timing(timings, total):
+    entries = [
+        f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+        f'view;dur={timings.view * 1000:.1f}',
+        f'render;dur={timings.render * 1000:.1f}',
+    ]
+    entries += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(timings.external.items())]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_db_wrapper))
+                response = self.get_response(request)
+            total = time.perf_counter() - timings.start
+            if timings.view_start is not None:
+                # View time excludes response rendering, which is reported separately
+                timings.view = (timings.render_start or time.perf_counter()) - timings.view_start
+            self._report(request, response, timings, total)
+            return response
+        finally:
+            _current.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns; time it with a post-render callback
+        timings = _current.get()
+        if timings is not None:
+            timings.render_start = time.perf_counter()
+
+            def rendered(response):
+                timings.render = time.perf_counter() - timings.render_start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _report(self, request, response, timings, total):
+        view = _view_label(request)
+        REQUEST_DURATION.observe(total, view=view, method=request.method)
+        REQUEST_DB_DURATION.observe(timings.db, view=view)
+        REQUEST_DB_QUERIES.observe(timings.queries, view=view)
+        for name, seconds in timings.external.items():
+            REQUEST_EXTERNAL_DURATION.observe(seconds, view=view, service=name)
+        REQUESTS.inc(view=view, method=request.method, status=str(response.status_code))
+
+        if _is_trusted(request):
+            response['Server-Timing'] = _server_timing(timings, total)
+
+        logger.info(
+            "%s %s %s %.1fms view=%s queries=%d db=%.1fms render=%.1fms external=%s",
+            request.method, request.path, response.status_code, total * 1000, view,
+            timings.queries, timings.db * 1000, timings.render * 1000,
+            {name: round(seconds * 1000, 1) for name, seconds in timings.external.items()},
+            extra={'timing': {
+                'method': request.method, 'path': request.path, 'status': response.status_code,
+                'view': view, 'total_ms': total * 1000, 'queries': timings.queries,
+                'db_ms': timings.db * 1000, 'render_ms': timings.render * 1000,
+                'external_ms': {name: seconds * 1000 for name, seconds in timings.external.items()},
+            }},
+        )
+
+        if settings.METRICS_DIR:
+            metrics.flush(settings.METRICS_DIR, interval=settings.METRICS_FLUSH_INTERVAL)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint - restricted to METRICS_ALLOWED_IPS or a bearer token"""
+    token = settings.METRICS_TOKEN
+    auth = request.headers.get('Authorization', '')
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS or (
+        token and hmac.compare_digest(auth, f'Bearer {token}')
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    body = metrics.render_prometheus(metrics.gather(settings.METRICS_DIR))
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,151 @@
+"""
+Non-blocking, structured logging.
+
+Request threads never format or write log records themselves. The root logger
+hands records to a QueueHandler (see queue_handler()), which only puts them on
+a bounded in-memory queue; a listener thread takes them off and passes them to
+the real handlers, which format them (JsonFormatter: one JSON object per line)
+and write them out.
+
+* Messages are formatted lazily on the listener thread, so always log with
+  %-style arguments - logger.info('Sent to %s', email) - never f-strings.
+  Arguments should not be mutated after the call.
+* When the queue is full the record is dropped and counted in the
+  ``log_records_dropped_total`` metric instead of blocking the request.
+* SamplingFilter keeps only a fraction of the records of noisy loggers
+  (per-request timing lines, say); warnings and errors are always kept.
+
+Wired up through LOGGING in settings.py.
+"""
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from . import metrics
+
+DROPPED = metrics.counter('log_records_dropped_total', 'Log records dropped because the log queue was full')
+
+# Attributes every LogRecord has; anything else on a record came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, plus any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        # default=str: objects passed in extra= (e.g. Django's request) are logged by their repr
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the records below WARNING per logger, e.g.
+    rates={'backend.timing': 0.1} keeps one timing line in ten. The most
+    specific logger name wins, so 'django' also covers 'django.server'.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Unlike records, the stop marker must get through: wait for room
+        self.queue.put(self._sentinel)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A QueueHandler that never blocks: full queue means the record is dropped and counted"""
+
+    listener = None
+    # logging.Handler only tracks this itself from Python 3.10
+    closed = False
+
+    def prepare(self, record):
+        # The stock prepare() formats the message here, on the calling thread.
+        # Records stay in this process, so they can go on the queue as they are
+        # and be formatted by the listener's handlers instead.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc(level=record.levelname)
+
+    def close(self):
+        # logging.shutdown() at exit and dictConfig() reconfiguring both close
+        # handlers; stopping the listener writes out whatever is still queued
+        self.closed = True
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+FORMATTERS = {
+    'json': JsonFormatter,
+    'text': lambda: logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'),
+}
+
+
+def queue_handler(format='json', maxsize=10000, stream=None):
+    """
+    dictConfig factory: a DroppingQueueHandler plus a started listener thread
+    writing the records to ``stream`` (default stderr), formatted as ``format``
+    ('json' or 'text').
+    """
+    if format not in FORMATTERS:
+        raise ValueError(f'Unknown log format {format!r}; expected one of {sorted(FORMATTERS)}')
+    # Created here rather than in LOGGING: only the listener thread may write to it
+    target = logging.StreamHandler(stream)
+    target.setFormatter(FORMATTERS[format]())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize))
+
+    def start():
+        handler.listener = _Listener(handler.queue, target, respect_handler_level=True)
+        handler.listener.start()
+
+    def restart():
+        # Forked children (gunicorn workers) get no copy of the listener thread,
+        # and the inherited queue's lock may have been held mid-fork
+        if not handler.closed:
+            handler.queue = queue.Queue(maxsize)
+            start()
+
+    start()
+    os.register_at_fork(after_in_child=restart)
+    return handler
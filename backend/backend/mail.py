@@ -0,0 +1,11 @@
+from django.core.mail.backends.smtp import EmailBackend
+
+from .instrumentation import timed
+
+
+class TimedSMTPEmailBackend(EmailBackend):
+    """SMTP backend that reports the time spent talking to the mail server as 'smtp'"""
+
+    def send_messages(self, email_messages):
+        with timed('smtp'):
+            return super().send_messages(email_messages)
@@ -0,0 +1,306 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Metrics are registered once at import time and observed from request code:
+
+    STRIPE_LATENCY = metrics.histogram('stripe_request_duration_seconds', 'Stripe API latency')
+    STRIPE_LATENCY.observe(0.12, method='POST', endpoint='/v1/payment_intents')
+
+Observations are lock-free: every thread writes only to its own shard, and
+shards are merged when metrics are read. Shards of finished threads are folded
+into one, so thread-per-request servers do not keep a shard per request. With
+several gunicorn workers, each process periodically dumps its merged snapshot
+to METRICS_DIR (one file per pid, see flush()); the /metrics view adds them
+all together. The gunicorn master folds the file of a worker that exited into
+metrics_exited.json (see retire()), so recycled workers neither linger nor
+take their counts with them.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+# Bucket upper bounds in seconds - tuned for web requests and API calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation=''):
+        self.name = name
+        self.documentation = documentation
+        self._local = threading.local()
+        # {thread: shard} of the live threads that observed; finished threads'
+        # shards are folded into _retired. Only reads and new threads lock.
+        self._shards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_finished()
+                self._shards[threading.current_thread()] = shard
+        return shard
+
+    def _retire_finished(self):
+        # A finished thread no longer writes to its shard: safe to fold without it
+        for thread in [thread for thread in self._shards if not thread.is_alive()]:
+            self._fold(self._retired, self._shards.pop(thread))
+
+    def _fold(self, merged, shard):
+        raise NotImplementedError
+
+    def snapshot(self):
+        """
+        Return {labels: value} merged across threads; for histograms value is
+        {'counts': [...], 'sum': float, 'count': int}
+        """
+        merged = {}
+        with self._lock:
+            self._retire_finished()
+            self._fold(merged, self._retired)
+            for shard in self._shards.values():
+                self._fold(merged, shard)
+        return merged
+
+    def reset(self):
+        with self._lock:
+            self._retired.clear()
+            for shard in self._shards.values():
+                shard.clear()
+
+
+class Counter(_Metric):
+    """Monotonic counter keyed by a set of label values"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = tuple(sorted(labels.items()))
+        shard[key] = shard.get(key, 0) + amount
+
+    def _fold(self, merged, shard):
+        for key, value in list(shard.items()):
+            merged[key] = merged.get(key, 0) + value
+
+
+class Histogram(_Metric):
+    """Cumulative histogram keyed by a set of label values"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation='', buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = tuple(sorted(labels.items()))
+        series = shard.get(key)
+        if series is None:
+            # One counter per bucket plus an overflow (+Inf) slot
+            series = shard[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def _fold(self, merged, shard):
+        for key, series in list(shard.items()):
+            _merge_series(merged, key, series)
+
+
+def _merge_series(merged, key, series):
+    target = merged.get(key)
+    if target is None:
+        merged[key] = {'counts': list(series['counts']), 'sum': series['sum'], 'count': series['count']}
+    else:
+        target['counts'] = [a + b for a, b in zip(target['counts'], series['counts'])]
+        target['sum'] += series['sum']
+        target['count'] += series['count']
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, *args):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = cls(name, *args)
+        return _registry[name]
+
+
+def histogram(name, documentation='', buckets=DEFAULT_BUCKETS):
+    """Get or create the histogram registered under ``name``"""
+    return _register(Histogram, name, documentation, buckets)
+
+
+def counter(name, documentation=''):
+    """Get or create the counter registered under ``name``"""
+    return _register(Counter, name, documentation)
+
+
+def registry():
+    with _registry_lock:
+        return dict(_registry)
+
+
+# ---------------------------------------------------------------------------
+# Cross-process aggregation
+
+def collect():
+    """JSON-friendly snapshot of every metric in this process"""
+    data = {}
+    for name, metric in registry().items():
+        entry = {'type': metric.type, 'doc': metric.documentation,
+                 'series': [[list(map(list, key)), value] for key, value in metric.snapshot().items()]}
+        if metric.type == 'histogram':
+            entry['buckets'] = list(metric.buckets)
+        data[name] = entry
+    return data
+
+
+# Where the gunicorn master keeps the totals of workers that exited
+EXITED_FILE = 'metrics_exited.json'
+
+_last_flush = 0.0
+
+
+def _write(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def flush(directory, interval=0.0):
+    """
+    Write this process's snapshot to ``directory``/metrics_<pid>.json.
+    With ``interval`` set, does nothing if the last flush was more recent.
+    """
+    global _last_flush
+    now = time.monotonic()
+    if now - _last_flush < interval:
+        return False
+    _last_flush = now
+
+    os.makedirs(directory, exist_ok=True)
+    _write(os.path.join(directory, f'metrics_{os.getpid()}.json'), collect())
+    return True
+
+
+def _load(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def retire(directory, pid):
+    """
+    Fold the snapshot worker ``pid`` left in ``directory`` into EXITED_FILE and
+    remove it, so a worker reusing the pid starts from zero. Only the gunicorn
+    master calls this (child_exit), one worker at a time.
+    """
+    path = os.path.join(directory, f'metrics_{pid}.json')
+    snapshot = _load(path)
+    if snapshot is not None:
+        exited = os.path.join(directory, EXITED_FILE)
+        merged = merge_snapshots([_load(exited) or {}, snapshot])
+        _write(exited, {
+            name: {**entry, 'series': [[list(map(list, key)), value] for key, value in entry['series'].items()]}
+            for name, entry in merged.items()
+        })
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def clear(directory):
+    """Remove every snapshot in ``directory`` - those of an earlier server run"""
+    for path in glob.glob(os.path.join(directory, 'metrics_*')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def merge_snapshots(snapshots):
+    """Add several collect() results together"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            target = merged.setdefault(name, {**entry, 'series': {}})
+            for key, value in entry['series']:
+                key = tuple(tuple(pair) for pair in key)
+                if entry['type'] == 'histogram':
+                    _merge_series(target['series'], key, value)
+                else:
+                    target['series'][key] = target['series'].get(key, 0) + value
+    return merged
+
+
+def gather(directory=None):
+    """
+    Merged metrics of this process plus, when ``directory`` is given, the
+    snapshots other worker processes flushed there.
+    """
+    snapshots = [collect()]
+    if directory:
+        own = os.path.join(directory, f'metrics_{os.getpid()}.json')
+        for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+            if path == own:
+                continue  # the live snapshot above is fresher
+            snapshot = _load(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    return merge_snapshots(snapshots)
+
+
+# ---------------------------------------------------------------------------
+# Prometheus text format
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(metrics):
+    """Render gather() output in the Prometheus text exposition format (0.0.4)"""
+    lines = []
+    for name in sorted(metrics):
+        entry = metrics[name]
+        lines.append(f'# HELP {name} {entry["doc"]}')
+        lines.append(f'# TYPE {name} {entry["type"]}')
+        for key in sorted(entry['series']):
+            value = entry['series'][key]
+            if entry['type'] == 'histogram':
+                cumulative = 0
+                bounds = list(entry['buckets']) + [float('inf')]
+                for bound, count in zip(bounds, value['counts']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(key, [("le", _number(bound))])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(key)} {_number(value["sum"])}')
+                lines.append(f'{name}_count{_labels(key)} {value["count"]}')
+            else:
+                lines.append(f'{name}{_labels(key)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
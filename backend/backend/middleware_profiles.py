@@ -0,0 +1,125 @@
+"""
+Per-URL-prefix middleware stacks.
+
+MiddlewareProfileRouter sits at the end of MIDDLEWARE and sends each request
+through one of several middleware chains, picked by the longest matching
+prefix in MIDDLEWARE_PROFILES; paths that match none (the admin, DRF's
+browsable-API login) get MIDDLEWARE_DEFAULT_PROFILE, the full session/CSRF/
+auth/messages stack. The API authenticates with JWT only, so its profile
+leaves that machinery out.
+
+Every chain is built once at startup, the way Django builds MIDDLEWARE, and
+the router forwards process_view / process_template_response /
+process_exception to the middleware of the chain the request went through.
+
+Django's admin and security checks look for their middleware in MIDDLEWARE
+itself; settings.py silences those and check_profiles() below runs the same
+checks, under its own ids, against the profile that serves /admin/.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+ADMIN_PREFIX = '/admin/'
+
+
+def profile_for(path):
+    """Middleware paths for a request path: longest matching prefix, else the default profile"""
+    for prefix in sorted(settings.MIDDLEWARE_PROFILES, key=len, reverse=True):
+        if path.startswith(prefix):
+            return settings.MIDDLEWARE_PROFILES[prefix]
+    return settings.MIDDLEWARE_DEFAULT_PROFILE
+
+
+class _Chain:
+    """One built middleware chain plus its hook methods, in the order Django calls them"""
+
+    def __init__(self, middleware_paths, get_response):
+        self.view_hooks = []
+        self.template_response_hooks = []
+        self.exception_hooks = []
+        handler = get_response
+        for path in reversed(middleware_paths):
+            try:
+                instance = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, 'process_view'):
+                self.view_hooks.insert(0, instance.process_view)
+            if hasattr(instance, 'process_template_response'):
+                self.template_response_hooks.append(instance.process_template_response)
+            if hasattr(instance, 'process_exception'):
+                self.exception_hooks.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self.handler = handler
+
+
+class MiddlewareProfileRouter:
+    def __init__(self, get_response):
+        self.default = _Chain(settings.MIDDLEWARE_DEFAULT_PROFILE, get_response)
+        # Longest prefix first, so the first match is the most specific one
+        self.prefixes = [
+            (prefix, _Chain(settings.MIDDLEWARE_PROFILES[prefix], get_response))
+            for prefix in sorted(settings.MIDDLEWARE_PROFILES, key=len, reverse=True)
+        ]
+
+    def _chain(self, request):
+        chain = getattr(request, '_middleware_profile', None)
+        if chain is None:
+            path = request.path_info
+            chain = next((chain for prefix, chain in self.prefixes if path.startswith(prefix)), self.default)
+            request._middleware_profile = chain
+        return chain
+
+    def __call__(self, request):
+        return self._chain(request).handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for hook in self._chain(request).view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        for hook in self._chain(request).template_response_hooks:
+            response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for hook in self._chain(request).exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+@checks.register(checks.Tags.security, checks.Tags.admin)
+def check_profiles(app_configs=None, **kwargs):
+    """admin.E408-E410 and security.W002/W003 against the profile that serves the admin"""
+    from django.apps import apps
+
+    if 'backend.middleware_profiles.MiddlewareProfileRouter' not in settings.MIDDLEWARE:
+        return []
+    admin = list(settings.MIDDLEWARE) + list(profile_for(ADMIN_PREFIX))
+    issues = []
+    if apps.is_installed('django.contrib.admin'):
+        for path, check_id in (
+            ('django.contrib.auth.middleware.AuthenticationMiddleware', 'middleware_profiles.E408'),
+            ('django.contrib.messages.middleware.MessageMiddleware', 'middleware_profiles.E409'),
+            ('django.contrib.sessions.middleware.SessionMiddleware', 'middleware_profiles.E410'),
+        ):
+            if path not in admin:
+                issues.append(checks.Error(f"'{path}' must be in the middleware profile serving "
+                                           f"{ADMIN_PREFIX} in order to use the admin application.",
+                                           id=check_id, obj='MIDDLEWARE_DEFAULT_PROFILE'))
+    for path, check_id in (
+        ('django.middleware.clickjacking.XFrameOptionsMiddleware', 'middleware_profiles.W002'),
+        ('django.middleware.csrf.CsrfViewMiddleware', 'middleware_profiles.W003'),
+    ):
+        if path not in admin:
+            issues.append(checks.Warning(f"'{path}' is not in the middleware profile serving {ADMIN_PREFIX}.",
+                                         id=check_id, obj='MIDDLEWARE_DEFAULT_PROFILE'))
+    return issues
@@ -0,0 +1,190 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware profiles a request when either
+
+* it carries an ``X-Profile`` header holding a token signed for a staff user
+  (see make_token() / `manage.py profile_token`), or
+* it is picked by random sampling at PROFILING_SAMPLE_RATE.
+
+The profile is written to LOGS_DIR/profiles as cProfile stats (``.pstats``,
+open with snakeviz or pstats) or as collapsed stacks from a sampling profiler
+(``.folded``, feed to flamegraph.pl or speedscope). Old files are rotated out
+by count and total size.
+
+With no sample rate and no header, requests take a single dict lookup; with
+profiling switched off entirely the middleware removes itself from the chain.
+"""
+import cProfile
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+FORMAT_HEADER = 'HTTP_X_PROFILE_FORMAT'
+SALT = 'backend.profiling'
+FORMATS = ('pstats', 'collapsed')
+
+# Keeps file names unique within a process even for identical requests in one second
+_sequence = itertools.count()
+
+
+def make_token(user):
+    """Token for the X-Profile header; only valid while ``user`` is active staff"""
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def _token_user(token):
+    try:
+        user_id = signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(pk=user_id, is_staff=True, is_active=True).first()
+
+
+class StackSampler:
+    """
+    Samples one thread's stack every ``interval`` seconds from a helper thread
+    and counts collapsed stacks ("module:function;module:function ...").
+    Cheaper than cProfile on deep call trees, and the output is flamegraph-ready.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def render(self, max_bytes):
+        """Collapsed stacks, most frequent first, cut off at ``max_bytes``"""
+        lines, size = [], 0
+        for stack, count in self.stacks.most_common():
+            line = f'{stack} {count}\n'
+            size += len(line)
+            if size > max_bytes:
+                break
+            lines.append(line)
+        return ''.join(lines)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.directory = settings.PROFILING_DIR
+
+    def __call__(self, request):
+        token = request.META.get(HEADER)
+        if token is None and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        requested = request.META.get(FORMAT_HEADER)
+        if token is not None:
+            if _token_user(token) is None:
+                # A bad or expired token just means no profile
+                return self.get_response(request)
+            fmt = requested if requested in FORMATS else settings.PROFILING_FORMAT
+        else:
+            fmt = settings.PROFILING_FORMAT
+        response, path = self._profile(request, fmt)
+        if token is not None and path:
+            response['X-Profile-Id'] = os.path.basename(path)
+        return response
+
+    def _profile(self, request, fmt):
+        start = time.perf_counter()
+        if fmt == 'collapsed':
+            sampler = StackSampler(threading.get_ident(), settings.PROFILING_SAMPLE_INTERVAL)
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        try:
+            path = self._path(request, elapsed_ms, 'folded' if fmt == 'collapsed' else 'pstats')
+            if fmt == 'collapsed':
+                with open(path, 'w') as handle:
+                    handle.write(sampler.render(settings.PROFILING_MAX_FILE_BYTES))
+            else:
+                profiler.dump_stats(path)
+                if os.path.getsize(path) > settings.PROFILING_MAX_FILE_BYTES:
+                    os.remove(path)
+                    logger.warning('Profile of %s %s exceeded PROFILING_MAX_FILE_BYTES; discarded',
+                                   request.method, request.path)
+                    return response, None
+            rotate(self.directory, settings.PROFILING_MAX_FILES, settings.PROFILING_MAX_BYTES)
+        except OSError:
+            logger.exception('Could not write profile for %s %s', request.method, request.path)
+            return response, None
+        logger.info('Profiled %s %s in %.1fms -> %s', request.method, request.path, elapsed_ms, path)
+        return response, path
+
+    def _path(self, request, elapsed_ms, extension):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-')[:60] or 'root'
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        name = f'{stamp}-{os.getpid()}-{next(_sequence)}-{request.method}-{slug}-{elapsed_ms:.0f}ms.{extension}'
+        return os.path.join(self.directory, name)
+
+
+def rotate(directory, max_files, max_bytes):
+    """Delete the oldest profiles until at most ``max_files`` totalling ``max_bytes`` remain"""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(('.pstats', '.folded')):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort(reverse=True)
+
+    kept_bytes = 0
+    for index, (_, size, path) in enumerate(entries):
+        kept_bytes += size
+        if index >= max_files or kept_bytes > max_bytes:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # another worker rotated it first
@@ -0,0 +1,165 @@
+"""
+Query plan checks for the hot ORM queries.
+
+Each entry in HOT_QUERIES builds the queryset a request path runs. explain()
+captures its plan - ``EXPLAIN (FORMAT JSON)`` on PostgreSQL, ``EXPLAIN QUERY
+PLAN`` on SQLite - and reduces it to a vendor-neutral list of nodes:
+
+    {'op': 'scan' | 'search' | 'sort' | ..., 'table': ..., 'index': ..., 'rows': ...}
+
+problems() flags full scans of large tables and sorts of more than a handful
+of rows; fingerprint() hashes the plan shape (operations, tables, indexes - not
+costs or row estimates) so backend/query_plans.json can pin the expected plan
+of every hot query per database vendor. Run the tests with
+UPDATE_QUERY_PLANS=1 to rewrite the stored fingerprints after an intended
+index or ORM change.
+"""
+import hashlib
+import json
+import os
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from api.models import Note
+from password_management.models import PasswordResetCode
+from payments.models import Payment
+
+FINGERPRINTS_PATH = os.path.join(os.path.dirname(__file__), 'query_plans.json')
+
+# Tables with at least this many rows must not be read with a full scan
+LARGE_TABLE_ROWS = 1000
+
+# Sorting more rows than this (estimated; PostgreSQL only) is flagged
+SORT_ROWS_LIMIT = 100
+
+
+# Hot queries, keyed by name: fn(params) -> queryset. ``params`` carries the
+# user, email, code and timestamps of one representative request.
+HOT_QUERIES = {
+    # NoteListCreate / NoteDelete
+    'notes_by_author': lambda p: Note.objects.filter(author=p['user']),
+    # Login by email, password reset request and verification
+    'user_by_email': lambda p: User.objects.filter(email=p['email']).order_by('pk')[:1],
+    # Login by username
+    'user_by_username': lambda p: User.objects.filter(username=p['username']).order_by('pk')[:1],
+    # PasswordResetRequestView rate limit
+    'reset_codes_recent': lambda p: PasswordResetCode.objects.filter(
+        user=p['user'], created_at__gte=p['since']).order_by('-created_at'),
+    # PasswordResetVerifyView
+    'reset_code_verify': lambda p: PasswordResetCode.objects.filter(
+        user=p['user'], code=p['code'], used=False, expires_at__gt=p['now']).order_by('pk')[:1],
+    # PaymentHistory (cursor pagination, newest first)
+    'payment_history': lambda p: Payment.objects.filter(user=p['user']).order_by('-created_at')[:21],
+    # reconcile_payments keyset walk
+    'pending_payments': lambda p: Payment.objects.filter(
+        status='pending', created_at__lt=p['now'], id__gt=0).order_by('id').values_list(
+        'id', 'payment_intent_id')[:500],
+}
+
+
+def explain(queryset):
+    """Return the plan of ``queryset`` as a list of normalized nodes"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            raw = cursor.fetchone()[0]
+            if isinstance(raw, str):
+                raw = json.loads(raw)
+            return list(_postgres_nodes(raw[0]['Plan']))
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [_sqlite_node(row[3]) for row in cursor.fetchall()]
+    raise NotImplementedError(f'No plan support for {connection.vendor}')
+
+
+_PG_OPS = {
+    'Seq Scan': 'scan',
+    'Index Scan': 'search',
+    'Index Only Scan': 'search',
+    'Bitmap Index Scan': 'search',
+    'Bitmap Heap Scan': 'bitmap',
+    'Sort': 'sort',
+    'Incremental Sort': 'sort',
+}
+
+
+def _postgres_nodes(plan, depth=0):
+    yield {
+        'op': _PG_OPS.get(plan['Node Type'], plan['Node Type'].lower()),
+        'table': plan.get('Relation Name'),
+        'index': plan.get('Index Name'),
+        'rows': plan.get('Plan Rows'),
+        'depth': depth,
+    }
+    for child in plan.get('Plans', ()):
+        yield from _postgres_nodes(child, depth + 1)
+
+
+_SQLITE_ACCESS = re.compile(r'^(SCAN|SEARCH) (\S+)(?: AS \S+)?(?: USING (?:COVERING |INTEGER PRIMARY KEY)?(?:INDEX (\S+))?)?')
+
+
+def _sqlite_node(detail):
+    match = _SQLITE_ACCESS.match(detail)
+    if match:
+        op, table, index = match.groups()
+        return {'op': op.lower(), 'table': table, 'index': index, 'rows': None, 'depth': 0}
+    if detail.startswith('USE TEMP B-TREE'):
+        return {'op': 'sort', 'table': None, 'index': None, 'rows': None, 'depth': 0}
+    return {'op': detail.lower(), 'table': None, 'index': None, 'rows': None, 'depth': 0}
+
+
+def table_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        return cursor.fetchone()[0]
+
+
+def problems(nodes, large_table_rows=LARGE_TABLE_ROWS):
+    """Human-readable list of what is wrong with a plan; empty when it is fine"""
+    found = []
+    sizes = {}
+    for node in nodes:
+        if node['op'] == 'scan' and node['table']:
+            if node['table'] not in sizes:
+                sizes[node['table']] = table_rows(node['table'])
+            if sizes[node['table']] >= large_table_rows:
+                via = f" via index {node['index']}" if node['index'] else ''
+                found.append(f"full scan of {node['table']} ({sizes[node['table']]} rows){via}")
+        elif node['op'] == 'sort':
+            # SQLite gives no estimate, so any temp b-tree sort is a problem there
+            if node['rows'] is None or node['rows'] > SORT_ROWS_LIMIT:
+                rows = '' if node['rows'] is None else f" of ~{node['rows']} rows"
+                found.append(f'sort{rows}')
+    return found
+
+
+def fingerprint(nodes):
+    """Short hash of the plan shape, ignoring costs and row estimates"""
+    shape = [(node['op'], node['table'], node['index'], node['depth']) for node in nodes]
+    return hashlib.sha1(json.dumps(shape).encode()).hexdigest()[:12]
+
+
+def load_fingerprints(path=FINGERPRINTS_PATH):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def save_fingerprints(fingerprints, path=FINGERPRINTS_PATH):
+    with open(path, 'w') as handle:
+        json.dump(fingerprints, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def analyze(models):
+    """Refresh planner statistics so PostgreSQL plans for the seeded sizes"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
@@ -33,6 +33,24 @@ else:
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 
+# Stripe HTTP client tuning (see payments/stripe_client.py)
+# STRIPE_API_BASE overrides https://api.stripe.com, e.g. to point at the
+# local stub started with `python manage.py stripe_stub`
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')
+STRIPE_CONNECT_TIMEOUT = float(os.getenv('STRIPE_CONNECT_TIMEOUT', '3'))   # seconds to open a connection
+STRIPE_READ_TIMEOUT = float(os.getenv('STRIPE_READ_TIMEOUT', '10'))        # seconds to wait for a response
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', '2'))  # retries on timeouts/409/5xx
+STRIPE_POOL_MAXSIZE = int(os.getenv('STRIPE_POOL_MAXSIZE', '10'))          # keep-alive connections per worker
+
+# Signing secret of the Stripe webhook endpoint (whsec_...) and how old a
+# signed event may be before it's rejected as a possible replay
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+STRIPE_WEBHOOK_TOLERANCE = int(os.getenv('STRIPE_WEBHOOK_TOLERANCE', '300'))
+
+# Seconds a retried create-payment-intent waits for an in-flight request with
+# the same Idempotency-Key before answering 409
+PAYMENT_IDEMPOTENCY_WAIT = float(os.getenv('PAYMENT_IDEMPOTENCY_WAIT', '10'))
+
 
 
 SIMPLE_JWT = {
@@ -66,6 +84,7 @@ INSTALLED_APPS = [
     'payments',
     'password_management',
     'SendEmail',
+    'benchmarks',                    # Load tests and benchmarks (management commands only)
 
     # Third-party libraries for added functionality
     "rest_framework",                # Django REST Framework for building and managing APIs.
@@ -75,8 +94,36 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # Answers CORS preflights (OPTIONS) for CORS_ALLOWED_ORIGINS from precomputed headers,
+    # before anything else runs (backend/cors.py); everything else continues below
+    'backend.cors.PreflightMiddleware',
+    # CORS middleware to allow cross-origin requests from other domains (needed for APIs)
+    # It's critical for it to be first because it needs to check if requests
+    # from different origins are allowed before any other processing happens
+    "corsheaders.middleware.CorsMiddleware",   # Handles CORS (Cross-Origin Resource Sharing) headers, allowing your API to be accessed from different domains.
+    # Request timing (DB, view, render, external calls) for Server-Timing, logs and /metrics
+    'backend.instrumentation.RequestTimingMiddleware',
+    # Opt-in request profiling (backend/profiling.py); removes itself unless PROFILING_ENABLED
+    'backend.profiling.ProfilingMiddleware',
+    # Negotiated gzip/Brotli response compression (backend/compression.py); inside the
+    # timing middleware so compression time counts towards the request
+    'backend.compression.CompressionMiddleware',
     # Security middleware that helps protect the site from common security threats
     'django.middleware.security.SecurityMiddleware',   # Provides security-related headers and protections (e.g., HTTPS redirection).
+    # Serves STATIC_RESPONSES from memory, skipping everything below (backend/static_responses.py)
+    'backend.static_responses.StaticResponseMiddleware',
+    # Serves collected static files, precompressed, with far-future caching (backend/static_assets.py)
+    'backend.static_assets.StaticFilesMiddleware',
+    # Sends reads to DATABASE_REPLICAS unless the client just wrote (backend/db/router.py);
+    # removes itself without replicas
+    'backend.db.router.ReplicaPinningMiddleware',
+    # Continues with the middleware profile matching the URL (MIDDLEWARE_PROFILES below)
+    'backend.middleware_profiles.MiddlewareProfileRouter',
+]
+
+# Middleware profiles (backend/middleware_profiles.py)
+# The full stack, for everything no prefix in MIDDLEWARE_PROFILES matches (admin, api-auth)
+MIDDLEWARE_DEFAULT_PROFILE = [
     # Middleware to handle user session management (preserves session data between requests)
     'django.contrib.sessions.middleware.SessionMiddleware',   # Manages sessions to store information across requests (e.g., user logged in).
     # Middleware that provides common view handling functionality
@@ -89,10 +136,18 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',   # Handles one-time messages (e.g., success or error messages after form submission).
     # Middleware to prevent clickjacking attacks by setting an X-Frame-Options header
     'django.middleware.clickjacking.XFrameOptionsMiddleware',   # Prevents the site from being embedded in iframes to protect against clickjacking.
-    
-    # CORS middleware to allow cross-origin requests from other domains (needed for APIs)
-    "corsheaders.middleware.CorsMiddleware",   # Handles CORS (Cross-Origin Resource Sharing) headers, allowing your API to be accessed from different domains.
 ]
+# URL prefix -> middleware for those requests; the longest matching prefix wins
+MIDDLEWARE_PROFILES = {
+    # The API authenticates with JWT only: no sessions, CSRF or flash messages
+    '/api/': [
+        'django.middleware.common.CommonMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ],
+}
+# The admin's middleware checks only look at MIDDLEWARE; backend.middleware_profiles
+# runs them against the profile serving /admin/ instead
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410', 'security.W002', 'security.W003']
 
 
 ROOT_URLCONF = 'backend.urls'
@@ -122,13 +177,7 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 # Configure database using dj_database_url
-# Import the library that helps us parse database URLs
-from dotenv import load_dotenv  # Import to read .env file
-import os
-
-# Load all environment variables from .env file
-# This makes them available through os.getenv()
-load_dotenv()
+# (.env was loaded at the top of this file, so DATABASE_URL can come from there)
 
 # Database configuration using environment variables
 DATABASES = {
@@ -139,6 +188,52 @@ DATABASES = {
     )
 }
 
+# Read replicas (backend/db/router.py): comma-separated database URLs, e.g.
+# DATABASE_REPLICA_URLS=postgres://replica-1/db,postgres://replica-2/db, or for
+# local testing a second SQLite file, sqlite:////tmp/replica.sqlite3. Requests
+# read from a replica and write to the primary; a client that wrote reads from
+# the primary for REPLICA_PIN_SECONDS, and replicas lagging more than
+# REPLICA_MAX_LAG_SECONDS (checked every REPLICA_LAG_CHECK_SECONDS) are skipped
+DATABASE_REPLICAS = []
+for number, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600, conn_health_checks=True)
+    # Tests run against the primary's test database only
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['backend.db.router.ReplicaRouter'] if DATABASE_REPLICAS else []
+REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', '5'))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '10'))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv('REPLICA_LAG_CHECK_SECONDS', '5'))
+REPLICA_PIN_CACHE = 'default'
+
+# Bounded connection pool (backend/db/pool.py). Instead of one persistent
+# connection per worker thread, each process keeps at most DB_POOL_MAX_SIZE
+# connections and threads check one out per request, waiting up to
+# DB_POOL_TIMEOUT seconds when all are busy. Worth it for threaded or ASGI
+# workers, whose connection count otherwise grows with their thread count.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'backend.db.postgresql',
+    'django.db.backends.sqlite3': 'backend.db.sqlite3',
+}
+for database in DATABASES.values() if DB_POOL else ():
+    if database.get('ENGINE') not in POOLED_ENGINES:
+        continue
+    database.update(
+        ENGINE=POOLED_ENGINES[database['ENGINE']],
+        # Connections go back to the pool at the end of every request, and the
+        # pool runs its own health check on checkout
+        CONN_MAX_AGE=0,
+        CONN_HEALTH_CHECKS=False,
+        POOL={
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+            'MAX_IDLE': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+        },
+    )
+
 
 
 # Password validation
@@ -181,6 +276,14 @@ import os
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic fingerprints every file and writes .gz/.br siblings next to it
+# (backend/static_assets.py); StaticFilesMiddleware serves them
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'backend.static_assets.CompressedManifestStaticFilesStorage'},
+}
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '3600'))   # seconds, unhashed names; hashed ones are immutable
+
 # Extra static file directories (if you have any)
 # Remove or comment out STATICFILES_DIRS if you have it
 # STATICFILES_DIRS = [
@@ -195,24 +298,111 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Add this to your settings.py after the existing configurations
 
 # Logging configuration if we have an error
+# Logging (backend/logconfig.py)
+# Loggers only put records on a bounded queue; a listener thread formats and
+# writes them, so logging never blocks a request. Records that do not fit in
+# the queue are dropped and counted in the log_records_dropped_total metric.
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')   # 'json' (one object per line) or 'text'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# Fraction of INFO/DEBUG records kept per logger, e.g. "backend.timing=0.1,django.server=0.5";
+# warnings and errors are always kept
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (item.partition('=') for item in os.getenv('LOG_SAMPLE_RATES', '').split(',') if item)
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'backend.logconfig.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
+    },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+        # Queues records for a listener thread, which writes them to stderr
+        'queue': {
+            '()': 'backend.logconfig.queue_handler',
+            'format': LOG_FORMAT,
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling'],
         },
     },
     'root': {
-        'handlers': ['console'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
 }
 
-# Create logs directory if it doesn't exist
+# Request instrumentation (backend/instrumentation.py)
+# Server-Timing headers go to DEBUG, staff users, or callers sending this token
+# in an X-Server-Timing-Token header
+SERVER_TIMING_TOKEN = os.getenv('SERVER_TIMING_TOKEN', '')
+# /metrics is served to these addresses, or with "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# With several gunicorn workers, each flushes its metrics here every
+# METRICS_FLUSH_INTERVAL seconds so /metrics can sum all workers
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# Logs, profiles and benchmark results; created by whatever writes there first
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
-if not os.path.exists(LOGS_DIR):
-    os.makedirs(LOGS_DIR)
+
+# On-demand profiling (backend/profiling.py)
+# Profiles requests sent with an "X-Profile: <token>" header by staff
+# (tokens from `manage.py profile_token <username>`) and a random
+# PROFILING_SAMPLE_RATE fraction of all requests
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))   # e.g. 0.001 = 1 in 1000
+PROFILING_FORMAT = os.getenv('PROFILING_FORMAT', 'pstats')   # 'pstats' (cProfile) or 'collapsed' (sampled stacks)
+PROFILING_SAMPLE_INTERVAL = float(os.getenv('PROFILING_SAMPLE_INTERVAL', '0.005'))   # seconds, 'collapsed' only
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', '3600'))   # seconds a token stays valid
+PROFILING_DIR = os.path.join(LOGS_DIR, 'profiles')
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '200'))
+PROFILING_MAX_BYTES = int(os.getenv('PROFILING_MAX_BYTES', str(100 * 1024 * 1024)))   # whole directory
+PROFILING_MAX_FILE_BYTES = int(os.getenv('PROFILING_MAX_FILE_BYTES', str(5 * 1024 * 1024)))
+
+# Worker cold-start budget checked by `manage.py importtime` (interpreter start,
+# application boot and URLconf); keep heavy imports out of module level to stay under it
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '1000'))
+
+# Worker warm-up (backend/warmup.py), run by gunicorn's post_worker_init hook
+# (gunicorn.conf.py) and on ASGI lifespan startup, before the first request
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True') == 'True'
+WARMUP_STEPS = [
+    'backend.warmup.connect_databases',
+    'backend.warmup.resolve_urls',
+    'backend.warmup.load_templates',
+    'backend.warmup.build_serializers',
+    'backend.warmup.prime_caches',
+    'backend.warmup.prime_authentication',
+    'backend.warmup.build_stripe_client',   # imports stripe: most of the warm-up time
+]
+WARMUP_TEMPLATES = ['password_management/reset_email_code.html']
+
+# Precomputed documents (backend/static_responses.py): path -> function returning
+# the JSON document, evaluated once at startup and served with a strong ETag
+STATIC_RESPONSES = {
+    '/': 'backend.urls.api_root_document',
+    '/api/payments/config/': 'payments.views.stripe_config_document',
+}
+STATIC_RESPONSE_MAX_AGE = int(os.getenv('STATIC_RESPONSE_MAX_AGE', '86400'))   # seconds; ETags revalidate after
+
+# Response compression (backend/compression.py)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '512'))   # bytes; smaller bodies gain too little
+COMPRESSION_CONTENT_TYPES = [
+    'application/json', 'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/xml', 'text/xml', 'image/svg+xml',
+]
+# Responses carrying tokens next to user input stay uncompressed (BREACH);
+# static files are precompressed by collectstatic instead
+COMPRESSION_EXCLUDE_PATHS = ['/api/token/', STATIC_URL]
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))   # 11 is far too slow per request
+COMPRESSION_MAX_RANDOM_BYTES = 100   # gzip header padding, as Django's GZipMiddleware
+COMPRESSION_CACHE_SIZE = int(os.getenv('COMPRESSION_CACHE_SIZE', '256'))   # compressed bodies of ETagged responses
 
 # Allowing all origins (domains) to make cross-origin requests to the API
 #CORS_ALLOW_ALL_ORIGINS = True   # This allows any domain to access your API, which is useful in development but should be restricted in production to ensure security.
@@ -225,8 +415,12 @@ CORS_ALLOWED_ORIGINS = [
 # Allowing credentials (cookies, HTTP authentication, etc.) to be included in cross-origin requests
 CORS_ALLOW_CREDENTIALS = True   # This allows requests to include credentials (e.g., cookies, HTTP authentication), which can be necessary for maintaining user sessions across different domains.
 
+# How long (seconds) browsers may cache a preflight answer per URL and method
+# (Access-Control-Max-Age); Chrome caps it at 7200, Firefox at 86400
+CORS_PREFLIGHT_MAX_AGE = int(os.getenv('CORS_PREFLIGHT_MAX_AGE', '86400'))
+
 # Email settings (configure according to your email provider)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'backend.mail.TimedSMTPEmailBackend'  # Django's SMTP backend + request timing
 EMAIL_HOST = 'smtp.gmail.com'  # Or your email provider's SMTP server
 EMAIL_PORT = 587
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
@@ -246,6 +440,10 @@ SECURE_SSL_REDIRECT = not DEBUG
 # Imagine your application is in a secure building, but visitors first check in at a front desk (the proxy)
 # This setting helps your application trust what the front desk tells it about visitors
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+# How many proxies in front of the app append to X-Forwarded-For. The client's
+# address is the entry this far from the right; anything left of it was sent
+# by the client and can be forged. 0 means REMOTE_ADDR is the client
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0' if DEBUG else '1'))
 
 # This ensures session cookies (which contain sensitive user data) are only sent over HTTPS
 # Think of it like sending confidential documents only via secure courier, never regular mail
@@ -303,12 +501,17 @@ PASSWORD_HASHERS = [
 ]
 
 #new code
+# JSON implementation behind the API renderer/parser: 'orjson' (falls back to
+# the standard library when orjson is not installed) or 'json'
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson')
+
 # REST_FRAMEWORK settings - controls Django REST Framework behavior
 REST_FRAMEWORK = {
     # Specifies the default authentication mechanisms for the Django REST Framework.
     # In this case, it uses JWT (JSON Web Tokens) for authentication, provided by Simple JWT.
+    # TimedJWTAuthentication is Simple JWT's JWTAuthentication plus request timing.
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "backend.authentication.TimedJWTAuthentication",
     ),
     
     # Specifies the default permission classes for API views.
@@ -316,6 +519,18 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+
+    # JSON in and out through orjson when available (backend/fastjson.py);
+    # the browsable API, form and multipart parsers are DRF's defaults
+    "DEFAULT_RENDERER_CLASSES": [
+        "backend.fastjson.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "backend.fastjson.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     # Rate limiting settings to prevent API abuse
    'DEFAULT_THROTTLE_RATES': {
        'anon': '100/day',    # Unauthenticated users: 100 requests/day
@@ -330,11 +545,6 @@ REST_FRAMEWORK = {
 if 'corsheaders' not in INSTALLED_APPS:
     INSTALLED_APPS.append('corsheaders')
 
-# This puts the CORS middleware at the very start of the middleware list
-# It's critical for it to be first because it needs to check if requests 
-# from different origins are allowed before any other processing happens
-MIDDLEWARE.insert(0, 'corsheaders.middleware.CorsMiddleware')
-
 # Similarly, this ensures the security middleware is present and at the start
 # This middleware provides essential security features like HTTPS handling
 if 'django.middleware.security.SecurityMiddleware' not in MIDDLEWARE:
@@ -0,0 +1,151 @@
+"""
+Fingerprinted, precompressed static files served from the app.
+
+CompressedManifestStaticFilesStorage (STORAGES['staticfiles']) is Django's
+ManifestStaticFilesStorage - every collected file also gets a content-hashed
+copy (admin/css/base.css -> admin/css/base.4f2f1a3c9b1e.css) that {% static %}
+links to - which after collectstatic also writes .gz and, with the ``brotli``
+package, .br siblings of every compressible file, at the highest levels,
+since this runs once per deploy rather than per request.
+
+StaticFilesMiddleware indexes STATIC_ROOT when the server starts and answers
+GET/HEAD for those files itself: the best precompressed variant the client
+accepts, as a FileResponse, so gunicorn hands the file to sendfile() instead
+of copying it through Python. Hashed names never change content and are
+cached for a year as immutable; the unhashed originals get STATIC_MAX_AGE.
+Files added to STATIC_ROOT after startup are not served until a restart.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.urls import ResolverMatch
+from django.utils.cache import parse_etags, patch_vary_headers
+
+from . import compression
+
+try:
+    import brotli
+except ImportError:  # optional: .gz siblings only
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Sibling suffix -> Content-Encoding
+SUFFIXES = {'.br': 'br', '.gz': 'gzip'}
+
+
+def is_compressible(name):
+    content_type, encoding = mimetypes.guess_type(name)
+    return encoding is None and content_type in settings.COMPRESSION_CONTENT_TYPES
+
+
+def precompress(path):
+    """Write .gz/.br siblings of ``path`` where they are smaller; returns the paths written"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = {'.gz': lambda: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = lambda: brotli.compress(data, quality=11)
+    written = []
+    for suffix, compress in variants.items():
+        compressed = compress()
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)  # left over from an earlier, different version of the file
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # Without a manifest - collectstatic never ran (development, tests) - link
+        # the plain names like StaticFilesStorage rather than failing every page
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Originals as well as hashed copies: both are served
+        for name in sorted(set(paths) | set(self.hashed_files.values())):
+            if is_compressible(name) and self.exists(name):
+                for written in precompress(self.path(name)):
+                    yield name, os.path.relpath(written, self.location), True
+
+
+class StaticAsset:
+    """One file under STATIC_ROOT with its precompressed variants and headers"""
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.etag = 'W/"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else f'public, max-age={settings.STATIC_MAX_AGE}'
+        # Content-Encoding -> sibling path, in compression.available_encodings() order
+        self.variants = {encoding: path + suffix for suffix, encoding in SUFFIXES.items()
+                         if os.path.exists(path + suffix) and encoding in compression.available_encodings()}
+
+    def response(self, request):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and any(etag == '*' or etag.removeprefix('W/') == self.etag.removeprefix('W/')
+                                 for etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            encoding = (compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), tuple(self.variants))
+                        if self.variants else None)
+            response = FileResponse(open(self.variants.get(encoding, self.path), 'rb'), content_type=self.content_type)
+            # FileResponse names the file for downloads; these are displayed inline
+            del response.headers['Content-Disposition']
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        if self.variants:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        response.headers['ETag'] = self.etag
+        response.headers['Cache-Control'] = self.cache_control
+        return response
+
+
+def build_index(root, url, immutable_names=()):
+    """{URL path: StaticAsset} for every file under ``root``; precompressed siblings become variants"""
+    immutable_names = set(immutable_names)
+    index = {}
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            base, suffix = os.path.splitext(path)
+            if suffix in SUFFIXES and os.path.exists(base):
+                continue
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            index[url + name] = StaticAsset(path, name in immutable_names)
+    return index
+
+
+class StaticFilesMiddleware:
+    def __init__(self, get_response):
+        # Nothing to serve: DEBUG (runserver serves static files itself), not collected, or a CDN URL
+        if settings.DEBUG or not settings.STATIC_ROOT or not os.path.isdir(settings.STATIC_ROOT) \
+                or not settings.STATIC_URL.startswith('/'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        hashed_names = getattr(staticfiles_storage, 'hashed_files', {}).values()
+        self.index = build_index(settings.STATIC_ROOT, settings.STATIC_URL, hashed_names)
+        # So request timing and metrics label these requests 'static' rather than unresolved
+        self.match = ResolverMatch(self, (), {}, url_name='static', route=settings.STATIC_URL)
+
+    def __call__(self, request):
+        asset = self.index.get(request.path_info)
+        if asset is None or request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        request.resolver_match = self.match
+        return asset.response(request)
@@ -0,0 +1,81 @@
+"""
+Precomputed responses for documents that only change on deploy.
+
+STATIC_RESPONSES in settings.py maps URL paths to functions returning a JSON
+document:
+
+    STATIC_RESPONSES = {'/': 'backend.urls.api_root_document'}
+
+StaticResponseMiddleware calls every function once, when the server starts,
+and keeps the encoded bytes with a strong ETag. GET and HEAD requests for
+those paths are answered straight from memory - no session, authentication,
+CSRF or DRF dispatch - with a long Cache-Control, and a 304 when the client
+already holds the current ETag. Other methods fall through to the regular
+views, which stay in place for them (and for reverse()).
+
+Because every response carries an ETag, CompressionMiddleware compresses
+each document once per encoding and serves it from its cache afterwards.
+"""
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.cache import parse_etags
+from django.utils.module_loading import import_string
+
+from . import fastjson
+
+
+class StaticResponse:
+    """One precomputed body with its validators"""
+
+    def __init__(self, body, content_type='application/json', max_age=None):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        self.cache_control = f'public, max-age={settings.STATIC_RESPONSE_MAX_AGE if max_age is None else max_age}'
+
+    @classmethod
+    def from_document(cls, document, **kwargs):
+        return cls(fastjson.dumps(document), **kwargs)
+
+    def matches(self, if_none_match):
+        # If-None-Match uses weak comparison: W/"x" (e.g. after compression) matches "x"
+        return any(etag == '*' or etag.removeprefix('W/') == self.etag for etag in parse_etags(if_none_match))
+
+    def response(self, request):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and self.matches(if_none_match):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(self.body, content_type=self.content_type)
+            response['Content-Length'] = str(len(self.body))
+        response['ETag'] = self.etag
+        response['Cache-Control'] = self.cache_control
+        return response
+
+
+def build(registry):
+    """{path: StaticResponse} from a {path: dotted path of a document function} mapping"""
+    return {path: StaticResponse.from_document(import_string(func)()) for path, func in registry.items()}
+
+
+class StaticResponseMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.responses = build(settings.STATIC_RESPONSES)
+        # Resolved once so request timing and metrics still see the URL name
+        self.matches = {}
+        for path in self.responses:
+            try:
+                self.matches[path] = resolve(path)
+            except Resolver404:
+                self.matches[path] = None
+
+    def __call__(self, request):
+        static = self.responses.get(request.path_info)
+        if static is None or request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        request.resolver_match = self.matches[request.path_info]
+        return static.response(request)
@@ -0,0 +1,244 @@
+"""
+Per-endpoint query budgets.
+
+Every URL pattern in backend/urls.py, api/urls.py, payments/urls.py and
+password_management/urls.py (plus the newsletter route mounted from
+backend/urls.py) must declare a budget in BUDGETS: the maximum number of
+queries one request may run and how many of them may be exact duplicates.
+
+Each endpoint is exercised against seeded data of several sizes. A query
+count above budget fails, and so does a count that changes with the amount of
+data - the signature of an N+1 query. Adding a URL without a budget fails
+test_every_endpoint_has_a_budget.
+"""
+import hashlib
+import hmac
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import Note, RememberMeToken
+from password_management.models import PasswordResetCode
+from payments.models import Payment
+from payments.stripe_stub import StripeStubServer
+
+# Rows per table for the seeded user (and for each of a few other users)
+DATA_SIZES = (1, 10, 50)
+
+# URL prefixes whose patterns belong to third-party apps, not this project
+EXCLUDED_PREFIXES = ('admin/', 'api-auth/')
+
+WEBHOOK_SECRET = 'whsec_query_budget'
+
+
+@dataclass
+class Budget:
+    method: str
+    max_queries: int
+    max_duplicates: int = 0
+    # Builds the request: fn(case) -> (path, data, extra client kwargs)
+    request: object = None
+    description: str = ''
+    staff: bool = False
+    headers: dict = field(default_factory=dict)
+
+
+def _signed(payload):
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return {'HTTP_STRIPE_SIGNATURE': f't={timestamp},v1={signature}'}
+
+
+def _webhook(case):
+    payload = json.dumps({'id': 'evt_budget', 'type': 'payment_intent.succeeded',
+                          'data': {'object': {'id': case.payment.payment_intent_id}}})
+    return '/api/payments/webhook/', payload, _signed(payload)
+
+
+BUDGETS = {
+    # backend/urls.py
+    'register': [Budget('POST', 4, request=lambda c: (
+        '/api/user/register/',
+        {'username': 'newcomer', 'email': 'newcomer@example.com',
+         'password': 'a-Strong-pw-123', 'confirm_password': 'a-Strong-pw-123'}, {}))],
+    'get_token': [
+        # By email: username miss, email hit, authenticate(), outstanding token
+        Budget('POST', 4, description='login', request=lambda c: (
+            '/api/token/', {'login': c.user.email, 'password': 'pw-123456'}, {})),
+        Budget('POST', 7, description='login with remember_me', request=lambda c: (
+            '/api/token/', {'login': c.user.username, 'password': 'pw-123456', 'remember_me': True}, {})),
+    ],
+    'refresh': [Budget('POST', 6, request=lambda c: (
+        '/api/token/refresh/', {'refresh': str(c.refresh)}, {}))],
+    'metrics': [Budget('GET', 0, request=lambda c: ('/metrics', None, {'REMOTE_ADDR': '127.0.0.1'}))],
+    'api-root': [Budget('GET', 0, request=lambda c: ('/', None, {}))],
+    'newsletter_subscribe': [Budget('POST', 1, request=lambda c: (
+        '/api/newsletter/subscribe', {'email': 'Reader@Example.com'}, {}))],
+
+    # api/urls.py
+    'note-list': [
+        Budget('GET', 2, request=lambda c: ('/api/notes/', None, {})),
+        Budget('POST', 2, request=lambda c: ('/api/notes/', {'title': 'New', 'content': 'Body'}, {})),
+    ],
+    'delete-note': [Budget('DELETE', 3, request=lambda c: (f'/api/notes/delete/{c.note.id}/', None, {}))],
+    'current-user': [Budget('GET', 1, request=lambda c: ('/api/user/current/', None, {}))],
+
+    # payments/urls.py
+    'payments:get-stripe-config': [Budget('GET', 0, request=lambda c: ('/api/payments/config/', None, {}))],
+    'payments:create-payment-intent': [
+        Budget('POST', 3, request=lambda c: (
+            '/api/payments/create-payment-intent/', {'amount': '49.99', 'planType': 'single'}, {})),
+        # The key lookup is repeated once the single-flight lock is held (the allowed duplicate)
+        Budget('POST', 5, max_duplicates=1, description='with Idempotency-Key', request=lambda c: (
+            '/api/payments/create-payment-intent/', {'amount': '49.99', 'planType': 'single'},
+            {'HTTP_IDEMPOTENCY_KEY': 'budget-key'})),
+    ],
+    'payments:confirm-payment': [Budget('POST', 5, request=lambda c: (
+        f'/api/payments/confirm-payment/{c.payment.id}/', None, {}))],
+    'payments:payment-history': [Budget('GET', 2, request=lambda c: ('/api/payments/history/', None, {}))],
+    'payments:revenue-rollups': [Budget('GET', 2, staff=True, request=lambda c: (
+        '/api/payments/revenue/', None, {}))],
+    'payments:stripe-webhook': [Budget('POST', 1, request=_webhook)],
+
+    # password_management/urls.py
+    'password_management:password-reset-request': [Budget('POST', 4, request=lambda c: (
+        '/api/password/request-reset/', {'email': c.user.email}, {}))],
+    'password_management:password-reset-verify': [Budget('POST', 4, request=lambda c: (
+        '/api/password/verify-reset/',
+        {'email': c.user.email, 'code': c.reset_code.code, 'new_password': 'Another-pw-456'}, {}))],
+}
+
+
+def project_url_names():
+    """Fully qualified names of every project URL pattern"""
+    names = set()
+
+    def walk(patterns, prefix='', namespace=None):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern)
+            if route.startswith(EXCLUDED_PREFIXES):
+                continue
+            if isinstance(pattern, URLResolver):
+                ns = pattern.namespace or namespace
+                walk(pattern.url_patterns, route, ns)
+            elif isinstance(pattern, URLPattern):
+                names.add(f'{namespace}:{pattern.name}' if namespace else pattern.name)
+
+    walk(get_resolver().url_patterns)
+    return names
+
+
+class SeededCase:
+    """Seed ``size`` rows of each kind for a primary user and a few neighbours"""
+
+    def __init__(self, size):
+        now = timezone.now()
+        self.user = User.objects.create_user('budget', 'budget@example.com', 'pw-123456')
+        users = [self.user] + [
+            User.objects.create_user(f'neighbour{i}', f'neighbour{i}@example.com', 'pw-123456')
+            for i in range(3)
+        ]
+        for owner in users:
+            Note.objects.bulk_create([
+                Note(title=f'Note {i}', content='x' * 200, author=owner) for i in range(size)
+            ])
+            for i in range(size):
+                Payment.objects.create(user=owner, amount='10.00', plan_type='single',
+                                       payment_intent_id=f'pi_{owner.id}x{i}')
+            PasswordResetCode.objects.bulk_create([
+                PasswordResetCode(user=owner, code=f'{i:06d}', expires_at=now - timedelta(hours=1), used=True)
+                for i in range(size)
+            ])
+        # Old enough not to trip the reset-request rate limit (auto_now_add ignores bulk values)
+        PasswordResetCode.objects.update(created_at=now - timedelta(hours=2))
+        RememberMeToken.objects.create(user=self.user, token='remember-budget', expires_at=now + timedelta(days=1))
+
+        self.note = Note.objects.filter(author=self.user).first()
+        self.payment = Payment.objects.filter(user=self.user).first()
+        self.reset_code = PasswordResetCode.objects.create(
+            user=self.user, code='424242', expires_at=now + timedelta(minutes=15))
+        self.refresh = RefreshToken.for_user(self.user)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+    STRIPE_SECRET_KEY='sk_test_budget',
+    STRIPE_MAX_NETWORK_RETRIES=0,
+    METRICS_DIR=None,
+)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stripe_stub = StripeStubServer(('127.0.0.1', 0))
+        cls.stripe_stub.start()
+        cls._stub_settings = override_settings(STRIPE_API_BASE=cls.stripe_stub.base_url)
+        cls._stub_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._stub_settings.disable()
+        cls.stripe_stub.stop()
+
+    def test_every_endpoint_has_a_budget(self):
+        names = project_url_names()
+        self.assertEqual(sorted(names - BUDGETS.keys()), [], 'endpoints without a query budget')
+        self.assertEqual(sorted(BUDGETS.keys() - names), [], 'budgets for endpoints that no longer exist')
+
+    def measure(self, size, budget):
+        """Run one request against freshly seeded data; returns the captured queries"""
+        from django.core.cache import cache
+
+        with transaction.atomic():
+            case = SeededCase(size)
+            if budget.staff:
+                User.objects.filter(id=case.user.id).update(is_staff=True)
+            path, data, extra = budget.request(case)
+
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {case.refresh.access_token}')
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, budget.method.lower())(
+                    path, data, format=None if isinstance(data, str) else 'json',
+                    content_type='application/json' if isinstance(data, str) else None, **extra)
+            transaction.set_rollback(True)
+
+        self.assertLess(response.status_code, 400, f'{budget.method} {path} -> {response.status_code}: '
+                                                   f'{getattr(response, "data", response.content)}')
+        return [query['sql'] for query in captured.captured_queries]
+
+    def test_query_budgets(self):
+        for name, budgets in BUDGETS.items():
+            for budget in budgets:
+                label = f'{name} {budget.method} {budget.description}'.strip()
+                with self.subTest(label):
+                    counts = {}
+                    for size in DATA_SIZES:
+                        queries = self.measure(size, budget)
+                        counts[size] = len(queries)
+                        duplicates = sum(n - 1 for n in Counter(queries).values() if n > 1)
+
+                        detail = '\n'.join(queries)
+                        self.assertLessEqual(len(queries), budget.max_queries,
+                                             f'{label}: {len(queries)} queries at size {size}\n{detail}')
+                        self.assertLessEqual(duplicates, budget.max_duplicates,
+                                             f'{label}: {duplicates} duplicate queries at size {size}\n{detail}')
+                    self.assertEqual(len(set(counts.values())), 1,
+                                     f'{label}: query count grows with data size {counts}')
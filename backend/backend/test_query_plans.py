@@ -0,0 +1,89 @@
+"""
+Plan regression checks for the hot queries in backend.queryplans.
+
+The tables are seeded past LARGE_TABLE_ROWS so a missing index shows up as a
+full scan. Plan fingerprints for the current database vendor are compared to
+backend/query_plans.json; set UPDATE_QUERY_PLANS=1 to record new ones.
+"""
+import os
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from api.models import Note
+from password_management.models import PasswordResetCode
+from payments.models import Payment
+
+from . import queryplans
+
+USERS = 1200
+ROWS_PER_USER = 3
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        User.objects.bulk_create([
+            User(username=f'plan{i}', email=f'plan{i}@example.com', password='!') for i in range(USERS)
+        ])
+        users = list(User.objects.all())
+        Note.objects.bulk_create([
+            Note(title='n', content='c', author=user) for user in users for _ in range(ROWS_PER_USER)
+        ])
+        # bulk_create bypasses Payment.save(), so no daily rollups are written
+        Payment.objects.bulk_create([
+            Payment(user=user, amount='10.00', plan_type='single', status='completed',
+                    payment_intent_id=f'pi_plan_{user.id}_{i}')
+            for user in users for i in range(ROWS_PER_USER)
+        ])
+        PasswordResetCode.objects.bulk_create([
+            PasswordResetCode(user=user, code=f'{i:06d}', expires_at=now, used=True)
+            for user in users for i in range(ROWS_PER_USER)
+        ])
+        queryplans.analyze([User, Note, Payment, PasswordResetCode])
+
+        cls.user = users[USERS // 2]
+        cls.params = {
+            'user': cls.user,
+            'email': cls.user.email,
+            'username': cls.user.username,
+            'code': '000001',
+            'now': now,
+            'since': now - timedelta(minutes=30),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        for name, build in queryplans.HOT_QUERIES.items():
+            with self.subTest(name):
+                nodes = queryplans.explain(build(self.params))
+                self.assertEqual(queryplans.problems(nodes), [], f'{name}: {nodes}')
+
+    def test_plan_fingerprints(self):
+        stored = queryplans.load_fingerprints()
+        current = {name: queryplans.fingerprint(queryplans.explain(build(self.params)))
+                   for name, build in queryplans.HOT_QUERIES.items()}
+
+        if os.environ.get('UPDATE_QUERY_PLANS'):
+            stored[connection.vendor] = current
+            queryplans.save_fingerprints(stored)
+            return
+
+        expected = stored.get(connection.vendor)
+        if expected is None:
+            self.skipTest(f'no stored plan fingerprints for {connection.vendor}; '
+                          f'run with UPDATE_QUERY_PLANS=1 to record them')
+        self.assertEqual(current, expected,
+                         'query plans changed; if intended, rerun with UPDATE_QUERY_PLANS=1')
+
+    def test_sqlite_plan_parsing(self):
+        node = queryplans._sqlite_node('SEARCH api_note USING INDEX api_note_author_id_idx (author_id=?)')
+        self.assertEqual((node['op'], node['table'], node['index']), ('search', 'api_note', 'api_note_author_id_idx'))
+        node = queryplans._sqlite_node('SCAN auth_user')
+        self.assertEqual((node['op'], node['table'], node['index']), ('scan', 'auth_user', None))
+        self.assertEqual(queryplans._sqlite_node('USE TEMP B-TREE FOR ORDER BY')['op'], 'sort')
+        self.assertEqual(queryplans.problems([{'op': 'sort', 'table': None, 'index': None,
+                                               'rows': None, 'depth': 0}]), ['sort'])
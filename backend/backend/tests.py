@@ -0,0 +1,778 @@
+import gzip
+import io
+import json
+import logging
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from corsheaders.middleware import CorsMiddleware
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import OperationalError, connections, router as db_router
+from django.db.utils import load_backend
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.models import Note
+
+from . import compression, cors, fastjson, logconfig, metrics, middleware_profiles, profiling, static_assets, warmup
+from .db import pool, router
+from .instrumentation import REQUEST_DB_QUERIES
+
+
+class MetricsTests(SimpleTestCase):
+    def test_histogram_merges_thread_shards(self):
+        hist = metrics.Histogram('test_latency', 'doc', buckets=(0.1, 1.0))
+
+        def work():
+            for _ in range(1000):
+                hist.observe(0.05, view='a')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        hist.observe(5, view='a')
+
+        series = hist.snapshot()[(('view', 'a'),)]
+        self.assertEqual(series['count'], 4001)
+        self.assertEqual(series['counts'], [4000, 0, 1])
+
+    def test_finished_threads_shards_are_folded(self):
+        counter = metrics.Counter('test_thread_requests', 'doc')
+        for _ in range(20):
+            thread = threading.Thread(target=counter.inc, kwargs={'view': 'a'})
+            thread.start()
+            thread.join()
+        counter.inc(view='a')
+
+        self.assertEqual(counter.snapshot(), {(('view', 'a'),): 21})
+        self.assertEqual(list(counter._shards), [threading.current_thread()])
+
+    def test_prometheus_rendering(self):
+        hist = metrics.Histogram('req_seconds', 'Request time', buckets=(0.1, 1.0))
+        hist.observe(0.05, view='notes')
+        hist.observe(0.5, view='notes')
+        counter = metrics.Counter('req_total', 'Requests')
+        counter.inc(view='notes', status='200')
+        data = metrics.merge_snapshots([{
+            'req_seconds': {'type': 'histogram', 'doc': 'Request time', 'buckets': [0.1, 1.0],
+                            'series': [[list(map(list, k)), v] for k, v in hist.snapshot().items()]},
+            'req_total': {'type': 'counter', 'doc': 'Requests',
+                          'series': [[list(map(list, k)), v] for k, v in counter.snapshot().items()]},
+        }])
+        text = metrics.render_prometheus(data)
+        self.assertIn('# TYPE req_seconds histogram', text)
+        self.assertIn('req_seconds_bucket{view="notes",le="0.1"} 1', text)
+        self.assertIn('req_seconds_bucket{view="notes",le="1.0"} 2', text)
+        self.assertIn('req_seconds_bucket{view="notes",le="+Inf"} 2', text)
+        self.assertIn('req_seconds_count{view="notes"} 2', text)
+        self.assertIn('req_total{status="200",view="notes"} 1', text)
+
+    def test_gather_sums_worker_snapshots(self):
+        hist = metrics.histogram('test_gather_seconds', 'doc')
+        hist.reset()
+        hist.observe(0.2, view='x')
+        with tempfile.TemporaryDirectory() as directory:
+            # A snapshot flushed by "another worker"
+            metrics.flush(directory)
+            os.rename(os.path.join(directory, f'metrics_{os.getpid()}.json'),
+                      os.path.join(directory, 'metrics_99999999.json'))
+            merged = metrics.gather(directory)
+        self.assertEqual(merged['test_gather_seconds']['series'][(('view', 'x'),)]['count'], 2)
+
+    def test_exited_workers_are_folded_and_removed(self):
+        counter = metrics.counter('test_retire_total', 'doc')
+        counter.reset()
+        counter.inc(3, view='x')
+        with tempfile.TemporaryDirectory() as directory:
+            # Two workers that came and went, with the same pid
+            for _ in range(2):
+                metrics.flush(directory)
+                os.rename(os.path.join(directory, f'metrics_{os.getpid()}.json'),
+                          os.path.join(directory, 'metrics_99999999.json'))
+                metrics.retire(directory, 99999999)
+            self.assertEqual(os.listdir(directory), [metrics.EXITED_FILE])
+            merged = metrics.gather(directory)
+            self.assertEqual(merged['test_retire_total']['series'][(('view', 'x'),)], 9)
+
+            metrics.flush(directory)
+            metrics.clear(directory)
+            self.assertEqual(os.listdir(directory), [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, DEBUG=False, SERVER_TIMING_TOKEN='timing-secret',
+                   METRICS_ALLOWED_IPS=['127.0.0.1'], METRICS_TOKEN='scrape-secret', METRICS_DIR=None)
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('writer', 'writer@example.com', 'pw-123456')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_server_timing_only_for_trusted_callers(self):
+        response = self.api.get('/api/notes/')
+        self.assertNotIn('Server-Timing', response)
+
+        response = self.api.get('/api/notes/', HTTP_X_SERVER_TIMING_TOKEN='timing-secret')
+        header = response['Server-Timing']
+        self.assertIn('db;dur=', header)
+        self.assertIn('queries"', header)
+        self.assertIn('total;dur=', header)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertIn('Server-Timing', self.api.get('/api/notes/'))
+
+    def test_queries_are_counted_per_view(self):
+        REQUEST_DB_QUERIES.reset()
+        self.api.get('/api/notes/')
+        series = REQUEST_DB_QUERIES.snapshot()[(('view', 'note-list'),)]
+        self.assertEqual(series['count'], 1)
+        self.assertGreaterEqual(series['sum'], 1)
+
+    def test_metrics_endpoint(self):
+        self.api.get('/api/notes/')
+        response = self.client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket{method="GET",view="note-list"', response.content)
+
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.8').status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.8', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            SECURE_SSL_REDIRECT=False, PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0,
+            PROFILING_DIR=self.directory, PROFILING_MAX_FILES=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.staff = User.objects.create_user('ops', 'ops@example.com', 'pw-123456', is_staff=True)
+        self.api = APIClient()
+        self.api.force_authenticate(self.staff)
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_signed_header_profiles_the_request(self):
+        token = profiling.make_token(self.staff)
+        response = self.api.get('/api/notes/', HTTP_X_PROFILE=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profiles(), [response['X-Profile-Id']])
+        stats = pstats.Stats(os.path.join(self.directory, response['X-Profile-Id']))
+        self.assertTrue(stats.total_calls)
+
+        response = self.api.get('/api/notes/', HTTP_X_PROFILE=token, HTTP_X_PROFILE_FORMAT='collapsed')
+        self.assertTrue(response['X-Profile-Id'].endswith('.folded'))
+
+    def test_bad_tokens_and_non_staff_are_ignored(self):
+        self.api.get('/api/notes/', HTTP_X_PROFILE='forged:token')
+        writer = User.objects.create_user('writer', 'writer@example.com', 'pw-123456')
+        response = self.api.get('/api/notes/', HTTP_X_PROFILE=profiling.make_token(writer))
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.profiles(), [])
+
+    def test_sampling_and_rotation(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            api = APIClient()
+            api.force_authenticate(self.staff)
+            for _ in range(4):
+                response = api.get('/api/notes/')
+                self.assertNotIn('X-Profile-Id', response)  # only staff with a token get the id back
+        self.assertEqual(len(self.profiles()), 2)
+
+    def test_disabled_middleware_leaves_the_chain(self):
+        with override_settings(PROFILING_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                profiling.ProfilingMiddleware(lambda request: None)
+
+    def test_sampler_collapses_stacks(self):
+        sampler = profiling.StackSampler(threading.get_ident(), 0.001)
+        sampler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        sampler.stop()
+        rendered = sampler.render(max_bytes=10_000)
+        self.assertIn('test_sampler_collapses_stacks', rendered)
+        self.assertLessEqual(len(sampler.render(max_bytes=10)), 10)
+
+
+class LoggingTests(SimpleTestCase):
+    def record(self, name='backend.test', level=logging.INFO, msg='sent to %s', args=('a@example.com',), **extra):
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_fields(self):
+        line = logconfig.JsonFormatter().format(self.record(timing={'total_ms': 12.5}))
+        entry = json.loads(line)
+        self.assertEqual(entry['message'], 'sent to a@example.com')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['timing'], {'total_ms': 12.5})
+
+    def test_sampling_keeps_warnings_and_uses_most_specific_logger(self):
+        sampling = logconfig.SamplingFilter({'backend': 0, 'backend.timing': 1.0})
+        self.assertFalse(sampling.filter(self.record('backend.profiling')))
+        self.assertTrue(sampling.filter(self.record('backend.timing')))
+        self.assertTrue(sampling.filter(self.record('backend.profiling', level=logging.WARNING)))
+        self.assertTrue(sampling.filter(self.record('django.request')))
+
+    def test_queue_formats_on_listener_and_drops_when_full(self):
+        stream = io.StringIO()
+        handler = logconfig.queue_handler('json', maxsize=1, stream=stream)
+
+        handler.handle(self.record())
+        handler.listener.stop()  # nothing takes records off the queue now
+        dropped = sum(logconfig.DROPPED.snapshot().values())
+        for _ in range(3):
+            handler.handle(self.record())
+        self.assertEqual(sum(logconfig.DROPPED.snapshot().values()), dropped + 2)
+        handler.listener.start()
+        handler.close()  # writes out the queued record
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line)['message'] for line in lines], ['sent to a@example.com'] * 2)
+
+    def test_forked_child_restarts_listener(self):
+        read_end, write_end = os.pipe()
+        handler = logconfig.queue_handler('text', stream=io.StringIO())
+        self.addCleanup(handler.close)
+        pid = os.fork()
+        if pid == 0:  # child: report whether its listener thread runs, then leave without cleanup
+            os.close(read_end)
+            alive = handler.listener._thread is not None and handler.listener._thread.is_alive()
+            os.write(write_end, b'1' if alive else b'0')
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_end, 'rb') as result:
+            self.assertEqual(result.read(), b'1')
+
+
+class FastJSONTests(SimpleTestCase):
+    payload = {
+        'amount': Decimal('149.99'), 'created_at': datetime(2025, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'), 'note': 'line\u2028break', 1: 'one',
+    }
+
+    def test_backends_agree_with_drf(self):
+        expected = json.loads(JSONRenderer().render(self.payload))
+        for name in ('orjson', 'json'):
+            with self.subTest(backend=name), override_settings(JSON_BACKEND=name):
+                body = fastjson.FastJSONRenderer().render(self.payload)
+                self.assertEqual(json.loads(body), expected)
+                self.assertIn(b'line\\u2028break', body)  # escaped, as DRF does
+                self.assertEqual(fastjson.FastJSONRenderer().render(None), b'')
+
+    def test_parser_rejects_invalid_json(self):
+        parser = fastjson.FastJSONParser()
+        for name in ('orjson', 'json'):
+            with self.subTest(backend=name), override_settings(JSON_BACKEND=name):
+                self.assertEqual(parser.parse(io.BytesIO(b'{"title": "x"}')), {'title': 'x'})
+                for body in (b'{"title": ', b'{"amount": NaN}'):
+                    with self.assertRaises(ParseError):
+                        parser.parse(io.BytesIO(body))
+
+    def test_api_uses_fast_renderer(self):
+        response = self.client.get('/', secure=True)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('endpoints', json.loads(response.content))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, COMPRESSION_MIN_SIZE=100)
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'pw-123456')
+        Note.objects.bulk_create([Note(title=f'Note {i}', content='same words ' * 20, author=self.user)
+                                  for i in range(20)])
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_negotiation(self):
+        self.assertEqual(compression.negotiate('gzip, deflate, br', ('br', 'gzip')), 'br')
+        self.assertEqual(compression.negotiate('gzip;q=1.0, br;q=0.5', ('br', 'gzip')), 'gzip')
+        self.assertEqual(compression.negotiate('br;q=0, *', ('br', 'gzip')), 'gzip')
+        self.assertIsNone(compression.negotiate('identity', ('br', 'gzip')))
+        self.assertIsNone(compression.negotiate('', ('gzip',)))
+
+    def test_gzip_is_padded_and_decodes(self):
+        body = b'{"notes": []}' * 100
+        first, second = compression.compress(body, 'gzip'), compression.compress(body, 'gzip')
+        self.assertEqual(gzip.decompress(first), body)
+        self.assertEqual(gzip.decompress(second), body)
+        with override_settings(COMPRESSION_MAX_RANDOM_BYTES=0):
+            self.assertEqual(compression.compress(body, 'gzip'), compression.compress(body, 'gzip'))
+
+    def test_note_list_is_compressed(self):
+        plain = self.api.get('/api/notes/')
+        response = self.api.get('/api/notes/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+    def test_small_excluded_and_untyped_responses_pass_through(self):
+        self.assertFalse(self.api.get('/api/user/current/', HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding'))
+        with override_settings(COMPRESSION_MIN_SIZE=0):
+            response = self.client.post('/api/token/', {'login': 'reader', 'password': 'pw-123456'},
+                                        content_type='application/json', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            response = self.client.get('/metrics', HTTP_ACCEPT_ENCODING='gzip')  # text/plain with a version
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_streaming_and_etag_cache(self):
+        chunks = [b'x' * 300, b'', b'y' * 300]
+        middleware = compression.CompressionMiddleware(
+            lambda request: StreamingHttpResponse(iter(chunks), content_type='text/plain'))
+        request = RequestFactory().get('/stream', HTTP_ACCEPT_ENCODING='gzip')
+        response = middleware(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+        calls = []
+
+        def view(request):
+            response = HttpResponse(b'a' * 1000, content_type='application/json')
+            response['ETag'] = '"v1"'
+            return response
+
+        middleware = compression.CompressionMiddleware(view)
+        original = compression.compress
+        with mock.patch.object(compression, 'compress', side_effect=lambda *a: calls.append(a) or original(*a)):
+            first = middleware(RequestFactory().get('/static', HTTP_ACCEPT_ENCODING='gzip'))
+            second = middleware(RequestFactory().get('/static', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['ETag'], 'W/"v1"')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, STRIPE_PUBLISHABLE_KEY='pk_test_static')
+class StaticResponseTests(TestCase):
+    def test_documents_are_served_without_auth_or_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/payments/config/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'publicKey': 'pk_test_static'})
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_conditional_requests(self):
+        etag = self.client.get('/')['ETag']
+        for if_none_match in (etag, f'W/{etag}', f'"other", {etag}'):
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_other_methods_reach_the_view(self):
+        response = self.client.post('/api/payments/config/')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_compressed_once_per_encoding(self):
+        with override_settings(COMPRESSION_MIN_SIZE=100):
+            first = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class MiddlewareProfileTests(TestCase):
+    def test_api_requests_skip_sessions_and_csrf(self):
+        user = User.objects.create_user('reader', 'reader@example.com', 'pw-123456')
+        api = APIClient(enforce_csrf_checks=True)
+        api.force_authenticate(user)
+        response = api.post('/api/notes/', {'title': 'a', 'content': 'b'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_admin_keeps_the_full_stack(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+        self.assertIn('csrftoken', response.cookies)
+        # CsrfViewMiddleware.process_view is reached through the router
+        self.assertEqual(client.post('/admin/login/', {'username': 'x', 'password': 'y'}).status_code, 403)
+
+    def test_checks_look_at_the_admin_profile(self):
+        self.assertEqual(middleware_profiles.check_profiles(), [])
+        with override_settings(MIDDLEWARE_PROFILES={'/': ['django.middleware.common.CommonMiddleware']}):
+            ids = {issue.id for issue in middleware_profiles.check_profiles()}
+        self.assertEqual(ids, {'middleware_profiles.E408', 'middleware_profiles.E409', 'middleware_profiles.E410',
+                               'middleware_profiles.W002', 'middleware_profiles.W003'})
+
+
+class CorsPreflightTests(SimpleTestCase):
+    ORIGIN = 'http://localhost:5173'
+
+    def preflight(self, middleware, origin=ORIGIN, path='/api/notes/'):
+        request = RequestFactory().options(path, HTTP_ORIGIN=origin, HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST')
+        return middleware(lambda request: HttpResponse('reached the view'))(request)
+
+    def test_answers_like_corsheaders(self):
+        for origin in (self.ORIGIN, 'https://evil.example'):
+            fast = self.preflight(cors.PreflightMiddleware, origin)
+            expected = self.preflight(CorsMiddleware, origin)
+            self.assertEqual(fast.status_code, expected.status_code)
+            self.assertEqual(fast.content, b'')
+            self.assertEqual({name.lower(): value for name, value in fast.headers.items()},
+                             {name.lower(): value for name, value in expected.headers.items()})
+        self.assertEqual(fast['Vary'], 'origin')
+        self.assertNotIn('Access-Control-Allow-Origin', fast)
+
+    def test_max_age_is_configurable(self):
+        with override_settings(CORS_PREFLIGHT_MAX_AGE=600):
+            response = self.preflight(cors.PreflightMiddleware)
+        self.assertEqual(response['Access-Control-Max-Age'], '600')
+        self.assertEqual(response['Access-Control-Allow-Origin'], self.ORIGIN)
+        self.assertEqual(response['Access-Control-Allow-Credentials'], 'true')
+
+    def test_other_requests_pass_through(self):
+        middleware = cors.PreflightMiddleware(lambda request: HttpResponse('reached the view'))
+        factory = RequestFactory()
+        for request in (factory.options('/api/notes/', HTTP_ORIGIN=self.ORIGIN),
+                        factory.get('/api/notes/', HTTP_ORIGIN=self.ORIGIN)):
+            self.assertEqual(middleware(request).content, b'reached the view')
+        # Origins the table cannot decide are left to CorsMiddleware
+        with override_settings(CORS_ALLOWED_ORIGIN_REGEXES=[r'^https://.*\.example$']):
+            response = self.preflight(cors.PreflightMiddleware, 'https://app.example')
+        self.assertEqual(response.content, b'reached the view')
+        with override_settings(CORS_URLS_REGEX=r'^/api/'):
+            response = self.preflight(cors.PreflightMiddleware, path='/admin/')
+        self.assertEqual(response.content, b'reached the view')
+
+    def test_served_before_the_rest_of_the_stack(self):
+        response = Client().options('/api/notes/', HTTP_ORIGIN=self.ORIGIN, HTTP_ACCESS_CONTROL_REQUEST_METHOD='DELETE')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Access-Control-Allow-Origin'], self.ORIGIN)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('X-Frame-Options', response)
+
+
+class StaticAssetTests(SimpleTestCase):
+    CSS = b'body { color: #333; margin: 0; }\n' * 100
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        storage = static_assets.CompressedManifestStaticFilesStorage(location=self.root, base_url='/static/')
+        storage.save('app/site.css', io.BytesIO(self.CSS))
+        storage.save('app/logo.png', io.BytesIO(b'\x89PNG not really'))
+        processed = list(storage.post_process({name: (storage, name) for name in ('app/site.css', 'app/logo.png')}))
+        self.assertFalse([error for _, _, error in processed if isinstance(error, Exception)])
+        self.hashed = storage.stored_name('app/site.css')
+        self.overrides = override_settings(STATIC_ROOT=self.root, STATIC_URL='/static/', SECURE_SSL_REDIRECT=False)
+        self.overrides.enable()
+        self.addCleanup(self.overrides.disable)
+
+    def test_collectstatic_writes_compressed_siblings(self):
+        self.assertNotEqual(self.hashed, 'app/site.css')
+        for name in ('app/site.css', self.hashed):
+            with open(os.path.join(self.root, name + '.gz'), 'rb') as f:
+                self.assertEqual(gzip.decompress(f.read()), self.CSS)
+        # Images are already compressed
+        self.assertFalse([name for name in os.listdir(os.path.join(self.root, 'app')) if 'logo' in name
+                          and name.endswith(('.gz', '.br'))])
+
+    def test_serves_best_variant_with_immutable_caching(self):
+        client = Client()
+        response = client.get('/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertNotIn('Content-Disposition', response)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.CSS)
+        self.assertEqual(response.wsgi_request.resolver_match.view_name, 'static')
+
+        plain = client.get('/static/app/site.css')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(b''.join(plain.streaming_content), self.CSS)
+        self.assertEqual(plain['Cache-Control'], 'public, max-age=3600')
+
+        cached = client.get('/static/app/site.css', HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(client.get('/static/app/missing.css').status_code, 404)
+
+    def test_not_used_without_collected_files(self):
+        with override_settings(STATIC_ROOT=os.path.join(self.root, 'nope')):
+            with self.assertRaises(MiddlewareNotUsed):
+                static_assets.StaticFilesMiddleware(lambda request: HttpResponse())
+
+
+class WarmupTests(TestCase):
+    databases = '__all__'  # connect_databases connects to every one
+    STEPS = ['backend.warmup.connect_databases', 'backend.warmup.resolve_urls', 'backend.warmup.load_templates',
+             'backend.warmup.build_serializers', 'backend.warmup.prime_caches',
+             'backend.warmup.prime_authentication']
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_runs_every_step(self):
+        with override_settings(WARMUP_STEPS=self.STEPS), self.assertLogs('backend.warmup', 'INFO') as logs:
+            durations = warmup.run()
+        self.assertEqual(list(durations), [path.rsplit('.', 1)[1] for path in self.STEPS])
+        self.assertIn('5 serializers', '\n'.join(logs.output))
+        self.assertGreaterEqual(warmup.WARMUP_DURATION.snapshot()[(('step', 'resolve_urls'),)]['count'], 1)
+
+    def test_failing_step_is_skipped(self):
+        steps = ['backend.warmup.missing_step', 'backend.warmup.resolve_urls']
+        with override_settings(WARMUP_STEPS=steps), self.assertLogs('backend.warmup', 'ERROR'):
+            self.assertEqual(list(warmup.run()), ['resolve_urls'])
+        with override_settings(WARMUP_ENABLED=False):
+            self.assertEqual(warmup.run(), {})
+
+    def test_lifespan_startup_warms_up(self):
+        sent = []
+        messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        app = warmup.LifespanMiddleware(mock.AsyncMock())
+        with mock.patch.object(warmup, 'run') as run:
+            async_to_sync(app)({'type': 'lifespan'}, receive, send)
+        run.assert_called_once_with()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        app.application.assert_not_called()
+
+        async_to_sync(app)({'type': 'http'}, receive, send)
+        app.application.assert_called_once()
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        self.opened = []
+
+        def connect():
+            connection = mock.Mock()
+            self.opened.append(connection)
+            return connection
+
+        return pool.ConnectionPool(connect, alias='test', **options)
+
+    def test_reuses_returned_connections_up_to_max_size(self):
+        connections = self.make_pool(max_size=2, timeout=0.05)
+        first, second = connections.acquire(), connections.acquire()
+        self.assertEqual(connections.stats(), {'size': 2, 'idle': 0, 'in_use': 2, 'max_size': 2})
+        with self.assertRaises(pool.PoolTimeout):
+            connections.acquire()
+        connections.release(second)
+        self.assertIs(connections.acquire(), second)
+        self.assertEqual(len(self.opened), 2)
+        self.assertGreaterEqual(pool.POOL_CHECKOUTS.snapshot()[(('alias', 'test'), ('result', 'timeout'))], 1)
+
+    def test_waiting_checkout_gets_released_connection(self):
+        connections = self.make_pool(max_size=1, timeout=5)
+        held = connections.acquire()
+        threading.Timer(0.05, connections.release, (held,)).start()
+        self.assertIs(connections.acquire(), held)
+
+    def test_unhealthy_connection_is_replaced_on_checkout(self):
+        connections = self.make_pool(max_size=1)
+        broken = connections.acquire()
+        connections.release(broken)
+        broken.cursor.side_effect = Exception('server closed the connection')
+        replacement = connections.acquire()
+        self.assertIsNot(replacement, broken)
+        broken.close.assert_called_once_with()
+        self.assertEqual(connections.stats()['size'], 1)
+
+    def test_ping_ends_the_transaction_it_opened(self):
+        connection = mock.Mock(autocommit=False)
+        self.assertTrue(pool.ping(connection))
+        connection.rollback.assert_called_once_with()
+        connection = mock.Mock(autocommit=True)
+        self.assertTrue(pool.ping(connection))
+        connection.rollback.assert_not_called()
+
+    def test_fill_and_idle_pruning(self):
+        connections = self.make_pool(min_size=1, max_size=3, max_idle=0)
+        connections.fill()
+        self.assertEqual(connections.stats(), {'size': 1, 'idle': 1, 'in_use': 0, 'max_size': 3})
+        first, second = connections.acquire(), connections.acquire()
+        connections.release(first)
+        connections.release(second)
+        # Idle past MAX_IDLE, but MIN_SIZE stay open
+        self.assertEqual(connections.stats()['size'], 1)
+        connections.close()
+        self.assertEqual(connections.stats()['size'], 0)
+
+
+class PooledBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(pool.close_pools, 'pooled')
+        backend = load_backend('backend.db.sqlite3')
+        settings_dict = {
+            'ENGINE': 'backend.db.sqlite3', 'NAME': os.path.join(directory, 'db.sqlite3'),
+            'POOL': {'MAX_SIZE': 2, 'TIMEOUT': 0.05}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+            'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False,
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'TEST': {},
+        }
+        self.wrappers = [backend.DatabaseWrapper(dict(settings_dict), 'pooled') for _ in range(3)]
+
+    def test_close_returns_connection_to_pool(self):
+        first, second, third = self.wrappers
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+        self.assertEqual(second.pool.stats(), {'size': 1, 'idle': 0, 'in_use': 1, 'max_size': 2})
+
+        first.ensure_connection()
+        with self.assertRaisesMessage(OperationalError, 'all 2 in use'):
+            third.ensure_connection()
+
+    def test_open_transaction_is_rolled_back_on_close(self):
+        first, second, _ = self.wrappers
+        first.ensure_connection()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id integer)')
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute('INSERT INTO item VALUES (1)')
+        first.close()
+        second.ensure_connection()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0,))
+        self.assertFalse(second.connection.in_transaction)
+
+    def test_autocommit_is_restored_before_reuse(self):
+        first, second, _ = self.wrappers
+        first.ensure_connection()
+        raw = first.connection
+        first.set_autocommit(False)
+        first.close()
+        self.assertIsNone(raw.isolation_level)  # sqlite3's autocommit
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+        self.assertTrue(second.get_autocommit())
+
+    def test_connection_that_cannot_be_reset_is_discarded(self):
+        first, second, _ = self.wrappers
+        first.ensure_connection()
+        raw = first.connection
+        first.set_autocommit(False)
+        with mock.patch.object(first, '_set_autocommit', side_effect=OperationalError('in a transaction')):
+            first.close()
+        second.ensure_connection()
+        self.assertIsNot(second.connection, raw)
+        self.assertEqual(second.pool.stats()['size'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['test_replica'], DATABASE_ROUTERS=['backend.db.router.ReplicaRouter'],
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReplicaRouterTests(TransactionTestCase):
+    """The primary is the test database, the replica a second SQLite file that nothing replicates to"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connections.settings['test_replica'] = connections.configure_settings(
+            {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'replica.sqlite3')}}
+        )['default']
+        self.addCleanup(connections.settings.pop, 'test_replica')
+        self.addCleanup(delattr, connections._connections, 'test_replica')
+        self.addCleanup(connections['test_replica'].close)
+        with connections['test_replica'].schema_editor() as editor:
+            editor.create_model(User)
+        User.objects.using('test_replica').create(username='replicated')
+        # Restored when the class's DATABASE_ROUTERS override ends
+        db_router.routers = [router.ReplicaRouter()]
+        self.monitor = db_router.routers[0].monitor
+        # Pins from earlier tests
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def handle(self, view, **headers):
+        """Runs ``view`` as a request's view; returns what it returned"""
+        result = []
+        middleware = router.ReplicaPinningMiddleware(lambda request: result.append(view()) or HttpResponse())
+        middleware(self.factory.get('/api/notes/', **headers))
+        return result[0]
+
+    def usernames(self):
+        return list(User.objects.values_list('username', flat=True))
+
+    def test_reads_go_to_replica_until_the_request_writes(self):
+        def view():
+            before = self.usernames()
+            User.objects.create(username='written')
+            return before, self.usernames()
+
+        before, after = self.handle(view)
+        self.assertEqual(before, ['replicated'])
+        self.assertEqual(after, ['written'])
+        # Outside requests everything stays on the primary
+        self.assertEqual(self.usernames(), ['written'])
+
+    def test_client_that_wrote_reads_from_primary_for_pin_window(self):
+        self.handle(lambda: User.objects.create(username='written'), HTTP_AUTHORIZATION='Bearer a')
+        self.assertEqual(self.handle(self.usernames, HTTP_AUTHORIZATION='Bearer a'), ['written'])
+        with override_settings(REPLICA_PIN_SECONDS=0.01):
+            self.handle(lambda: User.objects.create(username='again'), HTTP_AUTHORIZATION='Bearer c')
+        time.sleep(0.02)
+        self.assertEqual(self.handle(self.usernames, HTTP_AUTHORIZATION='Bearer c'), ['replicated'])
+
+    def test_one_clients_write_does_not_pin_others(self):
+        # Everyone comes through the same proxy
+        self.handle(lambda: User.objects.create(username='written'), HTTP_AUTHORIZATION='Bearer a')
+        self.assertEqual(self.handle(self.usernames, HTTP_AUTHORIZATION='Bearer b'), ['replicated'])
+        self.assertEqual(self.handle(self.usernames), ['replicated'])
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_anonymous_clients_are_pinned_by_forwarded_address(self):
+        self.handle(lambda: User.objects.create(username='written'), HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(self.handle(self.usernames, HTTP_X_FORWARDED_FOR='203.0.113.7'), ['written'])
+        self.assertEqual(self.handle(self.usernames, HTTP_X_FORWARDED_FOR='198.51.100.2'), ['replicated'])
+        # Only the entry the proxy appended counts, not what the client sent
+        self.assertEqual(self.handle(self.usernames, HTTP_X_FORWARDED_FOR='203.0.113.7, 198.51.100.2'),
+                         ['replicated'])
+
+    def test_lagging_replica_is_ejected_and_reinstated(self):
+        self.monitor.interval = 0
+        with mock.patch.object(router, 'replication_lag', return_value=30.0), \
+                self.assertLogs('backend.db.router', 'WARNING'):
+            self.assertEqual(self.handle(self.usernames), [])
+        self.assertGreaterEqual(router.EJECTIONS.snapshot()[(('database', 'test_replica'),)], 1)
+        with mock.patch.object(router, 'replication_lag', side_effect=OperationalError('down')), \
+                self.assertLogs('backend.db.router', 'WARNING') as logs:
+            self.assertEqual(self.handle(self.usernames), [])
+        self.assertIn('did not report its lag', logs.output[0])
+        with mock.patch.object(router, 'replication_lag', return_value=0.5):
+            self.assertEqual(self.handle(self.usernames), ['replicated'])
+
+    def test_middleware_removes_itself_without_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]), self.assertRaises(MiddlewareNotUsed):
+            router.ReplicaPinningMiddleware(lambda request: HttpResponse())
@@ -2,6 +2,7 @@
 from django.contrib import admin  # For Django's admin interface
 from django.urls import path, include  # URL routing utilities
 from api.views import CreateUserView, CustomTokenObtainPairView  # Add CustomTokenObtainPairView  # Custom view for user registration
+from backend.instrumentation import metrics_view  # Prometheus scrape endpoint
 
 # JWT (JSON Web Token) authentication views
 from rest_framework_simplejwt.views import (
@@ -9,14 +10,14 @@ from rest_framework_simplejwt.views import (
 )
 
 # API root view function
-from django.http import JsonResponse
+from backend.fastjson import FastJsonResponse  # JsonResponse, encoded with orjson when available
 
-def api_root(request):
+def api_root_document():
     """
-    Root API view that provides documentation of available endpoints
-    Returns a JSON response listing all available API endpoints
+    Documentation of available endpoints, served at the API root.
+    Built once at startup by StaticResponseMiddleware (STATIC_RESPONSES in settings.py)
     """
-    return JsonResponse({
+    return {
         "message": "Welcome to My Web API",
         "endpoints": {
             "notes": "/api/notes/",              # Endpoint for notes operations
@@ -47,7 +48,16 @@ def api_root(request):
                 }
             }
         }
-    })
+    }
+
+
+def api_root(request):
+    """
+    Root API view that provides documentation of available endpoints
+    Returns a JSON response listing all available API endpoints
+    (GET/HEAD are answered by StaticResponseMiddleware before reaching it)
+    """
+    return FastJsonResponse(api_root_document())
 
 # URL Patterns Configuration
 urlpatterns = [
@@ -91,6 +101,17 @@ urlpatterns = [
     path('api/payments/', 
          include('payments.urls')),
 
+    # Metrics Endpoint
+    # Per-view latency/query histograms in Prometheus text format
+    path('metrics', 
+         metrics_view, 
+         name='metrics'),
+
+    # Newsletter URLs
+    # Mounts the newsletter subscribe endpoint (api/newsletter/subscribe)
+    path('', 
+         include('SendEmail.urls')),
+
     # API Root
     # Shows the welcome message and available endpoints
     path('', 
@@ -0,0 +1,159 @@
+"""
+Worker warm-up.
+
+Without it the first requests a fresh worker serves pay for opening database
+connections, compiling URL patterns, loading templates, introspecting models
+for serializers and building the Stripe client. run() does all of that up
+front: gunicorn calls it from post_worker_init (gunicorn.conf.py), after the
+worker has loaded the application and before it accepts connections, and
+``backend.asgi`` calls it on the ASGI lifespan startup event.
+
+WARMUP_STEPS lists the steps as dotted paths, so deployments can add, drop
+or reorder them. Each step's duration is logged and recorded in the
+``worker_warmup_seconds`` histogram. A failing step is logged and skipped -
+a worker that could not warm up still serves requests, just more slowly at
+first.
+"""
+import logging
+import time
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+WARMUP_DURATION = metrics.histogram(
+    'worker_warmup_seconds', 'Duration of each worker warm-up step',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+def run():
+    """Run every WARMUP_STEPS step once; returns {step: seconds} for the steps that succeeded"""
+    if not settings.WARMUP_ENABLED:
+        return {}
+    durations = {}
+    started = time.perf_counter()
+    for path in settings.WARMUP_STEPS:
+        step = path.rsplit('.', 1)[-1]
+        start = time.perf_counter()
+        try:
+            detail = import_string(path)()
+        except Exception:
+            logger.exception("Warm-up step %s failed", step)
+            continue
+        elapsed = time.perf_counter() - start
+        durations[step] = elapsed
+        WARMUP_DURATION.observe(elapsed, step=step)
+        logger.info("Warm-up %s %.1fms %s", step, elapsed * 1000, detail or '',
+                    extra={'warmup': {'step': step, 'ms': elapsed * 1000}})
+    logger.info("Warm-up done in %.1fms", (time.perf_counter() - started) * 1000,
+                extra={'warmup': {'ms': {step: seconds * 1000 for step, seconds in durations.items()}}})
+    return durations
+
+
+def connect_databases():
+    """Open each database's connection for this thread and run its connection setup"""
+    from django.db import connections
+
+    for alias in connections:
+        connections[alias].ensure_connection()
+    return f'{len(connections.all())} database(s)'
+
+
+def resolve_urls():
+    """Compile every URL pattern's regex and build the reverse() lookup tables"""
+    from django.urls import URLResolver, get_resolver
+
+    resolver = get_resolver()
+    count = 0
+    pending = [resolver]
+    while pending:
+        for pattern in pending.pop().url_patterns:
+            pattern.pattern.regex  # compiled on first access
+            count += 1
+            if isinstance(pattern, URLResolver):
+                pending.append(pattern)
+    resolver.reverse_dict  # populates the namespace and app lookups too
+    return f'{count} patterns'
+
+
+def load_templates():
+    """Compile WARMUP_TEMPLATES into the cached template loader"""
+    from django.template.loader import get_template
+
+    for name in settings.WARMUP_TEMPLATES:
+        get_template(name)
+    return f'{len(settings.WARMUP_TEMPLATES)} templates'
+
+
+def build_serializers():
+    """Build the fields of every serializer in the project's apps (model introspection, validators)"""
+    from rest_framework.serializers import Serializer
+
+    count = 0
+    for app_config in apps.get_app_configs():
+        if not app_config.path.startswith(str(settings.BASE_DIR)):
+            continue
+        try:
+            module = import_module(f'{app_config.name}.serializers')
+        except ModuleNotFoundError:
+            continue
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, Serializer) and value.__module__ == module.__name__:
+                value().fields
+                count += 1
+    return f'{count} serializers'
+
+
+def prime_caches():
+    """Connect to every configured cache and fill Django's ContentType cache"""
+    from django.contrib.contenttypes.models import ContentType
+    from django.core.cache import caches
+
+    for alias in settings.CACHES:
+        caches[alias].get('warmup')
+    ContentType.objects.get_for_models(*apps.get_models())
+    return f'{len(settings.CACHES)} cache(s)'
+
+
+def prime_authentication():
+    """Sign and verify a throwaway access token: loads the JWT backend and its signing key"""
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    AccessToken(str(AccessToken()))
+
+
+def build_stripe_client():
+    """Import stripe and build the shared client (its connection pool fills on first use)"""
+    from payments.stripe_client import get_stripe_client
+
+    get_stripe_client()
+
+
+class LifespanMiddleware:
+    """
+    ASGI wrapper answering lifespan events, which Django's ASGIHandler
+    rejects: warm up on startup, acknowledge shutdown. Everything else goes
+    to the wrapped application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.application(scope, receive, send)
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Thread-sensitive: the connections are opened on the thread sync views run on
+                await sync_to_async(run)()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,210 @@
+"""
+Async HTTP load generator.
+
+A small HTTP/1.1 client on asyncio streams (keep-alive when the server allows
+it, reconnecting when it doesn't) and a runner that drives scenarios from many
+concurrent virtual users. Each request is labelled; latencies are recorded
+per label.
+
+Standard library only, so the load test runs anywhere the backend does.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from .results import summarize_latencies
+
+# Error messages kept per scenario run (every error is still counted)
+MAX_ERRORS_KEPT = 50
+
+
+class HTTPError(Exception):
+    def __init__(self, label, status, body):
+        super().__init__(f'{label}: HTTP {status}: {body[:200]!r}')
+        self.status = status
+        self.body = body
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Client:
+    """One keep-alive connection per virtual user"""
+
+    def __init__(self, base_url, recorder, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self.token = None
+        self._reader = self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._reader = self._writer = None
+
+    async def request(self, label, method, path, payload=None, expect=(200, 201, 204), headers=None):
+        """Send one request, record its latency under ``label`` and return the Response"""
+        body = json.dumps(payload).encode() if payload is not None else b''
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                 f'Content-Length: {len(body)}', 'Accept: application/json']
+        if payload is not None:
+            lines.append('Content-Type: application/json')
+        if self.token:
+            lines.append(f'Authorization: Bearer {self.token}')
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        raw = ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(self._exchange(raw), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+            await self.close()
+            self.recorder.error(label)
+            raise HTTPError(label, 0, str(exc).encode()) from exc
+        elapsed = time.perf_counter() - start
+
+        if response.status not in expect:
+            self.recorder.error(label)
+            raise HTTPError(label, response.status, response.body)
+        self.recorder.record(label, elapsed)
+        return response
+
+    async def _exchange(self, raw):
+        for attempt in range(2):
+            if self._writer is None:
+                await self._connect()
+            try:
+                self._writer.write(raw)
+                await self._writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed an idle keep-alive connection; retry once on a new one
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _read_response(self):
+        status_line = await self._reader.readuntil(b'\r\n')
+        if not status_line.strip():
+            raise asyncio.IncompleteReadError(status_line, None)
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    await self._reader.readuntil(b'\r\n')
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await self._reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self._reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return Response(status, headers, body)
+
+
+class Recorder:
+    """Latencies and error counts per request label"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, label, seconds):
+        self.latencies.setdefault(label, []).append(seconds)
+
+    def error(self, label):
+        self.errors[label] = self.errors.get(label, 0) + 1
+
+    def summary(self, duration):
+        labels = set(self.latencies) | set(self.errors)
+        return {label: summarize_latencies(self.latencies.get(label, []), self.errors.get(label, 0), duration)
+                for label in sorted(labels)}
+
+
+async def run_scenario(scenario, base_url, concurrency, duration, context, warmup=0.0):
+    """
+    Run ``scenario`` from ``concurrency`` virtual users for ``duration`` seconds.
+
+    A scenario is an object with ``async setup(client, context, user_index)`` (optional)
+    and ``async iteration(client, state)``; setup returns the per-user state.
+    Requests made during setup and warm-up are not recorded.
+    Returns (summary per label, list of error messages).
+    """
+    recorder = Recorder()
+    discard = Recorder()
+    errors = []
+    clock = {}
+    # Start gate: the last user to finish setup starts the clock and opens it
+    # (asyncio.Barrier needs Python 3.11; the runtime is 3.9)
+    arrived = [0]
+    started = asyncio.Event()
+
+    async def user(index):
+        client = Client(base_url, discard)
+        state = None
+        try:
+            try:
+                setup = getattr(scenario, 'setup', None)
+                state = await setup(client, context, index) if setup else {}
+            except HTTPError as exc:
+                errors.append(f'setup: {exc}')
+            # Everyone finishes setup before the clock starts
+            arrived[0] += 1
+            if arrived[0] == concurrency:
+                clock['start'] = time.perf_counter() + warmup
+                clock['deadline'] = clock['start'] + duration
+                started.set()
+            await started.wait()
+            if state is None:
+                return
+            while time.perf_counter() < clock['deadline']:
+                client.recorder = recorder if time.perf_counter() >= clock['start'] else discard
+                try:
+                    if await scenario.iteration(client, state) is False:
+                        return  # the scenario ran out of work for this user
+                except HTTPError as exc:
+                    if len(errors) < MAX_ERRORS_KEPT:
+                        errors.append(str(exc))
+                    if exc.status == 0:
+                        await asyncio.sleep(0.1)  # connection trouble; don't spin
+        finally:
+            await client.close()
+
+    await asyncio.gather(*(user(index) for index in range(concurrency)))
+    elapsed = min(time.perf_counter(), clock['deadline']) - clock['start']
+    return recorder.summary(max(elapsed, 1e-9)), errors
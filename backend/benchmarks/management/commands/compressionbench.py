@@ -0,0 +1,119 @@
+import os
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from rest_framework.test import APIClient
+
+from api.models import Note
+from backend import compression
+from benchmarks import results
+from payments.models import Payment
+
+# (label, path); the notes and payments endpoints are measured per --sizes row count
+ENDPOINTS = [
+    ('api-root', '/'),
+    ('current-user', '/api/user/current/'),
+    ('note-list', '/api/notes/'),
+    ('payment-history', '/api/payments/history/'),
+    ('revenue-rollups', '/api/payments/revenue/'),
+]
+SIZED = {'note-list', 'payment-history'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Bytes saved against CPU cost of response compression, per endpoint: fetches each "
+        "endpoint uncompressed from a throwaway test database, then compresses the body "
+        "with every encoding and level, timing the best of several runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000',
+                            help='Comma-separated note/payment counts for the list endpoints')
+        parser.add_argument('--gzip-levels', default='1,6,9')
+        parser.add_argument('--brotli-qualities', default='1,5,11',
+                            help='Ignored when the brotli package is not installed')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per body; the best is kept')
+        parser.add_argument('--output', help='Where to write results (default: logs/benchmarks/compressionbench-<time>.json)')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',')})
+            codecs = [('gzip', int(level)) for level in options['gzip_levels'].split(',')]
+            if compression.brotli is not None:
+                codecs += [('br', int(quality)) for quality in options['brotli_qualities'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes and the levels must be comma-separated integers')
+
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            # No compression by the middleware: the raw bodies are what gets measured
+            with override_settings(ALLOWED_HOSTS=['testserver'], SECURE_SSL_REDIRECT=False,
+                                   COMPRESSION_MIN_SIZE=float('inf')):
+                bodies = self.fetch(sizes)
+        finally:
+            teardown_databases(databases, verbosity=0)
+
+        self.stdout.write(f"{'endpoint':<24} {'codec':<8} {'bytes':>9} {'->':>9} {'saved':>7} {'us':>9} {'MB/s':>8}")
+        summary = {}
+        for name, body in bodies.items():
+            for encoding, level in codecs:
+                row = measure(body, encoding, level, options['repeat'])
+                summary[f'{name}:{encoding}-{level}'] = row
+                self.stdout.write(f"{name:<24} {encoding + '-' + str(level):<8} {row['original_bytes']:>9} "
+                                  f"{row['compressed_bytes']:>9} {row['saved_pct']:>6.1f}% "
+                                  f"{row['us']:>9.1f} {row['mb_per_sec']:>8.1f}")
+
+        doc = results.document('compressionbench', summary, sizes=sizes, repeat=options['repeat'])
+        output = options['output'] or os.path.join(
+            settings.LOGS_DIR, 'benchmarks', f"compressionbench-{datetime.now():%Y%m%d-%H%M%S}.json")
+        results.save(doc, output)
+        self.stdout.write(f'Results written to {output}')
+
+    def fetch(self, sizes):
+        user = User.objects.create_user('compression', 'compression@example.com', 'Bench-pw-123',
+                                        is_staff=True)  # the revenue endpoint is staff-only
+        api = APIClient()
+        api.force_authenticate(user)
+        bodies = {}
+        for size in sizes:
+            Note.objects.filter(author=user).delete()
+            Payment.objects.filter(user=user).delete()
+            Note.objects.bulk_create([
+                Note(title=f'Note {i}', content=f'Meeting notes {i}: ' + 'discussed the release plan. ' * 8,
+                     author=user) for i in range(size)])
+            Payment.objects.bulk_create([
+                Payment(user=user, amount=Decimal('149.99'), payment_intent_id=f'pi_bench{i}',
+                        status='completed', plan_type='partnership') for i in range(size)])
+            for name, path in ENDPOINTS:
+                if name in SIZED or size == sizes[0]:
+                    response = api.get(path)
+                    if response.status_code != 200:
+                        raise CommandError(f'GET {path} returned {response.status_code}')
+                    bodies[f'{name}[{size}]' if name in SIZED else name] = response.content
+        return bodies
+
+
+def measure(body, encoding, level, repeat):
+    """Compressed size and best-of-``repeat`` time of one body at one encoding/level"""
+    setting = 'COMPRESSION_BROTLI_QUALITY' if encoding == 'br' else 'COMPRESSION_GZIP_LEVEL'
+    # Without the random gzip padding sizes are repeatable between runs
+    with override_settings(**{setting: level}, COMPRESSION_MAX_RANDOM_BYTES=0):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compressed = compression.compress(body, encoding)
+            timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        'original_bytes': len(body),
+        'compressed_bytes': len(compressed),
+        'saved_pct': 100 * (1 - len(compressed) / len(body)),
+        'us': best * 1e6,
+        'mb_per_sec': len(body) / best / 1e6 if best else 0.0,
+    }
@@ -0,0 +1,127 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import results
+
+# What a gunicorn worker does before it can answer: import the WSGI application
+# (settings, app registry, middleware), then load the URLconf, which Django
+# defers to the first request and which imports every view module
+BOOT_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+from {module} import {attribute}
+booted = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+done = time.perf_counter()
+print(json.dumps({{'boot_ms': (booted - start) * 1000, 'urlconf_ms': (done - booted) * 1000}}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Cold-start time of a worker: boots the WSGI application and loads the URLconf in "
+        "fresh interpreters under `python -X importtime`, ranks top-level packages by the "
+        "import time they account for, and fails when the median start exceeds the budget "
+        "(STARTUP_BUDGET_MS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to start; the median counts')
+        parser.add_argument('--top', type=int, default=15, help='Packages to list')
+        parser.add_argument('--budget', type=float, help='Milliseconds allowed (default: STARTUP_BUDGET_MS)')
+        parser.add_argument('--output', help='Where to write results (default: logs/benchmarks/importtime-<time>.json)')
+        parser.add_argument('--compare', metavar='PATH', help='Earlier results to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help='Allowed relative slowdown before a metric counts as a regression')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+        budget = options['budget'] if options['budget'] is not None else settings.STARTUP_BUDGET_MS
+
+        runs = [cold_start() for _ in range(options['runs'])]
+        totals = sorted(run['total_ms'] for run in runs)
+        median = statistics.median(totals)
+        # The package ranking comes from the run closest to the median
+        run = min(runs, key=lambda run: abs(run['total_ms'] - median))
+        packages = rank_packages(run['imports'])
+        import_ms = sum(ms for ms, _ in packages.values())
+
+        self.stdout.write(f"{'package':<32} {'ms':>9} {'share':>7} {'modules':>8}")
+        for name, (ms, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:options['top']]:
+            self.stdout.write(f'{name:<32} {ms:>9.1f} {ms / import_ms:>7.1%} {count:>8}')
+        self.stdout.write(f"\n{'imports':<24} {import_ms:>9.1f} ms")
+        self.stdout.write(f"{'application boot':<24} {run['boot_ms']:>9.1f} ms")
+        self.stdout.write(f"{'URLconf':<24} {run['urlconf_ms']:>9.1f} ms")
+        self.stdout.write(f"{'cold start':<24} {median:>9.1f} ms  (median of {len(runs)}, "
+                          f"min {totals[0]:.1f}, max {totals[-1]:.1f}; budget {budget:.0f} ms)")
+
+        summary = {
+            'cold_start': {'total_ms': median, 'min_ms': totals[0], 'boot_ms': run['boot_ms'],
+                           'urlconf_ms': run['urlconf_ms'], 'import_ms': import_ms},
+            **{f'package:{name}': {'import_ms': ms} for name, (ms, _) in packages.items()},
+        }
+        doc = results.document('importtime', summary, runs=len(runs), budget_ms=budget)
+        output = options['output'] or os.path.join(
+            settings.LOGS_DIR, 'benchmarks', f"importtime-{datetime.now():%Y%m%d-%H%M%S}.json")
+        results.save(doc, output)
+        self.stdout.write(f'Results written to {output}')
+
+        if options['compare']:
+            rows = results.compare(doc, results.load(options['compare']), options['tolerance'])
+            self.stdout.write(results.format_comparison(rows))
+            regressions = sum(1 for row in rows if row[-1])
+            if regressions:
+                self.stdout.write(self.style.WARNING(f'{regressions} metric(s) regressed'))
+
+        if median > budget:
+            raise CommandError(f'Cold start took {median:.0f} ms, over the {budget:.0f} ms budget')
+
+
+def cold_start():
+    """One fresh interpreter booting the application: phase timings, wall time and its import log"""
+    module, attribute = settings.WSGI_APPLICATION.rsplit('.', 1)
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings')}
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT.format(module=module, attribute=attribute)],
+        capture_output=True, text=True, cwd=settings.BASE_DIR, env=env)
+    total = time.perf_counter() - start
+    if process.returncode != 0:
+        raise CommandError(f'Booting {settings.WSGI_APPLICATION} failed:\n{process.stderr[-2000:]}')
+    phases = json.loads(process.stdout.strip().splitlines()[-1])
+    return {'total_ms': total * 1000, **phases, 'imports': parse_importtime(process.stderr)}
+
+
+def parse_importtime(output):
+    """[(module, self µs, cumulative µs)] from ``-X importtime`` output; other lines are skipped"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        try:
+            imports.append((module.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:  # the column header
+            continue
+    return imports
+
+
+def rank_packages(imports):
+    """{top-level package: (ms, module count)}; self times, so the packages add up to the total"""
+    packages = defaultdict(lambda: [0.0, 0])
+    for module, self_us, _ in imports:
+        package = packages[module.split('.')[0]]
+        package[0] += self_us / 1000
+        package[1] += 1
+    return {name: tuple(value) for name, value in packages.items()}
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import results
+from benchmarks.loadgen import Client, HTTPError, Recorder, run_scenario
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.smtp_stub import SMTPStub
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baselines', 'loadtest.json')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "HTTP load test. Starts gunicorn with benchmarks.settings against a throwaway "
+        "database, the Stripe stub and a local SMTP sink, runs each scenario for a fixed "
+        "time and reports throughput and p50/p95/p99 latency per request type. Results "
+        "are saved as JSON and compared with a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), dest='scenarios',
+                            help='Scenario to run (repeatable; default: all)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Virtual users (default: 10)')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds measured per scenario')
+        parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds before each scenario')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (default: 2)')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker (default: 4)')
+        parser.add_argument('--database-url',
+                            help='Database for the server (default: a new SQLite file; use Postgres for '
+                                 'numbers comparable to production)')
+        parser.add_argument('--stripe-latency-ms', type=float, default=0.0,
+                            help='Delay the Stripe stub adds to every call')
+        parser.add_argument('--url', help='Load-test an already running server instead of starting one; '
+                                          'it must use the Stripe stub and an SMTP sink itself')
+        parser.add_argument('--smtp-port', type=int, default=0,
+                            help='Port for the SMTP sink (default: any free port)')
+        parser.add_argument('--output', help='Where to write results (default: logs/benchmarks/loadtest-<time>.json)')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative slowdown before a metric counts as a regression')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Store these results as the new baseline')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit non-zero when a metric regressed')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        names = options['scenarios'] or list(SCENARIOS)
+        summary, meta = asyncio.run(self.run(names, options))
+
+        doc = results.document('loadtest', summary, scenarios=names, **meta)
+        output = options['output'] or os.path.join(
+            settings.LOGS_DIR, 'benchmarks', f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json")
+        results.save(doc, output)
+        self.report(summary)
+        self.stdout.write(f'Results written to {output}')
+
+        if options['update_baseline']:
+            results.save(doc, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline updated: {options['baseline']}"))
+            return
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(f"No baseline at {options['baseline']}; run with --update-baseline to create one")
+            return
+
+        baseline = results.load(options['baseline'])
+        for key in ('concurrency', 'duration', 'workers', 'threads', 'database'):
+            if baseline['meta'].get(key) != doc['meta'].get(key):
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was recorded with {key}={baseline['meta'].get(key)!r}, "
+                    f"this run used {doc['meta'].get(key)!r}; numbers may not be comparable"))
+        rows = results.compare(doc, baseline, options['tolerance'])
+        self.stdout.write(results.format_comparison(rows))
+        regressions = [row for row in rows if row[-1]]
+        if regressions:
+            message = f'{len(regressions)} metric(s) regressed more than {options["tolerance"]:.0%}'
+            if options['fail_on_regression']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+
+    async def run(self, names, options):
+        smtp = await SMTPStub(port=options['smtp_port']).start()
+        context = {'run_id': uuid.uuid4().hex[:8], 'smtp': smtp}
+        processes = []
+        meta = {'concurrency': options['concurrency'], 'duration': options['duration']}
+        try:
+            if options['url']:
+                base_url = options['url'].rstrip('/')
+            else:
+                base_url, processes = self.start_server(options, smtp.port)
+                meta.update(workers=options['workers'], threads=options['threads'],
+                            database=options['database_url'] or 'sqlite')
+            await self.wait_until_ready(base_url)
+
+            summary = {}
+            for number, name in enumerate(names):
+                if self.verbosity:
+                    self.stdout.write(f'Running {name}...')
+                # Each scenario registers its own accounts
+                scenario_context = {**context, 'run_id': f"{context['run_id']}s{number}"}
+                scenario_summary, errors = await run_scenario(
+                    SCENARIOS[name](), base_url, options['concurrency'], options['duration'],
+                    scenario_context, warmup=options['warmup'])
+                summary.update(scenario_summary)
+                for error in errors[:5]:
+                    self.stderr.write(f'  {error}')
+            return summary, meta
+        finally:
+            await smtp.stop()
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    def start_server(self, options, smtp_port):
+        workdir = tempfile.mkdtemp(prefix='loadtest-')
+        port, stripe_port = _free_port(), _free_port()
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+            'DATABASE_URL': options['database_url'] or f"sqlite:///{os.path.join(workdir, 'db.sqlite3')}",
+            'STRIPE_API_BASE': f'http://127.0.0.1:{stripe_port}',
+            'STRIPE_SECRET_KEY': 'sk_test_loadtest',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': str(smtp_port),
+            'SECRET_KEY': os.environ.get('SECRET_KEY') or 'loadtest-secret-key',
+        }
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+        log = open(os.path.join(workdir, 'server.log'), 'w')
+        if self.verbosity:
+            self.stdout.write(f'Server logs: {log.name}')
+
+        migrate = subprocess.run(manage + ['migrate', '--noinput'], env=env, cwd=settings.BASE_DIR,
+                                 stdout=log, stderr=subprocess.STDOUT)
+        if migrate.returncode:
+            raise CommandError(f'migrate failed, see {log.name}')
+
+        processes = [
+            subprocess.Popen(manage + ['stripe_stub', '--port', str(stripe_port),
+                                       '--latency-ms', str(options['stripe_latency_ms'])],
+                             env=env, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT),
+            subprocess.Popen([sys.executable, '-m', 'gunicorn', 'backend.wsgi',
+                              '--bind', f'127.0.0.1:{port}',
+                              '--workers', str(options['workers']), '--threads', str(options['threads'])],
+                             env=env, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT),
+        ]
+        return f'http://127.0.0.1:{port}', processes
+
+    async def wait_until_ready(self, base_url, timeout=30):
+        client = Client(base_url, Recorder(), timeout=2)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    await client.request('ready', 'GET', '/', expect=range(100, 600))
+                    return
+                except HTTPError:
+                    if time.monotonic() > deadline:
+                        raise CommandError(f'Server at {base_url} did not start within {timeout}s')
+                    await asyncio.sleep(0.2)
+        finally:
+            await client.close()
+
+    def report(self, summary):
+        self.stdout.write(f"{'request':<24} {'count':>7} {'errors':>6} {'rps':>8} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for label, row in summary.items():
+            self.stdout.write(f"{label:<24} {row['requests']:>7} {row['errors']:>6} {row['rps']:>8.1f} "
+                              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
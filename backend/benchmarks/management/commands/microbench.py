@@ -0,0 +1,81 @@
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import setup_databases, teardown_databases
+
+from benchmarks import results
+from benchmarks.micro import BENCHMARKS, measure
+
+
+class Command(BaseCommand):
+    help = (
+        "Serializer and view micro-benchmarks: per-object time and peak allocations "
+        "(tracemalloc) over synthetic object sets. Database-backed benchmarks run in "
+        "a throwaway test database. Results are JSON and can be compared between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bench', action='append', choices=sorted(BENCHMARKS), dest='benches',
+                            help='Benchmark to run (repeatable; default: all)')
+        parser.add_argument('--sizes', default='10,100,1000,10000,100000',
+                            help='Comma-separated object counts (default: 10 to 100k)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per size; the best is kept')
+        parser.add_argument('--output', help='Where to write results (default: logs/benchmarks/microbench-<time>.json)')
+        parser.add_argument('--compare', metavar='PATH', help='Earlier results to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help='Allowed relative slowdown before a metric counts as a regression')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',')})
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        benches = [BENCHMARKS[name]() for name in options['benches'] or BENCHMARKS]
+
+        databases = None
+        if any(bench.uses_db for bench in benches):
+            databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            summary = self.run(benches, sizes, options['repeat'])
+        finally:
+            if databases is not None:
+                teardown_databases(databases, verbosity=0)
+
+        doc = results.document('microbench', summary, sizes=sizes, repeat=options['repeat'])
+        output = options['output'] or os.path.join(
+            settings.LOGS_DIR, 'benchmarks', f"microbench-{datetime.now():%Y%m%d-%H%M%S}.json")
+        results.save(doc, output)
+        self.stdout.write(f'Results written to {output}')
+
+        if options['compare']:
+            rows = results.compare(doc, results.load(options['compare']), options['tolerance'])
+            # Only per-object cost matters across commits; totals follow from it
+            rows = [row for row in rows if row[1] in ('us_per_op', 'bytes_per_op')]
+            self.stdout.write(results.format_comparison(rows))
+            regressions = sum(1 for row in rows if row[-1])
+            if regressions:
+                self.stdout.write(self.style.WARNING(f'{regressions} metric(s) regressed'))
+
+    def run(self, benches, sizes, repeat):
+        summary = {}
+        self.stdout.write(f"{'benchmark':<28} {'size':>7} {'us/op':>10} {'ops/s':>12} {'peak KiB':>10} {'B/op':>8}")
+        for bench in benches:
+            for size in sizes:
+                if bench.max_size and size > bench.max_size:
+                    continue
+                if bench.uses_db:
+                    # Leave the test database as setup_databases made it for the next size
+                    with transaction.atomic():
+                        row = measure(bench, size, repeat)
+                        transaction.set_rollback(True)
+                else:
+                    # No database here: the configured one may be unreachable, or production
+                    row = measure(bench, size, repeat)
+                summary[f'{bench.name}[{size}]'] = row
+                self.stdout.write(f"{bench.name:<28} {size:>7} {row['us_per_op']:>10.2f} "
+                                  f"{row['ops_per_sec']:>12.0f} {row['peak_kib']:>10.1f} "
+                                  f"{row['bytes_per_op']:>8.0f}")
+        return summary
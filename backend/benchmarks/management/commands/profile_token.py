@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Print a token for the X-Profile request header. Requests carrying it are "
+        "profiled into logs/profiles (PROFILING_ENABLED must be on). Staff users only; "
+        "tokens expire after PROFILING_TOKEN_MAX_AGE seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options['username']).first()
+        if user is None or not user.is_staff:
+            raise CommandError(f"{options['username']} is not a staff user")
+        self.stdout.write(make_token(user))
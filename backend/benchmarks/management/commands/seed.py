@@ -0,0 +1,124 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time as dt_time, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from benchmarks import seed
+from payments.models import DailyPaymentRollup, Payment
+from payments.rollups import rebuild_daily_rollups
+
+
+def _worker(args):
+    # Each worker process opens its own database connection on first use
+    return seed.write_chunk(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate deterministic synthetic data for scale testing: users, notes, payments, "
+        "reset codes, remember-me tokens and newsletter subscribers, with a few power users "
+        "owning a large share of the rows. Uses COPY on PostgreSQL and batched inserts "
+        "elsewhere, optionally across several worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--notes', type=int, default=100_000)
+        parser.add_argument('--payments', type=int, default=20_000)
+        parser.add_argument('--reset-codes', type=int, default=5_000)
+        parser.add_argument('--remember-tokens', type=int, default=2_000)
+        parser.add_argument('--subscribers', type=int, default=10_000)
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Multiply every count, e.g. --scale 100 for 10M notes')
+        parser.add_argument('--power-users', type=int, default=10,
+                            help='Users that own --power-share of all rows (default: 10)')
+        parser.add_argument('--power-share', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=42, help='Same seed, same data')
+        parser.add_argument('--anchor', default=None,
+                            help='Date (YYYY-MM-DD) timestamps count back from (default: today)')
+        parser.add_argument('--password', default='seed-password',
+                            help='Password of every seeded user; hashed once up front')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Parallel processes (default: CPU count on PostgreSQL, 1 on SQLite)')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        scale = options['scale']
+        counts = {
+            'users': int(options['users'] * scale),
+            'notes': int(options['notes'] * scale),
+            'payments': int(options['payments'] * scale),
+            'reset_codes': int(options['reset_codes'] * scale),
+            'remember_tokens': int(options['remember_tokens'] * scale),
+            'subscribers': int(options['subscribers'] * scale),
+        }
+        if counts['users'] < 1 and any(counts[key] for key in ('notes', 'payments', 'reset_codes', 'remember_tokens')):
+            raise CommandError('Rows that belong to users need at least one user')
+
+        try:
+            anchor_date = (datetime.strptime(options['anchor'], '%Y-%m-%d').date()
+                           if options['anchor'] else datetime.now(timezone.utc).date())
+        except ValueError:
+            raise CommandError('--anchor must be YYYY-MM-DD')
+
+        config = {
+            'seed': options['seed'],
+            'anchor': datetime.combine(anchor_date, dt_time(), tzinfo=timezone.utc),
+            # One hash for everyone: hashing millions of passwords would take days
+            'password': make_password(options['password']),
+            'users': counts['users'],
+            'power_users': min(options['power_users'], counts['users']),
+            'power_share': options['power_share'],
+            'start': seed.next_ids(),
+        }
+
+        workers = options['workers']
+        if workers is None:
+            # SQLite has a single writer; parallel processes would only wait on its lock
+            workers = multiprocessing.cpu_count() if connection.vendor == 'postgresql' else 1
+
+        started = time.monotonic()
+        # Users first: every other table except subscribers points at them
+        self.run_stage(config, counts, ['users', 'subscribers'], workers, options['batch_size'])
+        self.run_stage(config, counts, ['notes', 'payments', 'reset_codes', 'remember_tokens'],
+                       workers, options['batch_size'])
+        seed.reset_sequences()
+
+        if counts['payments']:
+            rollups = rebuild_daily_rollups(Payment, DailyPaymentRollup)
+            self.stdout.write(f'Rebuilt {rollups} daily payment rollups')
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {sum(counts.values()):,} rows in {time.monotonic() - started:.1f}s"))
+
+    def run_stage(self, config, counts, tables, workers, batch_size):
+        jobs = [
+            (config, *chunk, batch_size)
+            for table in tables if counts[table]
+            for chunk in seed.chunks(table, counts[table], config['start'][table])
+        ]
+        if not jobs:
+            return
+        done = {}
+        started = time.monotonic()
+
+        def progress(table, count):
+            done[table] = done.get(table, 0) + count
+            if self.verbosity >= 1:
+                rate = sum(done.values()) / max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f'  {table}: {done[table]:,}/{counts[table]:,} ({rate:,.0f} rows/s)')
+
+        if workers <= 1:
+            for job in jobs:
+                progress(*seed.write_chunk(*job))
+            return
+
+        # Forked children must not share the parent's open connection
+        connections.close_all()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            for future in as_completed([pool.submit(_worker, job) for job in jobs]):
+                progress(*future.result())
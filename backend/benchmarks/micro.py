@@ -0,0 +1,440 @@
+"""
+Serializer and view micro-benchmarks.
+
+Each benchmark prepares ``size`` synthetic objects (or payloads, or rows) in
+setup() and processes all of them in run(). measure() times run() - best of
+several repeats, so scheduler noise only ever makes a result slower - and
+then repeats it once under tracemalloc to find the peak memory it allocates.
+
+Benchmarks that touch the database (deserializers with unique checks, token
+validation, view dispatch) cap their size with ``max_size``; they need a
+database, which `manage.py microbench` provides as a throwaway test database.
+
+The render_* / parse_* benchmarks come in pairs: the API's renderer and parser
+(backend/fastjson.py) and a ``_stdlib`` twin running DRF's stock classes.
+"""
+import gc
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.base import BaseHandler
+from django.db.utils import load_backend
+from django.test import RequestFactory, override_settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Note
+from api.serializers import NoteSerializer, UserSerializer
+from api.views import CustomTokenObtainPairSerializer, NoteListCreate, current_user
+from backend.db import pool
+from backend.fastjson import FastJSONParser, FastJSONRenderer
+from payments.models import Payment
+from payments.serializers import PaymentSerializer
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+PASSWORD = 'Bench-pw-123'
+
+# Token validation is measured with a fast hasher: the configured Argon2 hasher
+# costs ~50ms per login by design and would hide everything the serializer does
+FAST_HASHER = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+
+def _users(size):
+    return [User(id=i, username=f'user{i}', email=f'user{i}@example.com') for i in range(1, size + 1)]
+
+
+def _db_users(size):
+    User.objects.all().delete()
+    User.objects.bulk_create([
+        User(username=f'user{i}', email=f'user{i}@example.com', password='!') for i in range(size)
+    ])
+    return list(User.objects.order_by('id'))
+
+
+class Benchmark:
+    name = None
+    max_size = None
+    uses_db = False
+
+    def setup(self, size):
+        raise NotImplementedError
+
+    def run(self, state):
+        raise NotImplementedError
+
+    def teardown(self, state):
+        pass
+
+
+class NoteSerialize(Benchmark):
+    name = 'note_serialize'
+
+    def setup(self, size):
+        return [Note(id=i, title=f'Note {i}', content='x' * 200, create_at=NOW, author_id=1)
+                for i in range(1, size + 1)]
+
+    def run(self, notes):
+        return NoteSerializer(notes, many=True).data
+
+
+class NoteDeserialize(Benchmark):
+    name = 'note_deserialize'
+
+    def setup(self, size):
+        return [{'title': f'Note {i}', 'content': 'x' * 200} for i in range(size)]
+
+    def run(self, payloads):
+        for payload in payloads:
+            serializer = NoteSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
+
+
+class UserSerialize(Benchmark):
+    name = 'user_serialize'
+
+    def setup(self, size):
+        return _users(size)
+
+    def run(self, users):
+        return UserSerializer(users, many=True).data
+
+
+class UserDeserialize(Benchmark):
+    """Registration payloads; the username and email uniqueness checks query the database"""
+    name = 'user_deserialize'
+    max_size = 10_000
+    uses_db = True
+
+    def setup(self, size):
+        return [{'username': f'new{i}', 'email': f'new{i}@example.com',
+                 'password': PASSWORD, 'confirm_password': PASSWORD} for i in range(size)]
+
+    def run(self, payloads):
+        for payload in payloads:
+            serializer = UserSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
+
+
+class PaymentSerialize(Benchmark):
+    name = 'payment_serialize'
+
+    def setup(self, size):
+        return [Payment(id=i, user_id=1, amount=Decimal('149.99'), payment_intent_id=f'pi_{i}',
+                        status='completed', created_at=NOW, plan_type='single')
+                for i in range(1, size + 1)]
+
+    def run(self, payments):
+        return PaymentSerializer(payments, many=True).data
+
+
+class PaymentDeserialize(Benchmark):
+    name = 'payment_deserialize'
+
+    def setup(self, size):
+        return [{'amount': '149.99', 'plan_type': 'single'} for _ in range(size)]
+
+    def run(self, payloads):
+        for payload in payloads:
+            serializer = PaymentSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
+
+
+class TokenValidate(Benchmark):
+    """CustomTokenObtainPairSerializer.validate: user lookup, authenticate(), token pair"""
+    name = 'token_validate'
+    max_size = 1_000
+    uses_db = True
+
+    def setup(self, size):
+        FAST_HASHER.enable()
+        users = _db_users(size)
+        hashed = User(password='')
+        hashed.set_password(PASSWORD)
+        User.objects.update(password=hashed.password)
+        return [{'login': user.email, 'password': PASSWORD} for user in users]
+
+    def run(self, payloads):
+        for payload in payloads:
+            serializer = CustomTokenObtainPairSerializer(data=payload)
+            serializer.is_valid(raise_exception=True)
+
+    def teardown(self, state):
+        FAST_HASHER.disable()
+
+
+class NoteListView(Benchmark):
+    """One GET /api/notes/ through DRF dispatch for a user with ``size`` notes"""
+    name = 'view_note_list'
+    max_size = 10_000
+    uses_db = True
+
+    def setup(self, size):
+        user = _db_users(1)[0]
+        Note.objects.bulk_create([Note(title=f'Note {i}', content='x' * 200, author=user) for i in range(size)])
+        request = APIRequestFactory().get('/api/notes/')
+        force_authenticate(request, user=user)
+        return NoteListCreate.as_view(), request
+
+    def run(self, state):
+        view, request = state
+        response = view(request)
+        response.render()
+
+
+class CurrentUserView(Benchmark):
+    """``size`` GET /api/user/current/ requests through DRF dispatch"""
+    name = 'view_current_user'
+    max_size = 10_000
+    uses_db = True
+
+    def setup(self, size):
+        user = _db_users(1)[0]
+        factory = APIRequestFactory()
+        requests = []
+        for _ in range(size):
+            request = factory.get('/api/user/current/')
+            force_authenticate(request, user=user)
+            requests.append(request)
+        return requests
+
+    def run(self, requests):
+        for request in requests:
+            current_user(request).render()
+
+
+class NoteListRender(Benchmark):
+    """Serialized notes list (as GET /api/notes/ returns it) to JSON bytes"""
+    name = 'render_note_list'
+    renderer = FastJSONRenderer
+
+    def setup(self, size):
+        return NoteSerializer(NoteSerialize().setup(size), many=True).data
+
+    def run(self, data):
+        return self.renderer().render(data)
+
+
+class NoteListRenderStdlib(NoteListRender):
+    name = 'render_note_list_stdlib'
+    renderer = JSONRenderer
+
+
+class PaymentListRender(NoteListRender):
+    """Serialized payment history (as GET /api/payments/history/ returns it) to JSON bytes"""
+    name = 'render_payment_list'
+
+    def setup(self, size):
+        return PaymentSerializer(PaymentSerialize().setup(size), many=True).data
+
+
+class PaymentListRenderStdlib(PaymentListRender):
+    name = 'render_payment_list_stdlib'
+    renderer = JSONRenderer
+
+
+class PaymentValuesRender(NoteListRender):
+    """Raw Decimal / datetime / UUID values, as a .values() queryset or a view building dicts would pass them"""
+    name = 'render_payment_values'
+
+    def setup(self, size):
+        return [{'id': i, 'amount': Decimal('149.99'), 'created_at': NOW, 'idempotency_key': uuid.UUID(int=i)}
+                for i in range(size)]
+
+
+class PaymentValuesRenderStdlib(PaymentValuesRender):
+    name = 'render_payment_values_stdlib'
+    renderer = JSONRenderer
+
+
+class NoteListParse(Benchmark):
+    """A JSON array of ``size`` note payloads through the request parser"""
+    name = 'parse_note_list'
+    parser = FastJSONParser
+
+    def setup(self, size):
+        return JSONRenderer().render(NoteDeserialize().setup(size))
+
+    def run(self, body):
+        return self.parser().parse(io.BytesIO(body))
+
+
+class NoteListParseStdlib(NoteListParse):
+    name = 'parse_note_list_stdlib'
+    parser = JSONParser
+
+
+class ApiMiddleware(Benchmark):
+    """
+    ``size`` anonymous GET /api/notes/ straight through the request handler:
+    middleware, URL resolving and DRF dispatch up to the 401, no database.
+    Runs the configured middleware, where /api/ requests get the lean profile
+    """
+    name = 'middleware_api'
+
+    def middleware(self):
+        return settings.MIDDLEWARE
+
+    def request(self, factory):
+        return factory.get('/api/notes/')
+
+    def setup(self, size):
+        self.overrides = override_settings(MIDDLEWARE=self.middleware(), ALLOWED_HOSTS=['testserver'],
+                                           SECURE_SSL_REDIRECT=False)
+        self.overrides.enable()
+        handler = BaseHandler()
+        handler.load_middleware()
+        factory = RequestFactory()
+        return handler, [self.request(factory) for _ in range(size)]
+
+    def run(self, state):
+        handler, requests = state
+        for request in requests:
+            handler.get_response(request)
+
+    def teardown(self, state):
+        self.overrides.disable()
+
+
+class ApiMiddlewareFullStack(ApiMiddleware):
+    """The same with the session/CSRF/auth/messages stack every request went through before"""
+    name = 'middleware_api_full_stack'
+
+    def middleware(self):
+        router = 'backend.middleware_profiles.MiddlewareProfileRouter'
+        return [path for path in settings.MIDDLEWARE if path != router] + settings.MIDDLEWARE_DEFAULT_PROFILE
+
+
+class CorsPreflight(ApiMiddleware):
+    """``size`` CORS preflights for POST /api/notes/ from the frontend's origin, answered by the fast path"""
+    name = 'cors_preflight'
+
+    def request(self, factory):
+        return factory.options('/api/notes/', HTTP_ORIGIN=settings.CORS_ALLOWED_ORIGINS[0],
+                               HTTP_ACCESS_CONTROL_REQUEST_METHOD='POST',
+                               HTTP_ACCESS_CONTROL_REQUEST_HEADERS='authorization, content-type')
+
+
+class CorsPreflightCorsheaders(CorsPreflight):
+    """The same preflights answered by CorsMiddleware, after the timing middleware, as before"""
+    name = 'cors_preflight_corsheaders'
+
+    def middleware(self):
+        return [path for path in settings.MIDDLEWARE if path != 'backend.cors.PreflightMiddleware']
+
+
+class DbConnections(Benchmark):
+    """
+    ``size`` requests' worth of database use spread over THREADS threads, each
+    with its own DatabaseWrapper as Django gives every thread: connect, one
+    query, and the request_finished cleanup. On a throwaway SQLite file, so
+    connecting costs far less than a Postgres handshake would. This one is the
+    current setup: a persistent connection per thread, health-checked per request
+    """
+    name = 'db_connections_persistent'
+    engine = 'django.db.backends.sqlite3'
+    options = {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}
+    threads = 64
+
+    def setup(self, size):
+        self.directory = tempfile.mkdtemp()
+        settings_dict = {
+            'ENGINE': self.engine, 'NAME': os.path.join(self.directory, 'db.sqlite3'), 'OPTIONS': {},
+            'TIME_ZONE': None, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False, 'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': False, 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'TEST': {},
+            **self.options,
+        }
+        backend = load_backend(self.engine)
+        wrappers = [backend.DatabaseWrapper(dict(settings_dict), 'bench') for _ in range(self.threads)]
+        for wrapper in wrappers:
+            wrapper.inc_thread_sharing()  # built here, used by the benchmark's threads
+        return wrappers, size // self.threads
+
+    def run(self, state):
+        wrappers, per_thread = state
+
+        def requests(wrapper):
+            for _ in range(per_thread):
+                wrapper.ensure_connection()
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                wrapper.close_if_unusable_or_obsolete()
+
+        threads = [threading.Thread(target=requests, args=(wrapper,)) for wrapper in wrappers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def teardown(self, state):
+        for wrapper in state[0]:
+            wrapper.close()
+        pool.close_pools('bench')
+        shutil.rmtree(self.directory)
+
+
+class DbConnectionsPerRequest(DbConnections):
+    """The same with CONN_MAX_AGE = 0: a new connection for every request"""
+    name = 'db_connections_per_request'
+    options = {'CONN_MAX_AGE': 0}
+
+
+class DbConnectionsPooled(DbConnections):
+    """The same through the bounded pool (DB_POOL), at most 8 connections for the 64 threads"""
+    name = 'db_connections_pooled'
+    engine = 'backend.db.sqlite3'
+    options = {'POOL': {'MIN_SIZE': 2, 'MAX_SIZE': 8, 'TIMEOUT': 30}}
+
+
+BENCHMARKS = {cls.name: cls for cls in (
+    NoteSerialize, NoteDeserialize, UserSerialize, UserDeserialize, PaymentSerialize,
+    PaymentDeserialize, TokenValidate, NoteListView, CurrentUserView,
+    NoteListRender, NoteListRenderStdlib, PaymentListRender, PaymentListRenderStdlib,
+    PaymentValuesRender, PaymentValuesRenderStdlib, NoteListParse, NoteListParseStdlib,
+    ApiMiddleware, ApiMiddlewareFullStack, CorsPreflight, CorsPreflightCorsheaders,
+    DbConnections, DbConnectionsPerRequest, DbConnectionsPooled,
+)}
+
+
+def measure(benchmark, size, repeat=3):
+    """
+    Run ``benchmark`` over ``size`` objects. Returns
+    {'seconds', 'us_per_op', 'ops_per_sec', 'peak_kib', 'bytes_per_op'}.
+    """
+    state = benchmark.setup(size)
+    try:
+        timings = []
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            benchmark.run(state)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            benchmark.run(state)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        benchmark.teardown(state)
+
+    return {
+        'seconds': best,
+        'us_per_op': best / size * 1e6,
+        'ops_per_sec': size / best if best else 0.0,
+        'peak_kib': peak / 1024,
+        'bytes_per_op': peak / size,
+    }
@@ -0,0 +1,117 @@
+"""
+Benchmark results: summaries, JSON files and baseline comparison.
+
+Every benchmark writes the same shape so results can be diffed between
+commits:
+
+    {"benchmark": "loadtest", "meta": {...}, "results": {name: {metric: value}}}
+
+compare() checks each metric against a baseline file. Metrics listed in
+HIGHER_IS_BETTER regress when they drop; every other metric (latencies,
+bytes, error rates) regresses when it grows.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+HIGHER_IS_BETTER = {'rps', 'ops_per_sec', 'rows_per_sec', 'saved_pct', 'mb_per_sec'}
+
+# Metrics that only describe the run and are never compared
+INFORMATIONAL = {'requests', 'errors', 'iterations', 'rows', 'duration', 'original_bytes'}
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize_latencies(latencies, errors, duration):
+    """Throughput and latency percentiles (in ms) for one request type"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'requests': count + errors,
+        'errors': errors,
+        'error_rate': errors / (count + errors) if count + errors else 0.0,
+        'rps': count / duration if duration else 0.0,
+        'mean_ms': sum(values) / count * 1000 if count else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': values[-1] * 1000 if values else 0.0,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def document(benchmark, results, **meta):
+    return {
+        'benchmark': benchmark,
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git': _git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            **meta,
+        },
+        'results': results,
+    }
+
+
+def save(doc, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as handle:
+        json.dump(doc, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def load(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    Compare two documents. Returns a list of rows
+    (name, metric, baseline value, current value, relative change, regressed).
+    A metric regresses when it is worse than the baseline by more than ``tolerance``.
+    """
+    rows = []
+    for name, metrics in sorted(current['results'].items()):
+        base_metrics = baseline['results'].get(name)
+        if base_metrics is None:
+            continue
+        for metric, value in sorted(metrics.items()):
+            base = base_metrics.get(metric)
+            if metric in INFORMATIONAL or not isinstance(base, (int, float)) or not isinstance(value, (int, float)):
+                continue
+            change = (value - base) / base if base else (0.0 if value == base else float('inf'))
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if metric == 'error_rate':
+                regressed = value > base
+            else:
+                regressed = worse > tolerance
+            rows.append((name, metric, base, value, change, regressed))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'name':<28} {'metric':<14} {'baseline':>12} {'current':>12} {'change':>8}"]
+    for name, metric, base, value, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        lines.append(f'{name:<28} {metric:<14} {base:>12.2f} {value:>12.2f} {change:>+8.1%}{flag}')
+    return '\n'.join(lines)
@@ -0,0 +1,139 @@
+"""
+Load test scenarios.
+
+Each scenario models one user flow. setup() runs once per virtual user and is
+not measured (accounts, tokens); iteration() is repeated until the run ends and
+every request it makes is recorded under its label. The shared ``context``
+holds the run id (to keep usernames unique across runs against one database)
+and the SMTP stub that receives password reset emails.
+"""
+import re
+
+PASSWORD = 'Load-test-pw-123'
+
+_CODE = re.compile(r'\b(\d{6})\b')
+
+
+def _username(context, index, suffix=''):
+    return f"lt{context['run_id']}u{index}{suffix}"
+
+
+async def register(client, context, username):
+    await client.request('setup', 'POST', '/api/user/register/', {
+        'username': username, 'email': f'{username}@example.com',
+        'password': PASSWORD, 'confirm_password': PASSWORD,
+    })
+    return username
+
+
+async def login(client, username, remember_me=False, label='setup'):
+    payload = {'login': f'{username}@example.com', 'password': PASSWORD}
+    if remember_me:
+        payload['remember_me'] = True
+    tokens = (await client.request(label, 'POST', '/api/token/', payload)).json()
+    return tokens
+
+
+async def authenticated(client, context, index):
+    username = await register(client, context, _username(context, index))
+    tokens = await login(client, username)
+    client.token = tokens['access']
+    return {'username': username, 'refresh': tokens['refresh']}
+
+
+class Register:
+    async def setup(self, client, context, index):
+        return {'context': context, 'index': index, 'count': 0}
+
+    async def iteration(self, client, state):
+        state['count'] += 1
+        username = _username(state['context'], state['index'], f"n{state['count']}")
+        await client.request('register', 'POST', '/api/user/register/', {
+            'username': username, 'email': f'{username}@example.com',
+            'password': PASSWORD, 'confirm_password': PASSWORD,
+        })
+
+
+class Login:
+    remember_me = False
+    label = 'login'
+
+    async def setup(self, client, context, index):
+        return {'username': await register(client, context, _username(context, index))}
+
+    async def iteration(self, client, state):
+        await login(client, state['username'], self.remember_me, self.label)
+
+
+class LoginRememberMe(Login):
+    remember_me = True
+    label = 'login_remember_me'
+
+
+class TokenRefresh:
+    setup = staticmethod(authenticated)
+
+    async def iteration(self, client, state):
+        tokens = (await client.request('token_refresh', 'POST', '/api/token/refresh/',
+                                       {'refresh': state['refresh']})).json()
+        # Refresh tokens rotate and the old one is blacklisted
+        state['refresh'] = tokens.get('refresh', state['refresh'])
+
+
+class Notes:
+    setup = staticmethod(authenticated)
+
+    async def iteration(self, client, state):
+        created = (await client.request('note_create', 'POST', '/api/notes/',
+                                        {'title': 'Load test', 'content': 'x' * 500})).json()
+        await client.request('note_list', 'GET', '/api/notes/')
+        await client.request('note_delete', 'DELETE', f"/api/notes/delete/{created['data']['id']}/")
+
+
+class PasswordReset:
+    """
+    Request a code, read it from the SMTP stub and verify it. The reset view
+    throttles a user after two requests in 30 minutes, so every virtual user
+    owns a pool of accounts and retires each after two resets.
+    """
+    ATTEMPTS_PER_ACCOUNT = 2
+
+    async def setup(self, client, context, index):
+        accounts = []
+        for n in range(context.get('reset_accounts', 10)):
+            accounts.append(await register(client, context, _username(context, index, f'r{n}')))
+        return {'accounts': accounts, 'attempts': 0, 'smtp': context['smtp']}
+
+    async def iteration(self, client, state):
+        if not state['accounts']:
+            return False
+        email = f"{state['accounts'][0]}@example.com"
+        await client.request('password_reset_request', 'POST', '/api/password/request-reset/', {'email': email})
+        message = await state['smtp'].wait_for(email)
+        text = message.get_body(('plain',)).get_content()
+        code = _CODE.search(text).group(1)
+        await client.request('password_reset_verify', 'POST', '/api/password/verify-reset/', {
+            'email': email, 'code': code, 'new_password': PASSWORD,
+        })
+        state['attempts'] += 1
+        if state['attempts'] % self.ATTEMPTS_PER_ACCOUNT == 0:
+            state['accounts'].pop(0)
+
+
+class PaymentIntent:
+    setup = staticmethod(authenticated)
+
+    async def iteration(self, client, state):
+        await client.request('payment_intent_create', 'POST', '/api/payments/create-payment-intent/',
+                             {'amount': '49.99', 'planType': 'single'})
+
+
+SCENARIOS = {
+    'register': Register,
+    'login': Login,
+    'login_remember_me': LoginRememberMe,
+    'token_refresh': TokenRefresh,
+    'notes': Notes,
+    'password_reset': PasswordReset,
+    'payment_intent': PaymentIntent,
+}
@@ -0,0 +1,210 @@
+"""
+Deterministic synthetic data for scale testing.
+
+Rows are generated in fixed-size chunks, each from its own Random seeded with
+(seed, table, chunk), so the same options always produce the same data no
+matter how many workers run. Primary keys are assigned here (continuing after
+the current maximum), which lets workers write dependent tables in parallel
+without reading anything back.
+
+Writes go through COPY on PostgreSQL and batched executemany() elsewhere.
+Model-level bulk_create() is not used because auto_now_add fields would
+overwrite the spread-out timestamps the data needs to be realistic.
+"""
+import csv
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models import Max
+
+from api.models import Note, RememberMeToken
+from password_management.models import PasswordResetCode
+from payments.models import Payment
+from SendEmail.models import NewsletterSubscriber
+
+# Rows per deterministic unit of work
+CHUNK_SIZE = 100_000
+
+WORDS = (
+    'account api backend cache database deploy email feature fix frontend idea invoice '
+    'latency list meeting migration note payment plan query release request review '
+    'schedule server stripe task team ticket todo update user webhook weekly'
+).split()
+
+PLANS = (('single', Decimal('49.99'), 0.7), ('partnership', Decimal('149.99'), 0.2),
+         ('group', Decimal('299.99'), 0.1))
+STATUSES = (('completed', 0.85), ('pending', 0.08), ('failed', 0.05), ('refunded', 0.02))
+
+
+def _choices(rng, weighted, k):
+    values = [value for value, *_, weight in weighted]
+    weights = [weight for *_, weight in weighted]
+    return rng.choices(values, weights, k=k)
+
+
+def _content_pool(rng, size=500):
+    # Note bodies are picked from a pool: generating 10M distinct texts would dominate the run
+    pool = []
+    for _ in range(size):
+        words = max(3, int(rng.lognormvariate(3.5, 1.0)))
+        pool.append(' '.join(rng.choices(WORDS, k=min(words, 2000))))
+    return pool
+
+
+class Seeder:
+    """
+    ``config`` (picklable, so it can be shipped to worker processes) holds:
+    seed, anchor (datetime), password (hash), users / power_users / power_share,
+    and the first id of every table (``start``).
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def author(self, rng):
+        """Pick a user id: power users get ``power_share`` of rows, the rest lean towards low ids"""
+        config = self.config
+        first = config['start']['users']
+        if config['power_users'] and rng.random() < config['power_share']:
+            return first + rng.randrange(config['power_users'])
+        return first + int(config['users'] * rng.random() ** 2)
+
+    def moment(self, rng, days=365):
+        return self.config['anchor'] - timedelta(seconds=rng.randrange(days * 86400))
+
+    # Row generators: (rng, first id, count) -> list of rows in TABLES column order
+
+    def users(self, rng, first, count):
+        password = self.config['password']
+        return [(pk, password, None, False, f'seed{pk}', '', '', f'seed{pk}@example.com',
+                 False, True, self.moment(rng, 3 * 365)) for pk in range(first, first + count)]
+
+    def notes(self, rng, first, count):
+        pool = _content_pool(rng)
+        return [(pk, ' '.join(rng.choices(WORDS, k=rng.randint(1, 6)))[:100], rng.choice(pool),
+                 self.moment(rng), self.author(rng)) for pk in range(first, first + count)]
+
+    def payments(self, rng, first, count):
+        plans = _choices(rng, PLANS, count)
+        statuses = _choices(rng, STATUSES, count)
+        amounts = dict((plan, amount) for plan, amount, _ in PLANS)
+        return [(pk, self.author(rng), amounts[plans[i]], f'pi_seed{pk}', statuses[i],
+                 self.moment(rng), plans[i], None, '') for i, pk in enumerate(range(first, first + count))]
+
+    def reset_codes(self, rng, first, count):
+        rows = []
+        for pk in range(first, first + count):
+            created = self.moment(rng, 90)
+            rows.append((pk, self.author(rng), f'{rng.randrange(1_000_000):06d}', created,
+                         created + timedelta(minutes=15), rng.random() < 0.6))
+        return rows
+
+    def remember_tokens(self, rng, first, count):
+        rows = []
+        for pk in range(first, first + count):
+            created = self.moment(rng, 60)
+            rows.append((pk, self.author(rng), f'seed-remember-{pk}-{rng.getrandbits(64):016x}',
+                         created, created + timedelta(days=60)))
+        return rows
+
+    def subscribers(self, rng, first, count):
+        return [(pk, f'reader{pk}@example.com', self.moment(rng, 2 * 365), rng.random() < 0.9)
+                for pk in range(first, first + count)]
+
+
+# table key -> (model, generator name, attnames in row order)
+TABLES = {
+    'users': (User, 'users', ['id', 'password', 'last_login', 'is_superuser', 'username', 'first_name',
+                              'last_name', 'email', 'is_staff', 'is_active', 'date_joined']),
+    'notes': (Note, 'notes', ['id', 'title', 'content', 'create_at', 'author_id']),
+    'payments': (Payment, 'payments', ['id', 'user_id', 'amount', 'payment_intent_id', 'status',
+                                       'created_at', 'plan_type', 'idempotency_key', 'client_secret']),
+    'reset_codes': (PasswordResetCode, 'reset_codes', ['id', 'user_id', 'code', 'created_at',
+                                                        'expires_at', 'used']),
+    'remember_tokens': (RememberMeToken, 'remember_tokens', ['id', 'user_id', 'token', 'created_at',
+                                                             'expires_at']),
+    'subscribers': (NewsletterSubscriber, 'subscribers', ['id', 'email', 'date_subscribed', 'is_active']),
+}
+
+
+def next_ids():
+    """First free primary key of every seeded table"""
+    return {key: (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+            for key, (model, _, _) in TABLES.items()}
+
+
+def chunks(table, count, start):
+    """(table, chunk index, first id, row count) units of work"""
+    return [(table, index, start + offset, min(CHUNK_SIZE, count - offset))
+            for index, offset in enumerate(range(0, count, CHUNK_SIZE))]
+
+
+def write_chunk(config, table, index, first, count, batch_size):
+    """Generate and insert one chunk; runs in the parent or in a worker process"""
+    model, generator, attnames = TABLES[table]
+    rng = random.Random(f"{config['seed']}:{table}:{index}")
+    rows = getattr(Seeder(config), generator)(rng, first, count)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            _copy(model, attnames, rows)
+        else:
+            _executemany(model, attnames, rows, batch_size)
+    return table, count
+
+
+def _columns(model, attnames):
+    # get_field() accepts attnames such as author_id too
+    fields = [model._meta.get_field(name) for name in attnames]
+    return fields, [field.column for field in fields]
+
+
+def _executemany(model, attnames, rows, batch_size):
+    fields, columns = _columns(model, attnames)
+    # Only dates and decimals need the backend's conversion; the rest pass through as-is
+    converters = [
+        (i, field) for i, field in enumerate(fields)
+        if isinstance(field, (models.DateTimeField, models.DecimalField))
+    ]
+    quote = connection.ops.quote_name
+    sql = (f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) '
+           f'VALUES ({", ".join(["%s"] * len(columns))})')
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            batch = rows[offset:offset + batch_size]
+            if converters:
+                batch = [list(row) for row in batch]
+                for row in batch:
+                    for i, field in converters:
+                        row[i] = field.get_db_prep_save(row[i], connection)
+            cursor.executemany(sql, batch)
+
+
+def _copy(model, attnames, rows):
+    _, columns = _columns(model, attnames)
+    buffer = io.StringIO()
+    # An explicit NULL marker keeps empty strings and NULLs apart
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([r'\N' if value is None else value for value in row])
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f'COPY {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) '
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+
+
+def reset_sequences():
+    """After explicit ids, move PostgreSQL sequences past them (no-op elsewhere)"""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model for model, _, _ in TABLES.values()])
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,28 @@
+"""
+Settings for the server that `manage.py loadtest` starts.
+
+Production settings with everything external swapped for local stand-ins:
+a throwaway database, the Stripe stub (STRIPE_API_BASE), a local SMTP sink and
+a process-local cache. DEBUG stays off so per-query logging and debug
+tooling don't distort the numbers.
+"""
+import os
+
+from backend.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+SECURE_SSL_REDIRECT = False
+SECURE_HSTS_SECONDS = 0
+SESSION_COOKIE_SECURE = False
+CSRF_COOKIE_SECURE = False
+
+EMAIL_HOST = os.getenv('EMAIL_HOST', '127.0.0.1')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '1025'))
+EMAIL_USE_TLS = False
+EMAIL_HOST_USER = ''
+EMAIL_HOST_PASSWORD = ''
+
+# Redis is optional for a load test; set REDIS_URL to measure with it
+if not os.getenv('REDIS_URL'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
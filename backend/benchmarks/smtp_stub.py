@@ -0,0 +1,96 @@
+"""
+Minimal asyncio SMTP sink for load tests.
+
+Accepts every message and keeps the latest one per recipient, so scenarios
+can read the password reset code the backend just sent. No TLS, no auth.
+"""
+import asyncio
+import email
+from email import policy
+
+
+class SMTPStub:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.messages = {}   # recipient -> email.message.EmailMessage
+        self.received = 0
+        self._server = None
+        self._waiters = {}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def wait_for(self, recipient, timeout=10):
+        """Wait for (and consume) the next message to ``recipient``"""
+        message = self.messages.pop(recipient, None)
+        if message is not None:
+            return message
+        future = self._waiters[recipient] = asyncio.get_running_loop().create_future()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._waiters.pop(recipient, None)
+            self.messages.pop(recipient, None)
+
+    def _deliver(self, recipients, data):
+        message = email.message_from_bytes(data, policy=policy.default)
+        self.received += 1
+        for recipient in recipients:
+            waiter = self._waiters.get(recipient)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(message)
+            else:
+                self.messages[recipient] = message
+
+    async def _handle(self, reader, writer):
+        def reply(line):
+            writer.write(line.encode() + b'\r\n')
+
+        reply('220 smtp-stub ready')
+        recipients = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', 'replace').strip()
+                verb = command[:4].upper()
+                if verb in ('EHLO', 'HELO'):
+                    reply('250 smtp-stub')
+                elif verb == 'MAIL':
+                    recipients = []
+                    reply('250 OK')
+                elif verb == 'RCPT':
+                    recipients.append(command.split(':', 1)[1].strip().strip('<>').lower())
+                    reply('250 OK')
+                elif verb == 'DATA':
+                    reply('354 End data with <CR><LF>.<CR><LF>')
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk in (b'.\r\n', b'.\n', b''):
+                            break
+                        # Undo dot-stuffing
+                        lines.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                    self._deliver(recipients, b''.join(lines))
+                    reply('250 OK queued')
+                elif verb == 'QUIT':
+                    reply('221 Bye')
+                    await writer.drain()
+                    break
+                else:
+                    # RSET, NOOP and anything else
+                    reply('250 OK')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import json
+import os
+import random
+import smtplib
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management import CommandError, call_command
+
+from django.test import SimpleTestCase, TestCase
+
+from api.models import Note
+from payments.models import DailyPaymentRollup, Payment
+from payments.stripe_stub import StripeStubServer
+
+from . import results, seed
+from .loadgen import Client, HTTPError, Recorder
+from .management.commands.importtime import parse_importtime, rank_packages
+from .micro import BENCHMARKS, measure
+from .smtp_stub import SMTPStub
+
+
+def _doc(**metrics):
+    return {'benchmark': 'test', 'meta': {}, 'results': {'login': metrics}}
+
+
+class ResultsTests(SimpleTestCase):
+    def test_percentile_interpolates(self):
+        values = [0.01 * n for n in range(1, 101)]
+        self.assertAlmostEqual(results.percentile(values, 50), 0.505)
+        self.assertAlmostEqual(results.percentile(values, 99), 0.9901)
+        self.assertEqual(results.percentile([], 95), 0.0)
+
+    def test_summary(self):
+        summary = results.summarize_latencies([0.1, 0.2, 0.3], errors=1, duration=2)
+        self.assertEqual(summary['requests'], 4)
+        self.assertEqual(summary['rps'], 1.5)
+        self.assertAlmostEqual(summary['p50_ms'], 200)
+        self.assertAlmostEqual(summary['error_rate'], 0.25)
+
+    def test_compare_flags_regressions_in_the_right_direction(self):
+        baseline = _doc(rps=100.0, p95_ms=50.0, error_rate=0.0, requests=1000)
+        rows = results.compare(_doc(rps=70.0, p95_ms=55.0, error_rate=0.0, requests=700), baseline)
+        regressed = {metric for _, metric, *_, flag in rows if flag}
+        self.assertEqual(regressed, {'rps'})
+
+        rows = results.compare(_doc(rps=130.0, p95_ms=80.0, error_rate=0.01, requests=1300), baseline)
+        regressed = {metric for _, metric, *_, flag in rows if flag}
+        self.assertEqual(regressed, {'p95_ms', 'error_rate'})
+
+
+class LoadgenTests(SimpleTestCase):
+    def test_client_records_latency_and_reconnects(self):
+        # BaseHTTPRequestHandler closes after every response, like gunicorn's sync worker
+        stub = StripeStubServer(('127.0.0.1', 0))
+        stub.start()
+        self.addCleanup(stub.stop)
+
+        async def run():
+            recorder = Recorder()
+            client = Client(stub.base_url, recorder)
+            client.token = 'sk_test'
+            for _ in range(3):
+                response = await client.request('list', 'GET', '/v1/payment_intents')
+                self.assertEqual(response.json()['object'], 'list')
+            with self.assertRaises(HTTPError):
+                await client.request('missing', 'GET', '/v1/payment_intents/pi_missing')
+            await client.close()
+            return recorder
+
+        recorder = asyncio.run(run())
+        self.assertEqual(len(recorder.latencies['list']), 3)
+        self.assertEqual(recorder.errors, {'missing': 1})
+
+    def test_smtp_stub_captures_messages(self):
+        async def run():
+            stub = await SMTPStub().start()
+            loop = asyncio.get_running_loop()
+
+            def send():
+                with smtplib.SMTP('127.0.0.1', stub.port) as smtp:
+                    smtp.sendmail('from@example.com', ['Reader@example.com'],
+                                  'Subject: Code\r\n\r\nYour password reset code is: 123456\r\n')
+
+            waiter = asyncio.create_task(stub.wait_for('reader@example.com'))
+            await loop.run_in_executor(None, send)
+            message = await waiter
+            await stub.stop()
+            return message
+
+        message = asyncio.run(run())
+        self.assertEqual(message['Subject'], 'Code')
+        self.assertIn('123456', message.get_content())
+
+
+class MicrobenchTests(TestCase):
+    def test_every_benchmark_runs(self):
+        for name, cls in BENCHMARKS.items():
+            with self.subTest(name):
+                row = measure(cls(), 3, repeat=1)
+                self.assertGreater(row['ops_per_sec'], 0)
+                self.assertGreater(row['peak_kib'], 0)
+
+
+class MicrobenchCommandTests(SimpleTestCase):
+    # SimpleTestCase refuses every database connection, like an unreachable DATABASE_URL
+    def test_cpu_only_benchmark_needs_no_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'microbench.json')
+            call_command('microbench', '--bench', 'note_serialize', '--sizes', '3', '--repeat', '1',
+                         '--output', output, stdout=io.StringIO())
+            self.assertIn('note_serialize[3]', results.load(output)['results'])
+
+
+class ImportTimeTests(SimpleTestCase):
+    OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     stripe._error
+import time:      3000 |       3120 |   stripe
+import time:       500 |       3620 | payments.views
+{"boot_ms": 1.0, "urlconf_ms": 2.0}
+"""
+
+    def test_ranks_packages_by_self_time(self):
+        imports = parse_importtime(self.OUTPUT)
+        self.assertEqual(imports[1], ('stripe', 3000, 3120))
+        self.assertEqual(rank_packages(imports), {'stripe': (3.12, 2), 'payments': (0.5, 1)})
+
+    def test_budget_fails_the_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'importtime.json')
+            with self.assertRaisesMessage(CommandError, 'over the 1 ms budget'):
+                call_command('importtime', runs=1, budget=1, output=output, stdout=io.StringIO())
+            with open(output) as f:
+                doc = json.load(f)
+        self.assertGreater(doc['results']['cold_start']['total_ms'], 1)
+        self.assertNotIn('package:stripe', doc['results'])  # imported on first use only
+
+
+class SeedTests(TestCase):
+    SMALL = dict(users=50, notes=400, payments=100, reset_codes=20, remember_tokens=10, subscribers=30,
+                 anchor='2025-01-01', verbosity=0)
+
+    def test_seed_inserts_skewed_rows(self):
+        call_command('seed', **self.SMALL)
+        self.assertEqual(Note.objects.count(), 400)
+        self.assertEqual(Payment.objects.count(), 100)
+        self.assertTrue(DailyPaymentRollup.objects.exists())
+
+        # Ten power users own roughly 30% of all notes
+        first_user = Note.objects.order_by('author_id').values_list('author_id', flat=True)[0]
+        self.assertGreater(Note.objects.filter(author_id__lt=first_user + 10).count(), 400 * 0.25)
+
+    def test_chunks_are_deterministic(self):
+        config = {'seed': 7, 'anchor': datetime(2025, 1, 1, tzinfo=dt_timezone.utc), 'password': '!',
+                  'users': 100, 'power_users': 10, 'power_share': 0.3, 'start': {'users': 1}}
+        generate = lambda: seed.Seeder(config).notes(random.Random('7:notes:0'), 1, 200)
+        self.assertEqual(generate(), generate())
@@ -0,0 +1,50 @@
+"""
+gunicorn settings; gunicorn reads this file from the directory it is started in.
+
+Command-line options (workers, threads, bind) still override anything here.
+"""
+import os
+
+# The master reads METRICS_DIR from the Django settings without loading the app
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+
+def on_starting(server):
+    # Worker snapshots left by an earlier run would be summed into /metrics
+    from django.conf import settings
+
+    from backend import metrics
+
+    if settings.METRICS_DIR:
+        metrics.clear(settings.METRICS_DIR)
+
+
+def post_worker_init(worker):
+    # post_fork runs before the worker has imported the application; this runs
+    # right after, before the worker accepts its first connection. Database
+    # connections are per thread: with --threads the warm-up only opens the
+    # connection of the worker's main thread.
+    from backend import warmup
+
+    warmup.run()
+
+
+def worker_exit(server, worker):
+    # Runs in a worker shutting down (max_requests, reload, stop): flush what
+    # it observed since its last periodic flush
+    from django.conf import settings
+
+    from backend import metrics
+
+    if settings.METRICS_DIR:
+        metrics.flush(settings.METRICS_DIR)
+
+
+def child_exit(server, worker):
+    # Runs in the master once a worker is gone, however it ended
+    from django.conf import settings
+
+    from backend import metrics
+
+    if settings.METRICS_DIR:
+        metrics.retire(settings.METRICS_DIR, worker.pid)
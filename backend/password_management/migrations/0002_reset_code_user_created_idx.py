@@ -0,0 +1,17 @@
+# Generated by Django 4.2.17 on 2026-10-19 01:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passwordresetcode',
+            index=models.Index(fields=['user', 'created_at'], name='reset_code_user_created_idx'),
+        ),
+    ]
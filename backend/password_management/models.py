@@ -13,6 +13,13 @@ class PasswordResetCode(models.Model):
     expires_at = models.DateTimeField()
     used = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Serves the newest-first "recent attempts" rate limit check without a sort;
+            # verification lookups by user use its leading column
+            models.Index(fields=['user', 'created_at'], name='reset_code_user_created_idx'),
+        ]
+
     @classmethod
     def generate_code(cls):
         """Generate a random 6-digit code"""
@@ -84,9 +84,9 @@ class PasswordResetRequestView(APIView):
                         html_message=email_html,
                         fail_silently=False,
                     )
-                    logger.info(f"Password reset code sent successfully to {email}")
+                    logger.info("Password reset code sent successfully to %s", email)
                 except Exception as e:
-                    logger.error(f"Failed to send password reset email: {str(e)}")
+                    logger.error("Failed to send password reset email: %s", e)
                     return Response(
                         {
                             'error': 'Failed to send email',
@@ -101,7 +101,7 @@ class PasswordResetRequestView(APIView):
             })
             
         except Exception as e:
-            logger.error(f"Unexpected password reset request error: {str(e)}")
+            logger.exception("Unexpected password reset request error: %s", e)
             return Response(
                 {
                     'error': 'Server error',
@@ -148,7 +148,7 @@ class PasswordResetVerifyView(APIView):
             ).first()
 
             if not reset_code:
-                logger.warning(f"Invalid or expired reset code attempt for email: {email}")
+                logger.warning("Invalid or expired reset code attempt for email: %s", email)
                 return Response(
                     {
                         'error': 'Invalid reset code',
@@ -165,13 +165,13 @@ class PasswordResetVerifyView(APIView):
             reset_code.used = True
             reset_code.save()
 
-            logger.info(f"Password successfully reset for user {user.username}")
+            logger.info("Password successfully reset for user %s", user.username)
             return Response({
                 'message': 'Password reset successful. You can now log in with your new password.'
             })
 
         except Exception as e:
-            logger.error(f"Password reset verification error: {str(e)}")
+            logger.exception("Password reset verification error: %s", e)
             return Response(
                 {
                     'error': 'Server error',
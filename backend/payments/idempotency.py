@@ -0,0 +1,54 @@
+"""
+Single-flight locking for Idempotency-Key requests.
+
+The first request for a key becomes the leader and does the work; concurrent
+duplicates wait for the leader to finish and then replay its stored result
+instead of repeating the side effects. The lock lives in the shared cache, so
+it also holds across gunicorn workers.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30        # seconds before an abandoned lock expires on its own
+POLL_INTERVAL = 0.05     # seconds between checks while waiting on the leader
+
+
+def lock_key(scope, key):
+    return f'idempotency:{scope}:{key}'
+
+
+@contextmanager
+def single_flight(name, timeout=LOCK_TIMEOUT):
+    """
+    Try to become the leader for ``name``.
+    Yields True when the lock was acquired, False when another request holds it.
+    """
+    token = uuid.uuid4().hex
+    acquired = cache.add(name, token, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(name) == token:
+            cache.delete(name)
+
+
+def wait_for_leader(name, lookup, timeout):
+    """
+    Wait until the leader holding ``name`` releases it.
+    Returns lookup()'s result as soon as it is not None, or None once the lock
+    is free (the leader failed and the caller may retry). Raises TimeoutError
+    if the leader is still running after ``timeout`` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        result = lookup()
+        if result is not None:
+            return result
+        if cache.get(name) is None:
+            return lookup()
+        if time.monotonic() >= deadline:
+            raise TimeoutError(name)
+        time.sleep(POLL_INTERVAL)
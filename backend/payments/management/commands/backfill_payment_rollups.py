@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.models import DailyPaymentRollup, Payment
+from payments.rollups import rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the DailyPaymentRollup table from payments. Rollups are kept "
+        "current incrementally; use this for the initial backfill or to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild days on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        written = rebuild_daily_rollups(Payment, DailyPaymentRollup, since=since)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import apply_pending_events
+
+
+class Command(BaseCommand):
+    help = "Apply queued Stripe webhook events (the StripeEvent inbox) to payments in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the inbox instead of exiting once it is empty')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep between polls when the inbox is empty (with --loop)')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                processed = apply_pending_events(options['batch_size'])
+                total += processed
+                if processed:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} Stripe events"))
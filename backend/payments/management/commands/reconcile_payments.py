@@ -0,0 +1,61 @@
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payments.reconciliation import Checkpoint, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve payments stuck in 'pending' by asking Stripe for their PaymentIntent "
+        "status. Walks pending rows in id order one batch at a time and checkpoints "
+        "after each batch, so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=30,
+                            help='Only payments created more than this many minutes ago (default: 30)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Parallel Stripe requests (default: 8)')
+        parser.add_argument('--max-rps', type=float, default=20,
+                            help='Stripe requests per second across all threads (default: 20)')
+        parser.add_argument('--limit', type=int, help='Stop after this many payments')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.LOGS_DIR, 'reconcile_payments.json'),
+                            help='Where progress is recorded for resuming')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+
+    def handle(self, *args, **options):
+        for option in ('batch_size', 'concurrency'):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive")
+
+        checkpoint = Checkpoint(options['checkpoint'])
+        state = None if options['restart'] else checkpoint.load()
+        if state:
+            # Resume with the original cutoff so the keyset order stays valid
+            cutoff = datetime.fromisoformat(state['cutoff'])
+            self.stdout.write(f"Resuming after payment {state['last_id']} ({state['processed']} done)")
+        else:
+            checkpoint.clear()
+            cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+
+        def progress(state, stats):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"  up to payment {state['last_id']}: {stats}")
+
+        totals = reconcile(
+            cutoff, checkpoint,
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            max_rps=options['max_rps'],
+            limit=options['limit'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Reconciled: {completed} completed, {failed} failed, {unchanged} still pending, "
+            "{missing} unknown to Stripe".format(**totals)
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from payments.stripe_stub import StripeStubServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local Stripe-compatible API server. Start the backend with "
+        "STRIPE_API_BASE=http://127.0.0.1:<port> to load-test payments offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency-ms', type=float, default=0.0,
+                            help='Artificial delay added to every response, to mimic the real API')
+
+    def handle(self, *args, **options):
+        server = StripeStubServer(
+            (options['host'], options['port']),
+            latency=options['latency_ms'] / 1000,
+            verbose=options['verbosity'] >= 2,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stripe stub listening on {server.base_url}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
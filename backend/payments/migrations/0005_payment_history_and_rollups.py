@@ -0,0 +1,43 @@
+# Generated by Django 4.2.17 on 2026-10-19 01:27
+
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    from payments.rollups import rebuild_daily_rollups
+
+    rebuild_daily_rollups(
+        apps.get_model('payments', 'Payment'),
+        apps.get_model('payments', 'DailyPaymentRollup'),
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_payment_state_machine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('plan_type', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('refunded', 'Refunded')], max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'created_at'], name='payment_user_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailypaymentrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'plan_type', 'status'), name='unique_daily_payment_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,73 @@
 # Import necessary Django modules
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+def _from_db(connection, model, field_name, value):
+    """Convert a raw cursor value the way the ORM would for ``field_name``"""
+    field = model._meta.get_field(field_name)
+    expression = field.cached_col
+    for converter in connection.ops.get_db_converters(expression) + field.get_db_converters(connection):
+        value = converter(value, expression, connection)
+    return value
+
+
+class PaymentManager(models.Manager):
+    # SQLite caps the number of bound parameters per statement
+    TRANSITION_CHUNK_SIZE = 500
+
+    def transition(self, to_status, *, ids=None, intent_ids=None, source=''):
+        """
+        Atomically move payments to ``to_status`` and return the ids that changed.
+
+        Each chunk is a single conditional statement,
+            UPDATE ... SET status = <to> WHERE status = <from> AND id IN (...) RETURNING ...
+        so concurrent confirms/webhooks can't lose updates and rows that are
+        not in the required source state are left untouched. The changes are
+        then appended to the PaymentStatusChange audit log with one bulk INSERT
+        and folded into the DailyPaymentRollup counters.
+        """
+        from_status = Payment.TRANSITIONS[to_status]
+        if ids is not None:
+            column, values = 'id', list(ids)
+        else:
+            column, values = 'payment_intent_id', list(intent_ids or [])
+        if not values:
+            return []
+
+        connection = transaction.get_connection(self.db)
+        qn = connection.ops.quote_name
+        changed = []
+        deltas = RollupDeltas()
+        # savepoint=False: callers batching several transitions in their own
+        # transaction shouldn't pay for a savepoint round trip each time
+        with transaction.atomic(using=self.db, savepoint=False):
+            with connection.cursor() as cursor:
+                for start in range(0, len(values), self.TRANSITION_CHUNK_SIZE):
+                    chunk = values[start:start + self.TRANSITION_CHUNK_SIZE]
+                    cursor.execute(
+                        f"UPDATE {qn(self.model._meta.db_table)} SET {qn('status')} = %s "
+                        f"WHERE {qn('status')} = %s AND {qn(column)} IN ({', '.join(['%s'] * len(chunk))}) "
+                        f"RETURNING {qn('id')}, {qn('created_at')}, {qn('plan_type')}, {qn('amount')}",
+                        [to_status, from_status, *chunk],
+                    )
+                    for payment_id, created_at, plan_type, amount in cursor.fetchall():
+                        changed.append(payment_id)
+                        created_at = _from_db(connection, self.model, 'created_at', created_at)
+                        amount = _from_db(connection, self.model, 'amount', amount)
+                        deltas.move(created_at, plan_type, from_status, to_status, amount)
+
+            PaymentStatusChange.objects.using(self.db).bulk_create([
+                PaymentStatusChange(payment_id=payment_id, from_status=from_status,
+                                    to_status=to_status, source=source)
+                for payment_id in changed
+            ])
+            DailyPaymentRollup.objects.apply(deltas, using=self.db)
+        return changed
+
 
 class Payment(models.Model):
     # Define possible status choices for a payment as a list of tuples
@@ -8,8 +75,18 @@ class Payment(models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),    # Payment initiated but not completed
         ('completed', 'Completed'), # Payment successfully processed
-        ('failed', 'Failed')       # Payment attempt failed
+        ('failed', 'Failed'),      # Payment attempt failed
+        ('refunded', 'Refunded'),  # Completed payment that was refunded
     ]
+
+    # Allowed state machine transitions: target status -> required current status
+    # pending -> completed, pending -> failed, completed -> refunded
+    # Every other change is rejected by Payment.objects.transition()
+    TRANSITIONS = {
+        'completed': 'pending',
+        'failed': 'pending',
+        'refunded': 'completed',
+    }
     
     # ForeignKey creates a many-to-one relationship with User model
     # one user can have many payments, but each payment belongs to only one user
@@ -23,7 +100,8 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     
     # Stores Stripe's payment intent ID for tracking the payment in Stripe's system
-    payment_intent_id = models.CharField(max_length=255)
+    # unique=True gives webhook/reconciliation lookups by Stripe id an index
+    payment_intent_id = models.CharField(max_length=255, unique=True)
     
     # Status field using the choices defined above
     # default='pending' means new payments start in 'pending' status
@@ -36,8 +114,163 @@ class Payment(models.Model):
     # Stores which subscription plan was chosen ('single', 'partnership', or 'group')
     plan_type = models.CharField(max_length=20)
 
+    # Client-supplied Idempotency-Key header, unique per user (see Meta.constraints)
+    # null=True so payments created without a key don't collide with each other
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True)
+
+    # Stripe's client secret, kept so a retried request can replay the original response
+    client_secret = models.CharField(max_length=255, blank=True, default='')
+
+    # Status changes must go through Payment.objects.transition()
+    objects = PaymentManager()
+
+    class Meta:
+        constraints = [
+            # Unique index backing idempotent create-payment-intent retries
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_payment_idempotency_key'),
+        ]
+        indexes = [
+            # Serves the newest-first payment history of one user without a sort
+            models.Index(fields=['user', 'created_at'], name='payment_user_created_idx'),
+            # Small partial index for reconciliation's keyset walk over pending rows
+            models.Index(fields=['id'], name='payment_pending_idx', condition=models.Q(status='pending')),
+        ]
+
+    def save(self, *args, **kwargs):
+        # New payments are counted into the daily rollups in the same transaction;
+        # later status changes are counted by Payment.objects.transition()
+        adding = self._state.adding
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                deltas = RollupDeltas()
+                deltas.add(self.created_at, self.plan_type, self.status, Decimal(str(self.amount)))
+                DailyPaymentRollup.objects.apply(deltas, using=self._state.db)
+
     # String representation of the Payment object
     # This defines how the payment appears in admin interface and when printed
     # Example output: "john_doe - 149.99 - pending"
     def __str__(self):
-        return f"{self.user.username} - {self.amount} - {self.status}"
\ No newline at end of file
+        return f"{self.user.username} - {self.amount} - {self.status}"
+
+class RollupDeltas:
+    """Accumulates (day, plan_type, status) -> [count, amount] changes before they hit the DB"""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: [0, Decimal('0')])
+
+    def add(self, created_at, plan_type, status, amount, count=1):
+        row = self.rows[(timezone.localdate(created_at), plan_type, status)]
+        row[0] += count
+        row[1] += amount * count
+
+    def move(self, created_at, plan_type, from_status, to_status, amount):
+        self.add(created_at, plan_type, from_status, amount, count=-1)
+        self.add(created_at, plan_type, to_status, amount)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+
+class DailyPaymentRollupManager(models.Manager):
+    def apply(self, deltas, using=None):
+        """
+        Add ``deltas`` to the rollup rows with one upsert:
+            INSERT ... ON CONFLICT (day, plan_type, status)
+            DO UPDATE SET count = count + EXCLUDED.count, amount = amount + EXCLUDED.amount
+        """
+        if not deltas:
+            return
+        using = using or self.db
+        connection = transaction.get_connection(using)
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        amount_field = self.model._meta.get_field('amount')
+
+        params = []
+        for (day, plan_type, status), (count, amount) in deltas.rows.items():
+            params += [
+                connection.ops.adapt_datefield_value(day), plan_type, status, count,
+                connection.ops.adapt_decimalfield_value(amount, amount_field.max_digits, amount_field.decimal_places),
+            ]
+        values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(deltas.rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({qn('day')}, {qn('plan_type')}, {qn('status')}, {qn('count')}, {qn('amount')}) "
+                f"VALUES {values} "
+                f"ON CONFLICT ({qn('day')}, {qn('plan_type')}, {qn('status')}) DO UPDATE SET "
+                f"{qn('count')} = {table}.{qn('count')} + EXCLUDED.{qn('count')}, "
+                f"{qn('amount')} = {table}.{qn('amount')} + EXCLUDED.{qn('amount')}",
+                params,
+            )
+
+
+class DailyPaymentRollup(models.Model):
+    """
+    Pre-aggregated payment count and amount per day, plan and status.
+    Kept current incrementally (Payment.save / Payment.objects.transition) and
+    rebuilt by ``manage.py backfill_payment_rollups``; dashboards read these
+    instead of aggregating the payments table.
+    """
+    day = models.DateField()  # Day the payment was created (TIME_ZONE)
+    plan_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=Payment.PAYMENT_STATUS_CHOICES)
+    count = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    objects = DailyPaymentRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'plan_type', 'status'], name='unique_daily_payment_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.plan_type} {self.status}: {self.count} / {self.amount}"
+
+
+class PaymentStatusChange(models.Model):
+    """
+    Append-only audit log of payment status transitions.
+    Rows are written in bulk by Payment.objects.transition() and never updated.
+    """
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='status_changes')
+    from_status = models.CharField(max_length=20, choices=Payment.PAYMENT_STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Payment.PAYMENT_STATUS_CHOICES)
+    # What triggered the change: 'client', 'webhook', 'reconcile', ...
+    source = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Payment status changes are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.payment_id}: {self.from_status} -> {self.to_status}"
+
+
+class StripeEvent(models.Model):
+    """
+    Inbox of verified Stripe webhook events.
+    The webhook view only inserts here and acknowledges; the
+    process_stripe_events worker applies them to Payment rows in batches.
+    """
+    # Stripe's event id (evt_...) - the unique index deduplicates redeliveries
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    # Set by the worker once the event has been applied (or skipped)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Partial index so the worker's "oldest unprocessed first" scan stays
+            # small no matter how many processed events accumulate
+            models.Index(fields=['id'], name='stripe_event_unprocessed',
+                         condition=models.Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} - {self.type}"
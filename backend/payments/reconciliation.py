@@ -0,0 +1,167 @@
+"""
+Reconciling pending Payment rows against Stripe.
+
+Used by ``manage.py reconcile_payments``. Pending payments are read in keyset
+(id) order one batch at a time, their PaymentIntents are fetched from Stripe
+by a bounded thread pool under a shared rate limit, and the outcomes are
+applied through Payment.objects.transition() so the audit log and rollups
+stay consistent with webhook-driven changes.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+
+from .models import Payment
+from .stripe_client import get_stripe_client
+
+# Stripe PaymentIntent status -> Payment status (anything else stays pending)
+STRIPE_STATUS = {
+    'succeeded': 'completed',
+    'canceled': 'failed',
+}
+
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls at most ``rate`` per second apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def back_off(self, seconds):
+        """Push every caller back after Stripe answered 429"""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+def retrieve_status(intent_id, limiter, max_attempts=5, initial_backoff=0.5):
+    """
+    Fetch one PaymentIntent's status, backing off on 429 responses.
+    Returns None when Stripe doesn't know the intent.
+    """
+    client = get_stripe_client()
+    for attempt in range(max_attempts):
+        limiter.wait()
+        try:
+            return client.payment_intents.retrieve(intent_id).status
+        except stripe.RateLimitError:
+            if attempt == max_attempts - 1:
+                raise
+            limiter.back_off(min(initial_backoff * 2 ** attempt, 30))
+        except stripe.InvalidRequestError as e:
+            if e.code == 'resource_missing':
+                return None
+            raise
+
+
+class Checkpoint:
+    """Tiny JSON file recording how far a reconciliation run got"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, state):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as handle:
+            json.dump(state, handle)
+        os.replace(tmp, self.path)  # atomic, so a crash never leaves half a file
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def pending_batches(cutoff, after_id=0, batch_size=500):
+    """Yield lists of (id, payment_intent_id) for pending payments, in id order"""
+    while True:
+        batch = list(
+            Payment.objects.filter(status='pending', created_at__lt=cutoff, id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'payment_intent_id')[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1][0]
+
+
+def reconcile_batch(batch, executor, limiter):
+    """
+    Look up a batch of payments in Stripe and apply the outcomes.
+    Returns {'completed': n, 'failed': n, 'unchanged': n, 'missing': n}.
+    """
+    statuses = executor.map(lambda row: retrieve_status(row[1], limiter), batch)
+    targets = {'completed': [], 'failed': []}
+    stats = {'completed': 0, 'failed': 0, 'unchanged': 0, 'missing': 0}
+
+    for (payment_id, _), stripe_status in zip(batch, statuses):
+        if stripe_status is None:
+            stats['missing'] += 1
+        elif stripe_status in STRIPE_STATUS:
+            targets[STRIPE_STATUS[stripe_status]].append(payment_id)
+        else:
+            stats['unchanged'] += 1
+
+    for target, ids in targets.items():
+        # Conditional transition: a webhook that got there first wins
+        changed = Payment.objects.transition(target, ids=ids, source='reconcile')
+        stats[target] += len(changed)
+        stats['unchanged'] += len(ids) - len(changed)
+    return stats
+
+
+def reconcile(cutoff, checkpoint, batch_size=500, concurrency=8, max_rps=20, limit=None, progress=None):
+    """
+    Reconcile pending payments created before ``cutoff``, resuming from
+    ``checkpoint`` when it holds a previous run for the same cutoff.
+    """
+    state = checkpoint.load()
+    if not state or state.get('cutoff') != cutoff.isoformat():
+        state = {'cutoff': cutoff.isoformat(), 'last_id': 0, 'processed': 0}
+    totals = {'completed': 0, 'failed': 0, 'unchanged': 0, 'missing': 0}
+
+    limiter = RateLimiter(max_rps)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='reconcile') as executor:
+        for batch in pending_batches(cutoff, state['last_id'], batch_size):
+            if limit is not None:
+                batch = batch[:max(limit - state['processed'], 0)]
+                if not batch:
+                    break
+            stats = reconcile_batch(batch, executor, limiter)
+            for key, value in stats.items():
+                totals[key] += value
+
+            state['last_id'] = batch[-1][0]
+            state['processed'] += len(batch)
+            checkpoint.save(state)
+            if progress:
+                progress(state, stats)
+
+    if limit is None or state['processed'] < limit:
+        checkpoint.clear()  # finished - the next run starts from scratch
+    return totals
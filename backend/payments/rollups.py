@@ -0,0 +1,40 @@
+"""
+Rebuilding DailyPaymentRollup from the payments table.
+
+Day-to-day the rollups are maintained incrementally; this full recompute is
+for the initial backfill and for repairing drift. Models are passed in so the
+same code can run from a migration (historical models) or a command.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def rebuild_daily_rollups(payment_model, rollup_model, since=None, using='default', batch_size=1000):
+    """
+    Recompute rollups for payments created on or after ``since`` (all when None).
+    The aggregation runs in the database; only one row per day/plan/status
+    comes back to Python. Returns the number of rollup rows written.
+    """
+    payments = payment_model.objects.using(using).all()
+    rollups = rollup_model.objects.using(using).all()
+    if since is not None:
+        payments = payments.filter(created_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    aggregated = (
+        payments.annotate(day=TruncDate('created_at'))
+        .values('day', 'plan_type', 'status')
+        .annotate(total_count=Count('id'), total_amount=Sum('amount'))
+        .order_by()
+    )
+
+    with transaction.atomic(using=using):
+        rollups.delete()
+        rows = [
+            rollup_model(day=row['day'], plan_type=row['plan_type'], status=row['status'],
+                         count=row['total_count'], amount=row['total_amount'] or 0)
+            for row in aggregated.iterator()
+        ]
+        rollup_model.objects.using(using).bulk_create(rows, batch_size=batch_size)
+    return len(rows)
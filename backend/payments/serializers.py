@@ -1,6 +1,6 @@
 # Import necessary modules from Django REST framework and local models
 from rest_framework import serializers
-from .models import Payment
+from .models import DailyPaymentRollup, Payment
 
 class PaymentSerializer(serializers.ModelSerializer):
     # ModelSerializer automatically creates a serializer based on our Payment model
@@ -14,7 +14,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = [
             'id',           # Payment's database ID
             'amount',       # Payment amount (e.g., 149.99)
-            'status',       # Payment status (pending/completed/failed)
+            'status',       # Payment status (pending/completed/failed/refunded)
             'created_at',   # When the payment was created
             'plan_type'     # Which plan was chosen (single/partnership/group)
         ]
@@ -25,6 +25,13 @@ class PaymentSerializer(serializers.ModelSerializer):
             'status'             # Payment status should only be modified by backend logic
         ]
 
+class DailyPaymentRollupSerializer(serializers.ModelSerializer):
+    # Read-only view of the pre-aggregated revenue rows used by dashboards
+    class Meta:
+        model = DailyPaymentRollup
+        fields = ['day', 'plan_type', 'status', 'count', 'amount']
+        read_only_fields = fields
+
 # Example usage:
 # 1. Serializing a payment (converting to JSON):
 """
@@ -0,0 +1,125 @@
+"""
+Shared, pre-configured Stripe client.
+
+Every Stripe call goes through one StripeClient per process, backed by a
+keep-alive requests.Session with a bounded connection pool, explicit
+connect/read timeouts and Stripe's own retry policy (which re-sends POSTs
+with the same idempotency key). Each HTTP attempt is timed into the
+``stripe_request_duration_seconds`` histogram.
+
+Point STRIPE_API_BASE at ``python manage.py stripe_stub`` to run the
+payments endpoints without network access.
+
+The stripe package (and requests with it) is imported on the first call, not
+at module import: it alone used to be over half of a worker's boot time.
+"""
+import functools
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+from backend import instrumentation, metrics
+
+STRIPE_LATENCY = metrics.histogram(
+    'stripe_request_duration_seconds',
+    'Latency of individual HTTP attempts against the Stripe API',
+)
+
+# Stripe object ids (pi_3Mtw..., ch_1Abc...) collapse into one label value;
+# resource names like payment_intents have no digits or capitals so are kept
+_OBJECT_ID = re.compile(r'/[a-z]{2,6}_(?=[A-Za-z0-9]*[0-9A-Z])[A-Za-z0-9]+')
+
+
+def _endpoint(url):
+    path = urlsplit(url).path
+    return _OBJECT_ID.sub('/:id', path)
+
+
+@functools.cache
+def instrumented_requests_client_class():
+    """stripe.RequestsClient subclass recording the latency of every attempt, defined on first use"""
+    import stripe
+
+    class InstrumentedRequestsClient(stripe.RequestsClient):
+        def request(self, method, url, headers, post_data=None):
+            start = time.perf_counter()
+            status = 'error'
+            try:
+                content, status_code, response_headers = super().request(method, url, headers, post_data)
+                status = str(status_code)
+                return content, status_code, response_headers
+            finally:
+                elapsed = time.perf_counter() - start
+                instrumentation.record('stripe', elapsed)
+                STRIPE_LATENCY.observe(
+                    elapsed,
+                    method=method.upper(),
+                    endpoint=_endpoint(url),
+                    status=status,
+                )
+
+    return InstrumentedRequestsClient
+
+
+def build_session():
+    """Keep-alive session whose pool is sized for concurrent request threads"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Retries are left to the Stripe client so they're only attempted once
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_POOL_MAXSIZE, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def build_client():
+    import stripe
+
+    http_client = instrumented_requests_client_class()(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=build_session(),
+    )
+    base_addresses = {}
+    if settings.STRIPE_API_BASE:
+        base_addresses['api'] = settings.STRIPE_API_BASE
+    return stripe.StripeClient(
+        settings.STRIPE_SECRET_KEY or '',
+        http_client=http_client,
+        max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+        base_addresses=base_addresses,
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_stripe_client():
+    """Return the process-wide StripeClient, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_client()
+    return _client
+
+
+def reset_stripe_client():
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def _on_setting_changed(setting, **kwargs):
+    # Lets override_settings(STRIPE_API_BASE=...) take effect in tests
+    if setting.startswith('STRIPE_'):
+        reset_stripe_client()
+
+
+setting_changed.connect(_on_setting_changed)
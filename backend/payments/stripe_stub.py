@@ -0,0 +1,206 @@
+"""
+Minimal Stripe-compatible API server for offline development and load tests.
+
+Implements the PaymentIntent endpoints this project calls, speaking the same
+form-encoded request / JSON response format as api.stripe.com, including
+Idempotency-Key replay. State is held in memory and lost on restart.
+
+    server = StripeStubServer(('127.0.0.1', 0))
+    server.start()            # serves on a background thread
+    ... settings.STRIPE_API_BASE = server.base_url ...
+    server.stop()
+"""
+import json
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Stripe rejects longer Idempotency-Key headers
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+_INTENT_PATH = re.compile(r'^/v1/payment_intents/(?P<id>pi_[A-Za-z0-9]+)(?:/(?P<action>confirm|cancel))?$')
+
+
+def _parse_form(body):
+    """Decode Stripe's bracketed form encoding (metadata[key]=value) into dicts"""
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        match = re.match(r'^(\w+)\[(\w+)\]$', key)
+        if match:
+            params.setdefault(match.group(1), {})[match.group(2)] = value
+        else:
+            params[key] = value
+    return params
+
+
+class StripeStubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive, like the real API
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        url = urlsplit(self.path)
+        params = _parse_form(body if method == 'POST' else url.query)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        idempotency_key = self.headers.get('Idempotency-Key') if method == 'POST' else None
+        if idempotency_key and len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return self._send(*self.server._error(
+                400, f'Keys for idempotent requests can only be {MAX_IDEMPOTENCY_KEY_LENGTH} characters long.'))
+        if idempotency_key:
+            with self.server.lock:
+                cached = self.server.idempotent_responses.get(idempotency_key)
+            if cached:
+                status, payload = cached
+                return self._send(status, payload, replayed=True)
+
+        status, payload = self.server.route(method, url.path, params)
+        if idempotency_key:
+            with self.server.lock:
+                self.server.idempotent_responses[idempotency_key] = (status, payload)
+        self._send(status, payload)
+
+    def _send(self, status, payload, replayed=False):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', 'req_' + secrets.token_hex(7))
+        if replayed:
+            self.send_header('Idempotent-Replayed', 'true')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StripeStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 12111), latency=0.0, verbose=False):
+        super().__init__(address, StripeStubHandler)
+        self.latency = latency
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.intents = {}
+        self.idempotent_responses = {}
+        self.request_count = 0
+        self.injected_errors = []
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='stripe-stub', daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def set_intent_status(self, intent_id, status):
+        """Test helper - move an intent to any Stripe status"""
+        with self.lock:
+            self.intents[intent_id]['status'] = status
+
+    def inject_errors(self, status, count=1):
+        """Test helper - answer the next ``count`` requests with ``status`` (e.g. 429)"""
+        with self.lock:
+            self.injected_errors.extend([status] * count)
+
+    def route(self, method, path, params):
+        with self.lock:
+            self.request_count += 1
+            if self.injected_errors:
+                status = self.injected_errors.pop(0)
+                if status == 429:
+                    return status, {'error': {'type': 'invalid_request_error', 'code': 'rate_limit',
+                                              'message': 'Too many requests hit the API too quickly.'}}
+                return status, {'error': {'type': 'api_error', 'message': 'Injected stub error.'}}
+
+            if path == '/v1/payment_intents':
+                if method == 'POST':
+                    return self._create_intent(params)
+                return self._list_intents(params)
+
+            match = _INTENT_PATH.match(path)
+            if not match:
+                return self._error(404, f'Unrecognized request URL ({method}: {path}).')
+
+            intent = self.intents.get(match.group('id'))
+            if intent is None:
+                return self._error(404, f"No such payment_intent: '{match.group('id')}'",
+                                   code='resource_missing', param='intent')
+
+            action = match.group('action')
+            if method == 'POST' and action == 'confirm':
+                intent['status'] = 'succeeded'
+            elif method == 'POST' and action == 'cancel':
+                intent['status'] = 'canceled'
+            return 200, dict(intent)
+
+    def _create_intent(self, params):
+        try:
+            amount = int(params['amount'])
+        except (KeyError, ValueError):
+            return self._error(400, 'Missing required param: amount.', param='amount')
+        if 'currency' not in params:
+            return self._error(400, 'Missing required param: currency.', param='currency')
+
+        intent_id = 'pi_' + secrets.token_hex(12)
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': amount,
+            'currency': params['currency'],
+            'client_secret': f'{intent_id}_secret_{secrets.token_hex(12)}',
+            'created': int(time.time()),
+            'livemode': False,
+            'metadata': params.get('metadata', {}),
+            'status': 'requires_payment_method',
+        }
+        self.intents[intent_id] = intent
+        return 200, dict(intent)
+
+    def _list_intents(self, params):
+        # Newest first, paginated with starting_after like the real API
+        intents = sorted(self.intents.values(), key=lambda i: (i['created'], i['id']), reverse=True)
+        if params.get('starting_after'):
+            ids = [i['id'] for i in intents]
+            if params['starting_after'] in ids:
+                intents = intents[ids.index(params['starting_after']) + 1:]
+        limit = min(int(params.get('limit', 10)), 100)
+        return 200, {
+            'object': 'list',
+            'url': '/v1/payment_intents',
+            'data': [dict(i) for i in intents[:limit]],
+            'has_more': len(intents) > limit,
+        }
+
+    @staticmethod
+    def _error(status, message, code=None, param=None):
+        error = {'type': 'invalid_request_error', 'message': message}
+        if code:
+            error['code'] = code
+        if param:
+            error['param'] = param
+        return status, {'error': error}
@@ -1,3 +1,477 @@
-from django.test import TestCase
+import io
+import os
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend import metrics
+from .models import DailyPaymentRollup, Payment, PaymentStatusChange, StripeEvent
+from .stripe_client import STRIPE_LATENCY, get_stripe_client
+from .stripe_stub import StripeStubServer
+from .webhooks import apply_pending_events
+
+
+class StripeStubTestCase(TestCase):
+    """Runs a local Stripe stub for the duration of the test class"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stripe_stub = StripeStubServer(('127.0.0.1', 0))
+        cls.stripe_stub.start()
+        cls._stripe_settings = override_settings(
+            STRIPE_API_BASE=cls.stripe_stub.base_url,
+            STRIPE_SECRET_KEY='sk_test_stub',
+            STRIPE_MAX_NETWORK_RETRIES=0,
+            SECURE_SSL_REDIRECT=False,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        )
+        cls._stripe_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._stripe_settings.disable()
+        cls.stripe_stub.stop()
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw-123456')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+
+class StripeClientTests(StripeStubTestCase):
+    def test_client_is_shared_and_pooled(self):
+        client = get_stripe_client()
+        self.assertIs(client, get_stripe_client())
+
+    def test_latency_is_recorded_per_endpoint(self):
+        STRIPE_LATENCY.reset()
+        get_stripe_client().payment_intents.create(params={'amount': 100, 'currency': 'usd'})
+        series = STRIPE_LATENCY.snapshot()
+        labels = dict(next(iter(series)))
+        self.assertEqual(labels['endpoint'], '/v1/payment_intents')
+        self.assertEqual(labels['status'], '200')
+        self.assertIn('stripe_request_duration_seconds', metrics.registry())
+
+
+class CreatePaymentIntentTests(StripeStubTestCase):
+    def test_creates_intent_and_payment(self):
+        response = self.api.post('/api/payments/create-payment-intent/',
+                                 {'amount': '149.99', 'planType': 'single'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        payment = Payment.objects.get(id=response.data['payment_id'])
+        intent = self.stripe_stub.intents[payment.payment_intent_id]
+        self.assertEqual(intent['amount'], 14999)
+        self.assertEqual(intent['metadata']['plan_type'], 'single')
+        self.assertEqual(response.data['clientSecret'], intent['client_secret'])
+
+
+class IdempotentPaymentIntentTests(StripeStubTestCase):
+    url = '/api/payments/create-payment-intent/'
+    body = {'amount': '49.99', 'planType': 'single'}
+
+    def post(self, key, body=None):
+        return self.api.post(self.url, body or self.body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_original_response(self):
+        first = self.post('retry-1')
+        calls = self.stripe_stub.request_count
+        second = self.post('retry-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.stripe_stub.request_count, calls)  # Stripe not called again
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_with_different_parameters(self):
+        self.post('retry-2')
+        response = self.post('retry-2', {'amount': '99.99', 'planType': 'group'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.post('shared')
+        other = User.objects.create_user('other', 'other@example.com', 'pw-123456')
+        self.api.force_authenticate(other)
+        response = self.post('shared')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_longest_allowed_key_fits_stripes_limit(self):
+        key = 'k' * 255
+        first = self.post(key)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.post(key).data, first.data)
+        self.assertTrue(all(len(sent) <= 255 for sent in self.stripe_stub.idempotent_responses))
+        self.assertEqual(self.post('k' * 256).status_code, 400)
+
+    @override_settings(PAYMENT_IDEMPOTENCY_WAIT=0.2)
+    def test_concurrent_duplicate_waits_then_gives_up(self):
+        from django.core.cache import cache
+        from .idempotency import lock_key
+
+        # Simulate a leader that is still talking to Stripe
+        cache.add(lock_key(f'payment-intent:{self.user.id}', 'busy'), 'leader', 30)
+        response = self.post('busy')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_follower_takes_over_when_leader_fails(self):
+        import threading
+        from django.core.cache import cache
+        from .idempotency import lock_key
+
+        name = lock_key(f'payment-intent:{self.user.id}', 'failed-leader')
+        cache.add(name, 'leader', 30)
+        threading.Timer(0.1, cache.delete, [name]).start()
+
+        response = self.post('failed-leader')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Payment.objects.get().idempotency_key, 'failed-leader')
+
+
+WEBHOOK_SECRET = 'whsec_test_fixture'
+
+
+def stripe_event(event_id, event_type, intent_id, created=1700000000):
+    """Fixture event shaped like Stripe's payment_intent.* payloads"""
+    return {
+        'id': event_id,
+        'object': 'event',
+        'type': event_type,
+        'created': created,
+        'livemode': False,
+        'data': {'object': {'id': intent_id, 'object': 'payment_intent'}},
+    }
+
+
+def charge_refunded_event(event_id, intent_id, amount=1000, amount_refunded=1000):
+    """Fixture charge.refunded event; Stripe sends it for partial refunds too"""
+    charge = {'id': 'ch_1', 'object': 'charge', 'payment_intent': intent_id, 'amount': amount,
+              'amount_refunded': amount_refunded, 'refunded': amount_refunded == amount}
+    return {**stripe_event(event_id, 'charge.refunded', 'ch_1'), 'data': {'object': charge}}
+
+
+def sign_payload(payload, secret=WEBHOOK_SECRET, timestamp=None):
+    """Build a Stripe-Signature header the same way Stripe does"""
+    import hashlib
+    import hmac
+    import time
+
+    timestamp = int(timestamp or time.time())
+    signed = f'{timestamp}.{payload}'.encode()
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET, SECURE_SSL_REDIRECT=False)
+class StripeWebhookTests(TestCase):
+    url = '/api/payments/webhook/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw-123456')
+        self.payment = Payment.objects.create(user=self.user, amount='10.00',
+                                              payment_intent_id='pi_fixture1', plan_type='single')
+
+    def deliver(self, event, signature=None):
+        import json
+
+        payload = json.dumps(event)
+        return self.client.post(self.url, payload, content_type='application/json',
+                                HTTP_STRIPE_SIGNATURE=signature or sign_payload(payload))
+
+    def test_signed_event_is_queued_not_applied(self):
+        response = self.deliver(stripe_event('evt_1', 'payment_intent.succeeded', 'pi_fixture1'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StripeEvent.objects.get().event_id, 'evt_1')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+
+    def test_bad_signature_is_rejected(self):
+        event = stripe_event('evt_2', 'payment_intent.succeeded', 'pi_fixture1')
+        response = self.deliver(event, signature=sign_payload('{}', secret='whsec_wrong'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_stale_signature_is_rejected(self):
+        import json
+
+        event = stripe_event('evt_3', 'payment_intent.succeeded', 'pi_fixture1')
+        response = self.deliver(event, signature=sign_payload(json.dumps(event), timestamp=1000))
+        self.assertEqual(response.status_code, 400)
+
+    def test_redelivery_is_deduplicated(self):
+        event = stripe_event('evt_4', 'payment_intent.succeeded', 'pi_fixture1')
+        self.deliver(event)
+        self.assertEqual(self.deliver(event).status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_worker_applies_batch_with_conditional_update(self):
+        Payment.objects.create(user=self.user, amount='20.00', payment_intent_id='pi_fixture2',
+                               plan_type='group')
+        Payment.objects.create(user=self.user, amount='30.00', payment_intent_id='pi_fixture3',
+                               plan_type='group', status='completed')
+        self.deliver(stripe_event('evt_5', 'payment_intent.succeeded', 'pi_fixture1'))
+        self.deliver(stripe_event('evt_6', 'payment_intent.canceled', 'pi_fixture2'))
+        self.deliver(stripe_event('evt_7', 'payment_intent.canceled', 'pi_fixture3'))
+        self.deliver(stripe_event('evt_8', 'customer.created', 'cus_123'))
+
+        # SELECT batch, per target status one UPDATE + audit INSERT + rollup
+        # upsert, mark processed - plus the savepoint pair atomic() emits in tests
+        with self.assertNumQueries(10):
+            processed = apply_pending_events(batch_size=100)
+        self.assertEqual(processed, 4)
+        self.assertEqual(apply_pending_events(), 0)
+
+        statuses = dict(Payment.objects.values_list('payment_intent_id', 'status'))
+        self.assertEqual(statuses, {'pi_fixture1': 'completed', 'pi_fixture2': 'failed',
+                                    'pi_fixture3': 'completed'})
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_partial_refund_keeps_payment_completed(self):
+        self.deliver(stripe_event('evt_18', 'payment_intent.succeeded', 'pi_fixture1'))
+        self.deliver(charge_refunded_event('evt_19', 'pi_fixture1', amount_refunded=250))
+        apply_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        rollup = DailyPaymentRollup.objects.get(status='completed')
+        self.assertEqual((rollup.count, rollup.amount), (1, Decimal('10.00')))
+        self.assertFalse(DailyPaymentRollup.objects.filter(status='refunded').exists())
+
+        # Refunding the rest refunds the payment
+        self.deliver(charge_refunded_event('evt_20', 'pi_fixture1', amount_refunded=1000))
+        apply_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+
+    def test_declined_attempt_then_successful_retry_completes(self):
+        self.deliver(stripe_event('evt_12', 'payment_intent.payment_failed', 'pi_fixture1'))
+        apply_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')  # the customer may retry
+
+        self.deliver(stripe_event('evt_13', 'payment_intent.succeeded', 'pi_fixture1'))
+        apply_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+    def test_client_confirms_retry_after_declined_attempt(self):
+        self.deliver(stripe_event('evt_17', 'payment_intent.payment_failed', 'pi_fixture1'))
+        apply_pending_events()
+        api = APIClient()
+        api.force_authenticate(self.user)
+        response = api.post(f'/api/payments/confirm-payment/{self.payment.id}/')
+        self.assertEqual(response.data, {'status': 'success'})
+
+    def test_success_wins_over_later_event_in_same_batch(self):
+        self.deliver(stripe_event('evt_14', 'payment_intent.succeeded', 'pi_fixture1'))
+        self.deliver(stripe_event('evt_15', 'payment_intent.payment_failed', 'pi_fixture1'))
+        self.deliver(stripe_event('evt_16', 'payment_intent.canceled', 'pi_fixture1'))
+        apply_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+    @override_settings(STRIPE_WEBHOOK_SECRET='')
+    def test_unconfigured_secret_refuses_events(self):
+        response = self.deliver(stripe_event('evt_9', 'payment_intent.succeeded', 'pi_fixture1'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_refund_after_success_in_one_batch(self):
+        self.deliver(stripe_event('evt_10', 'payment_intent.succeeded', 'pi_fixture1'))
+        self.deliver(charge_refunded_event('evt_11', 'pi_fixture1'))
+        apply_pending_events()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'refunded')
+        self.assertEqual(
+            list(self.payment.status_changes.order_by('id').values_list('from_status', 'to_status')),
+            [('pending', 'completed'), ('completed', 'refunded')],
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PaymentStateMachineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw-123456')
+        self.payment = Payment.objects.create(user=self.user, amount='10.00',
+                                              payment_intent_id='pi_state1', plan_type='single')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_transition_is_one_conditional_update(self):
+        with self.assertNumQueries(3):  # UPDATE ... RETURNING, audit INSERT, rollup upsert
+            changed = Payment.objects.transition('completed', ids=[self.payment.id], source='test')
+        self.assertEqual(changed, [self.payment.id])
+        change = PaymentStatusChange.objects.get()
+        self.assertEqual((change.from_status, change.to_status, change.source), ('pending', 'completed', 'test'))
+
+    def test_disallowed_transition_changes_nothing(self):
+        self.assertEqual(Payment.objects.transition('refunded', ids=[self.payment.id]), [])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+        self.assertFalse(PaymentStatusChange.objects.exists())
+
+    def test_audit_log_is_append_only(self):
+        Payment.objects.transition('failed', intent_ids=['pi_state1'])
+        change = PaymentStatusChange.objects.get()
+        with self.assertRaises(ValueError):
+            change.save()
+
+    def test_confirm_payment(self):
+        url = f'/api/payments/confirm-payment/{self.payment.id}/'
+        self.assertEqual(self.api.post(url).data, {'status': 'success'})
+        # Confirming twice is harmless
+        self.assertEqual(self.api.post(url).data, {'status': 'success'})
+        self.assertEqual(PaymentStatusChange.objects.count(), 1)
+
+    def test_confirm_failed_payment_conflicts(self):
+        Payment.objects.transition('failed', ids=[self.payment.id])
+        response = self.api.post(f'/api/payments/confirm-payment/{self.payment.id}/')
+        self.assertEqual(response.status_code, 409)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PaymentHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw-123456')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_history_is_paginated_and_scoped_to_user(self):
+        for i in range(5):
+            Payment.objects.create(user=self.user, amount='10.00', payment_intent_id=f'pi_hist{i}',
+                                   plan_type='single')
+        other = User.objects.create_user('other', 'other@example.com', 'pw-123456')
+        Payment.objects.create(user=other, amount='10.00', payment_intent_id='pi_other', plan_type='single')
+
+        first = self.api.get('/api/payments/history/?page_size=3')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.data['results']), 3)
+        second = self.api.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 2)
+        self.assertIsNone(second.data['next'])
+        ids = [row['id'] for row in first.data['results'] + second.data['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PaymentRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw-123456')
+
+    def rollups(self):
+        return {
+            (row.plan_type, row.status): (row.count, row.amount)
+            for row in DailyPaymentRollup.objects.exclude(count=0)
+        }
+
+    def test_rollups_follow_creates_and_transitions(self):
+        first = Payment.objects.create(user=self.user, amount='10.50', payment_intent_id='pi_r1', plan_type='single')
+        Payment.objects.create(user=self.user, amount='20.00', payment_intent_id='pi_r2', plan_type='single')
+        Payment.objects.create(user=self.user, amount='99.00', payment_intent_id='pi_r3', plan_type='group')
+        Payment.objects.transition('completed', ids=[first.id])
+        Payment.objects.transition('failed', intent_ids=['pi_r3'])
+
+        self.assertEqual(self.rollups(), {
+            ('single', 'pending'): (1, Decimal('20.00')),
+            ('single', 'completed'): (1, Decimal('10.50')),
+            ('group', 'failed'): (1, Decimal('99.00')),
+        })
+
+    def test_backfill_matches_incremental_rollups(self):
+        for i, plan in enumerate(['single', 'single', 'partnership']):
+            Payment.objects.create(user=self.user, amount='15.00', payment_intent_id=f'pi_b{i}', plan_type=plan)
+        Payment.objects.transition('completed', intent_ids=['pi_b0', 'pi_b2'])
+        incremental = self.rollups()
+
+        DailyPaymentRollup.objects.all().delete()
+        call_command('backfill_payment_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_revenue_dashboard_reads_rollups(self):
+        Payment.objects.create(user=self.user, amount='10.00', payment_intent_id='pi_d1', plan_type='single')
+        api = APIClient()
+        api.force_authenticate(self.user)
+        self.assertEqual(api.get('/api/payments/revenue/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertNumQueries(1):
+            response = api.get('/api/payments/revenue/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['plan_type'], 'single')
+        self.assertEqual(response.data[0]['count'], 1)
+        self.assertEqual(api.get('/api/payments/revenue/?start=bad').status_code, 400)
+
+
+class ReconcilePaymentsTests(StripeStubTestCase):
+    def setUp(self):
+        super().setUp()
+        import tempfile
+
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'reconcile.json')
+
+    def make_payment(self, stripe_status):
+        intent = get_stripe_client().payment_intents.create(params={'amount': 1000, 'currency': 'usd'})
+        if stripe_status:
+            self.stripe_stub.set_intent_status(intent.id, stripe_status)
+        payment = Payment.objects.create(user=self.user, amount='10.00', payment_intent_id=intent.id,
+                                         plan_type='single')
+        # Backdate so it's past the --older-than window
+        Payment.objects.filter(id=payment.id).update(created_at=payment.created_at - timedelta(hours=2))
+        return payment
+
+    def reconcile(self, **options):
+        out = io.StringIO()
+        call_command('reconcile_payments', checkpoint=self.checkpoint, max_rps=0, stdout=out, **options)
+        return out.getvalue()
+
+    def statuses(self):
+        return list(Payment.objects.order_by('id').values_list('status', flat=True))
+
+    def test_pending_payments_are_resolved_from_stripe(self):
+        self.make_payment('succeeded')
+        self.make_payment('canceled')
+        self.make_payment(None)  # still requires_payment_method
+        Payment.objects.create(user=self.user, amount='10.00', payment_intent_id='pi_missing0',
+                               plan_type='single')
+        Payment.objects.filter(payment_intent_id='pi_missing0').update(
+            created_at=timezone.now() - timedelta(hours=2))
+
+        output = self.reconcile(batch_size=2, concurrency=2)
+        self.assertIn('1 completed, 1 failed, 1 still pending, 1 unknown to Stripe', output)
+        self.assertEqual(self.statuses(), ['completed', 'failed', 'pending', 'pending'])
+        self.assertEqual(PaymentStatusChange.objects.filter(source='reconcile').count(), 2)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_recent_payments_are_left_alone(self):
+        payment = self.make_payment('succeeded')
+        Payment.objects.filter(id=payment.id).update(created_at=timezone.now())
+        self.reconcile()
+        self.assertEqual(self.statuses(), ['pending'])
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        for _ in range(3):
+            self.make_payment('succeeded')
+        self.reconcile(batch_size=1, limit=2)
+        self.assertEqual(self.statuses(), ['completed', 'completed', 'pending'])
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        calls = self.stripe_stub.request_count
+        output = self.reconcile(batch_size=1)
+        self.assertIn('Resuming after payment', output)
+        self.assertEqual(self.stripe_stub.request_count, calls + 1)  # only the remaining payment
+        self.assertEqual(self.statuses(), ['completed', 'completed', 'completed'])
+
+    def test_rate_limited_requests_back_off_and_retry(self):
+        self.make_payment('succeeded')
+        self.stripe_stub.inject_errors(429, count=2)
+        self.reconcile()
+        self.assertEqual(self.statuses(), ['completed'])
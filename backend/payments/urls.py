@@ -1,6 +1,7 @@
 # Import necessary modules
 from django.urls import path  # Used for defining URL patterns
 from . import views          # Import views from the current directory
+from . import webhooks       # Stripe webhook endpoint
 
 # Define a namespace for this app's URLs
 # This helps avoid URL name conflicts between different apps
@@ -22,4 +23,25 @@ urlpatterns = [
         views.confirm_payment,               # View function to handle this URL
         name='confirm-payment'               # Name to reference this URL pattern
     ),
+
+    # URL pattern for the current user's payment history (cursor paginated)
+    path(
+        'history/',
+        views.PaymentHistory.as_view(),
+        name='payment-history'
+    ),
+
+    # URL pattern for the admin revenue dashboard (reads daily rollups)
+    path(
+        'revenue/',
+        views.RevenueRollups.as_view(),
+        name='revenue-rollups'
+    ),
+
+    # URL pattern for Stripe webhook deliveries (signed, no JWT)
+    path(
+        'webhook/',
+        webhooks.stripe_webhook,
+        name='stripe-webhook'
+    ),
 ]
\ No newline at end of file
@@ -1,50 +1,135 @@
 # Import necessary modules
-import stripe  # Stripe API for payment processing
+import hashlib
+import time
+from datetime import date
+from decimal import Decimal
 from django.conf import settings  # To get settings like STRIPE_SECRET_KEY
+from rest_framework import generics  # Generic class-based views (history, revenue)
 from rest_framework.decorators import api_view, permission_classes  # Decorators for API views
-from rest_framework.permissions import IsAuthenticated  # Permission class to ensure user is logged in
+from rest_framework.pagination import CursorPagination  # Keyset pagination for payment history
+from rest_framework.permissions import IsAdminUser, IsAuthenticated  # Permission classes
+from rest_framework.exceptions import ValidationError  # 400 for bad query parameters
 from rest_framework.response import Response  # For returning API responses
 from django.shortcuts import get_object_or_404  # Helper to get object or return 404
-from .models import Payment  # Our Payment model
-from .serializers import PaymentSerializer  # Our Payment serializer
+from django.db import IntegrityError
+from .models import DailyPaymentRollup, Payment  # Our Payment models
+from .serializers import DailyPaymentRollupSerializer, PaymentSerializer  # Our Payment serializers
+from .stripe_client import get_stripe_client  # Shared, pooled Stripe client (timeouts + retries)
+from .idempotency import lock_key, single_flight, wait_for_leader  # Idempotency-Key locking
+
+def _start_payment(user, data, idempotency_key=None):
+   """Create the Stripe PaymentIntent and our matching Payment row"""
+   # Forward the key to Stripe (namespaced per user) so a retry that reaches
+   # Stripe twice still gets back the same PaymentIntent. Hashed, since Stripe
+   # allows 255 characters and the client's key alone may use all of them
+   options = {}
+   if idempotency_key:
+       digest = hashlib.sha256(idempotency_key.encode()).hexdigest()
+       options['idempotency_key'] = f'payment-intent:{user.id}:{digest}'
+
+   # Create a payment intent with Stripe
+   intent = get_stripe_client().payment_intents.create(params={
+       # Convert dollars to cents (Stripe uses cents)
+       # e.g., $10.00 becomes 1000 cents
+       'amount': int(float(data['amount']) * 100),
+       'currency': 'usd',
+       # Additional data to store with the payment
+       'metadata': {
+           'user_id': user.id,
+           'plan_type': data['planType']
+       }
+   }, options=options)
+
+   # Create a payment record in our database
+   return Payment.objects.create(
+       user=user,  # Who is making the payment
+       amount=data['amount'],  # How much they're paying
+       payment_intent_id=intent.id,  # Stripe's reference ID
+       plan_type=data['planType'],  # Which plan they chose
+       idempotency_key=idempotency_key,
+       client_secret=intent.client_secret,
+   )
+
+
+def _payment_response(payment, replayed=False):
+   # Return the necessary data to complete payment on frontend
+   response = Response({
+       'clientSecret': payment.client_secret,  # Used by Stripe.js to complete payment # From Stripe
+       'payment_id': payment.id  # Our internal reference ID # From your database
+   })
+   if replayed:
+       response['Idempotent-Replayed'] = 'true'
+   return response
+
+
+def _replay_payment(payment, data):
+   """Replay a stored response, refusing if the key is reused for a different payment"""
+   amount = Decimal(str(data['amount'])).quantize(Decimal('0.01'))
+   if payment.amount != amount or payment.plan_type != data['planType']:
+       return Response(
+           {'error': 'Idempotency-Key was already used with different parameters'},
+           status=422
+       )
+   return _payment_response(payment, replayed=True)
+
+
+def _create_payment_intent_idempotent(request, idempotency_key):
+   data = request.data
+
+   def lookup():
+       return Payment.objects.filter(user=request.user, idempotency_key=idempotency_key).first()
+
+   # 1. Fast path - a previous request with this key already finished
+   payment = lookup()
+   if payment:
+       return _replay_payment(payment, data)
+
+   lock = lock_key(f'payment-intent:{request.user.id}', idempotency_key)
+   deadline = time.monotonic() + settings.PAYMENT_IDEMPOTENCY_WAIT
+   while True:
+       with single_flight(lock) as leader:
+           if leader:
+               # 2. We're the leader - re-check, then do the work exactly once
+               payment = lookup()
+               if payment:
+                   return _replay_payment(payment, data)
+               try:
+                   payment = _start_payment(request.user, data, idempotency_key)
+               except IntegrityError:
+                   # Lost a race with a request whose lock had expired - the
+                   # unique index kept a single row, so replay that one
+                   payment = lookup()
+                   return _replay_payment(payment, data)
+               return _payment_response(payment)
+
+       # 3. A concurrent duplicate is in flight - wait for its result
+       try:
+           payment = wait_for_leader(lock, lookup, max(deadline - time.monotonic(), 0))
+       except TimeoutError:
+           return Response(
+               {'error': 'A request with this Idempotency-Key is still in progress'},
+               status=409
+           )
+       if payment:
+           return _replay_payment(payment, data)
+       # The leader failed without creating a payment - try to take over
 
-# Configure Stripe with our secret key from settings
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 # Create Payment Intent View
 @api_view(['POST'])  # Only allow POST requests to this endpoint
 @permission_classes([IsAuthenticated])  # User must be logged in to access this
 def create_payment_intent(request):
    try:
-       # Get data from the request
-       data = request.data
-       
-       # Create a payment intent with Stripe
-       intent = stripe.PaymentIntent.create(
-           # Convert dollars to cents (Stripe uses cents)
-           # e.g., $10.00 becomes 1000 cents
-           amount=int(float(data['amount']) * 100),
-           currency='usd',
-           # Additional data to store with the payment
-           metadata={
-               'user_id': request.user.id,
-               'plan_type': data['planType']
-           }
-       )
-       
-       # Create a payment record in our database
-       payment = Payment.objects.create(
-           user=request.user,  # Who is making the payment
-           amount=data['amount'],  # How much they're paying
-           payment_intent_id=intent.id,  # Stripe's reference ID
-           plan_type=data['planType']  # Which plan they chose
-       )
-       
-       # Return the necessary data to complete payment on frontend
-       return Response({
-           'clientSecret': intent.client_secret,  # Used by Stripe.js to complete payment # From Stripe
-           'payment_id': payment.id  # Our internal reference ID # From your database
-       })
+       # Optional Idempotency-Key header - retries with the same key return the
+       # original response instead of creating a second PaymentIntent
+       idempotency_key = request.headers.get('Idempotency-Key')
+       if idempotency_key:
+           if len(idempotency_key) > 255:
+               return Response({'error': 'Idempotency-Key must be at most 255 characters'}, status=400)
+           return _create_payment_intent_idempotent(request, idempotency_key)
+
+       payment = _start_payment(request.user, request.data)
+       return _payment_response(payment)
    except Exception as e:
        # If anything goes wrong, return the error
        return Response({'error': str(e)}, status=400)
@@ -55,20 +140,74 @@ def create_payment_intent(request):
 def confirm_payment(request, payment_id):
    # Get the payment or return 404 if not found
    # Also ensures the payment belongs to the logged-in user
-   payment = get_object_or_404(Payment, id=payment_id, user=request.user)
-   
-   # Update payment status to completed
-   payment.status = 'completed'
-   payment.save()
-   
-   # Return success response
-   return Response({'status': 'success'})
+   payment = get_object_or_404(Payment.objects.only('id', 'status'), id=payment_id, user=request.user)
+
+   # Move pending -> completed with a single conditional UPDATE (no read-modify-write)
+   if Payment.objects.transition('completed', ids=[payment.id], source='client'):
+       return Response({'status': 'success'})
+
+   # Nothing changed - either it was already completed (e.g. by the webhook) or
+   # it's in a state that can't be completed any more
+   payment.refresh_from_db(fields=['status'])
+   if payment.status == 'completed':
+       return Response({'status': 'success'})
+   return Response(
+       {'error': f'Payment is {payment.status} and cannot be confirmed'},
+       status=409
+   )
+
+class PaymentHistoryPagination(CursorPagination):
+    # Cursor (keyset) pagination walks the (user, created_at) index, so deep
+    # pages cost the same as the first one - unlike OFFSET pagination
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-created_at'
+
+
+class PaymentHistory(generics.ListAPIView):
+    """List the current user's payments, newest first"""
+    serializer_class = PaymentSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = PaymentHistoryPagination
+
+    def get_queryset(self):
+        """Return only payments belonging to the current user"""
+        return Payment.objects.filter(user=self.request.user)
+
+
+class RevenueRollups(generics.ListAPIView):
+    """
+    Daily payment count and amount by plan and status, for dashboards.
+    Reads the pre-aggregated rollup table - never scans raw payments.
+    Optional ?start=YYYY-MM-DD&end=YYYY-MM-DD filters (inclusive).
+    """
+    serializer_class = DailyPaymentRollupSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        queryset = DailyPaymentRollup.objects.exclude(count=0).order_by('day', 'plan_type', 'status')
+        for param, lookup in (('start', 'day__gte'), ('end', 'day__lte')):
+            value = self.request.query_params.get(param)
+            if value:
+                try:
+                    queryset = queryset.filter(**{lookup: date.fromisoformat(value)})
+                except ValueError:
+                    raise ValidationError({param: 'Use the YYYY-MM-DD format'})
+        return queryset
+
+
+def stripe_config_document():
+    # The publishable key is public by design; built once at startup by
+    # StaticResponseMiddleware, which serves GET/HEAD without authentication
+    return {
+        'publicKey': settings.STRIPE_PUBLISHABLE_KEY
+    }
+
 
 @api_view(['GET'])
 def get_stripe_config(request):
-    return Response({
-        'publicKey': settings.STRIPE_PUBLISHABLE_KEY
-    })
+    return Response(stripe_config_document())
 
 # Example usage in frontend:
 """
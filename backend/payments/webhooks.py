@@ -0,0 +1,134 @@
+"""
+Stripe webhook ingestion.
+
+The endpoint does the minimum on the request path - verify the signature and
+INSERT the event into the StripeEvent inbox - so acknowledgement stays in the
+low milliseconds during event bursts. apply_pending_events() (run by
+``manage.py process_stripe_events``) then applies the inbox to Payment rows
+in batches.
+"""
+import json
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .models import Payment, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+# Stripe event type -> Payment status it transitions to (see Payment.TRANSITIONS).
+# payment_intent.payment_failed is deliberately absent: a declined attempt is
+# not final - the intent goes back to requires_payment_method and the customer
+# can retry with another card - so only a canceled intent fails the payment,
+# as in reconciliation.STRIPE_STATUS
+EVENT_STATUS = {
+    'payment_intent.succeeded': 'completed',
+    'payment_intent.canceled': 'failed',
+    'charge.refunded': 'refunded',
+}
+
+# Order in which a batch is applied, so a payment that succeeded and was then
+# refunded inside the same batch goes pending -> completed -> refunded
+APPLY_ORDER = ('completed', 'failed', 'refunded')
+
+
+def _fully_refunded(payload):
+    # charge.refunded is sent for partial refunds too; only a full refund
+    # refunds the payment (and takes its amount out of the revenue rollups)
+    charge = (payload.get('data') or {}).get('object') or {}
+    return charge.get('refunded') is True or (
+        bool(charge.get('amount')) and charge.get('amount_refunded') == charge.get('amount'))
+
+
+def _intent_id(payload):
+    obj = (payload.get('data') or {}).get('object') or {}
+    # charge.* events reference the intent; payment_intent.* events are the intent
+    if obj.get('object') == 'charge':
+        return obj.get('payment_intent')
+    return obj.get('id')
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    """Verify a Stripe event, store it in the inbox and acknowledge immediately"""
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        # Never accept events we can't verify - 503 makes Stripe retry later
+        logger.error("STRIPE_WEBHOOK_SECRET is not configured; rejecting webhook")
+        return HttpResponse(status=503)
+
+    # Imported here so worker boot doesn't pay for the whole stripe package
+    import stripe
+
+    payload = request.body.decode('utf-8')
+    signature = request.headers.get('Stripe-Signature', '')
+
+    try:
+        stripe.WebhookSignature.verify_header(
+            payload, signature, settings.STRIPE_WEBHOOK_SECRET,
+            tolerance=settings.STRIPE_WEBHOOK_TOLERANCE,
+        )
+        event = json.loads(payload)
+        event_id, event_type = event['id'], event['type']
+    except stripe.SignatureVerificationError:
+        return JsonResponse({'error': 'Invalid signature'}, status=400)
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+
+    # ON CONFLICT DO NOTHING - Stripe redelivers events, the first copy wins
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event_id, type=event_type, payload=event)],
+        ignore_conflicts=True,
+    )
+    return HttpResponse(status=200)
+
+
+def apply_pending_events(batch_size=500):
+    """
+    Apply one batch of unprocessed inbox events to Payment rows.
+    Returns the number of events consumed (0 when the inbox is empty).
+    """
+    with transaction.atomic():
+        queryset = StripeEvent.objects.filter(processed_at__isnull=True).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the inbox without blocking each other
+            queryset = queryset.select_for_update(skip_locked=True)
+        events = list(queryset.values_list('id', 'type', 'payload')[:batch_size])
+        if not events:
+            return 0
+
+        # One outcome per PaymentIntent within a batch; refunds are applied
+        # after it. A success is final, so no later event in the batch (say a
+        # cancellation delivered out of order) overrides it
+        outcomes = {}
+        refunds = set()
+        for _, event_type, payload in events:
+            target = EVENT_STATUS.get(event_type)
+            intent_id = _intent_id(payload)
+            if not target or not intent_id:
+                continue
+            if target == 'refunded':
+                if _fully_refunded(payload):
+                    refunds.add(intent_id)
+            elif outcomes.get(intent_id) != 'completed':
+                outcomes[intent_id] = target
+
+        by_status = {'refunded': sorted(refunds)}
+        for intent_id, target in outcomes.items():
+            by_status.setdefault(target, []).append(intent_id)
+
+        # One conditional UPDATE ... WHERE status = <source> per target status
+        for target in APPLY_ORDER:
+            if by_status.get(target):
+                changed = Payment.objects.transition(target, intent_ids=by_status[target], source='webhook')
+                logger.info("Stripe events moved %d payments to %s", len(changed), target)
+
+        StripeEvent.objects.filter(id__in=[event[0] for event in events]).update(
+            processed_at=timezone.now()
+        )
+    return len(events)